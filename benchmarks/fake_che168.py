@@ -0,0 +1,313 @@
+"""
+Локальный стенд che168 для бенчмарков: страницы списка, деталей и обфусцированные шрифты.
+
+    python -m benchmarks.fake_che168 --port 8300 --latency 0.05 --captcha-rate 0.01
+    CHE168_BASE_URL=http://127.0.0.1:8300 CHE168_FONT_HOST=127.0.0.1:8300 python -m src.main worker
+
+По умолчанию страницы генерируются: цифры цены, пробега и даты подменены
+символами из личной области Unicode, а каждый из нескольких шрифтов по-своему
+перемешивает глифы (как на настоящем сайте). Индекс глифов для них строит
+build_glyph_index(). С --archive страницы отдаются из архива PageArchive
+(записанные воркером), ссылки переписываются на адрес стенда.
+"""
+import io
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CAPTCHA_PAGE = "<html><head><title>安全验证</title></head><body>verify</body></html>"
+
+BRANDS = [("比亚迪", "汉"), ("比亚迪", "宋PLUS"), ("大众", "帕萨特"), ("丰田", "凯美瑞"), ("理想", "L7"), ("吉利", "星越L")]
+COLORS = ["白色", "黑色", "灰色", "银色", "蓝色", "红色"]
+FUELS = [("汽油", "1.5T 156马力 L4"), ("纯电动", "电动 204马力"), ("插电式混合动力", "1.5L 110马力 L4")]
+FEATURES = ["天窗", "座椅加热", "倒车影像", "自动空调", "无钥匙进入", "定速巡航", "车道保持", "360全景影像"]
+
+
+# --- Обфусцированные шрифты ---
+
+def _digit_glyph(digit: int, jitter: int):
+    """Контур цифры: у каждой своя форма, jitter чуть сдвигает точки (точный хэш не совпадет)"""
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+    pen = TTGlyphPen(None)
+    points = [(0, 0), (100 + digit * 10, 0), (100 + digit * 10, 200 + digit * 5), (50, 300 + jitter), (0, 200 - digit * 3)]
+    pen.moveTo((points[0][0] + jitter, points[0][1]))
+    for x, y in points[1:]:
+        pen.lineTo((x + jitter, y))
+    pen.closePath()
+    if digit % 2:
+        pen.moveTo((20 + jitter, 20))
+        pen.lineTo((40 + jitter, 20))
+        pen.lineTo((40 + jitter, 40 + digit))
+        pen.closePath()
+    return pen.glyph()
+
+
+def make_font(variant: int) -> tuple[bytes, dict[str, str]]:
+    """TTF, где цифры висят на перемешанных кодах U+E000.. Возвращает (байты, цифра -> символ)"""
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    rng = random.Random(variant)
+    codes = [0xE000 + variant * 16 + i for i in range(10)]
+    rng.shuffle(codes)
+
+    names = [".notdef"] + [f"g{d}" for d in range(10)]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(names)
+    builder.setupCharacterMap({code: f"g{d}" for d, code in enumerate(codes)})
+    glyphs = {".notdef": TTGlyphPen(None).glyph()}
+    glyphs.update({f"g{d}": _digit_glyph(d, variant % 3) for d in range(10)})
+    builder.setupGlyf(glyphs)
+    builder.setupHorizontalMetrics({name: (500, 0) for name in names})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": f"Fake{variant}", "styleName": "Regular"})
+    builder.setupOS2()
+    builder.setupPost()
+
+    buffer = io.BytesIO()
+    builder.save(buffer)
+    return buffer.getvalue(), {str(d): chr(code) for d, code in enumerate(codes)}
+
+
+def build_glyph_index(path: str, variants: int = 1):
+    """Размеченный индекс глифов для шрифтов стенда (как после calibrate-fonts)"""
+    from fontTools.ttLib import TTFont
+    from src.services.glyph_index import GlyphIndex, font_vectors
+
+    index = GlyphIndex(path=path)
+    for variant in range(variants):
+        font_bytes, digits = make_font(variant)
+        by_char = {ord(char): digit for digit, char in digits.items()}
+        codes, _, matrix = font_vectors(TTFont(io.BytesIO(font_bytes)))
+        for code, vector in zip(codes, matrix):
+            index.add(vector, by_char[code])
+    index.save()
+    return index
+
+
+# --- Генерация страниц ---
+
+class Site:
+    def __init__(self, base: str, cards: int = 20, fonts: int = 4, page_kb: int = 120):
+        self.base = base
+        self.host = base.split("://", 1)[1]
+        self.cards = cards
+        self.page_kb = page_kb
+        self.fonts = [make_font(variant) for variant in range(fonts)]
+
+    def obfuscate(self, text: str, variant: int) -> str:
+        digits = self.fonts[variant][1]
+        return "".join(digits.get(char, char) for char in text)
+
+    def list_page(self, page: int) -> str:
+        cards = []
+        for i in range(self.cards):
+            car_id = page * 1000 + i
+            rng = random.Random(car_id)
+            brand, model = rng.choice(BRANDS)
+            cards.append(
+                f'<li class="cards-li" infoid="{car_id}" price="{rng.randint(30, 400) / 10}">'
+                f'<a class="carinfo" href="{self.base}/dealer/{rng.randint(1, 999)}/{car_id}.html">'
+                f'<h4 class="card-name">{brand} {model} {rng.randint(2015, 2024)}款</h4></a></li>'
+            )
+        return self._wrap("二手车_二手车交易市场", "<ul class='viewlist_ul'>" + "".join(cards) + "</ul>")
+
+    def detail_page(self, car_id: int) -> str:
+        rng = random.Random(car_id)
+        variant = car_id % len(self.fonts)
+        brand, model = rng.choice(BRANDS)
+        fuel, engine = rng.choice(FUELS)
+        attrs = {
+            "上牌时间": self.obfuscate(f"{rng.randint(2015, 2024)}-{rng.randint(1, 12):02d}", variant),
+            "表显里程": self.obfuscate(f"{rng.randint(1, 150) / 10}万公里", variant),
+            "燃料类型": fuel,
+            "发动机": engine,
+            "变速箱": rng.choice(["自动", "手自一体", "双离合", "手动"]),
+            "驱动方式": rng.choice(["前置前驱", "前置四驱", "后置后驱"]),
+            "车辆级别": rng.choice(["紧凑型SUV", "中型车", "MPV"]),
+            "车身颜色": rng.choice(COLORS),
+            "所在地": rng.choice(["北京", "上海", "深圳", "成都"]),
+        }
+        items = "".join(f'<li><span class="item-name">{k}</span>{v}</li>' for k, v in attrs.items())
+        options = "".join(f"<li><p>{name}</p></li>" for name in rng.sample(FEATURES, 5))
+        images = "".join(
+            f'<div class="swiper-slide"><a><img src="//img.fake/{car_id}/800x600_{n}.jpg"></a></div>' for n in range(6)
+        )
+        price = self.obfuscate(f"{rng.randint(30, 400) / 10:.2f}万", variant)
+        body = (
+            f'<div class="car-box"><h3 class="car-brand-name">{brand} {model} {rng.randint(2015, 2024)}款 自动 精英型</h3>'
+            f'<span class="price">{price}</span></div>'
+            f'<div class="swiper-container">{images}</div>'
+            f'<div class="all-basic-content fn-clear"><ul class="basic-item-ul">{items}</ul></div>'
+            f'<ul id="caroptionulid">{options}</ul>'
+            f'<div id="messageBox"><p>{self.obfuscate(f"车辆编码：{car_id}", variant)}</p><p>车况良好，无事故。</p></div>'
+        )
+        font_face = f"<style>@font-face{{font-family:'fake';src:url('//{self.host}/fonts/{variant}.ttf')}}</style>"
+        return self._wrap(f"{brand}{model}_二手车", body, head=font_face)
+
+    def _wrap(self, title: str, body: str, head: str = "") -> str:
+        # Настоящие страницы весят сотни КБ, в основном скрипты и разметка вокруг
+        filler = "<script>var _t=" + json.dumps("x" * 1000) + ";</script>\n"
+        padding = filler * max(0, (self.page_kb - len(body) // 1024) // 2)
+        return f"<html><head><title>{title}</title>{head}</head><body>{padding}{body}{padding}</body></html>"
+
+
+class RecordedSite(Site):
+    """Страницы из PageArchive: списки по кругу, детали по пути URL, шрифты по пути из HTML"""
+
+    def __init__(self, base: str, archive_dir: str):
+        from src.services.page_archive import PageArchive
+
+        self.base = base
+        self.host = base.split("://", 1)[1]
+        self.archive = PageArchive(archive_dir)
+        self.lists = list(self.archive.latest("list").values())
+        self.details = {}
+        self.font_paths = {}
+        for entry in self.archive.latest("detail").values():
+            self.details[entry["url"].split("://", 1)[1].split("/", 1)[1]] = entry
+            if entry.get("font_sha"):
+                html = self.archive.get_blob(entry["sha"]).decode("utf-8")
+                match = re.search(r"url\('//[^/']+/([^']*?\.ttf)'\)", html)
+                if match:
+                    self.font_paths[match.group(1)] = entry["font_sha"]
+
+    def _rewrite(self, html: str) -> str:
+        return re.sub(r"//(www\.che168\.com|k2\.autoimg\.cn)", "//" + self.host, html).replace(
+            "https://" + self.host, self.base
+        )
+
+    def list_page(self, page: int) -> str:
+        entry = self.lists[(page - 1) % len(self.lists)]
+        return self._rewrite(self.archive.get_blob(entry["sha"]).decode("utf-8"))
+
+    def recorded_detail(self, path: str) -> str | None:
+        entry = self.details.get(path)
+        return self._rewrite(self.archive.get_blob(entry["sha"]).decode("utf-8")) if entry else None
+
+    def recorded_font(self, path: str) -> bytes | None:
+        sha = self.font_paths.get(path)
+        return self.archive.get_blob(sha) if sha else None
+
+
+# --- HTTP ---
+
+class FakeState:
+    site: Site | None = None
+    latency = 0.0
+    captcha_rate = 0.0
+    counts: dict[str, int] = {}
+    lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, location: str | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if location:
+            self.send_header("Location", location)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, kind: str):
+        with FakeState.lock:
+            FakeState.counts[kind] = FakeState.counts.get(kind, 0) + 1
+
+    def do_GET(self):
+        site = FakeState.site
+        path = self.path.split("?", 1)[0]
+
+        if path == "/__stats":
+            self._send(200, json.dumps(FakeState.counts).encode(), "application/json")
+            return
+        if path.startswith("/verify"):
+            self._count("captcha")
+            self._send(200, CAPTCHA_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+            return
+
+        time.sleep(FakeState.latency)
+        html = None
+        if path.startswith("/fonts/") or path.endswith(".ttf"):
+            self._count("font")
+            if isinstance(site, RecordedSite):
+                font = site.recorded_font(path.lstrip("/"))
+            else:
+                variant = int(path.rsplit("/", 1)[1].split(".")[0])
+                font = site.fonts[variant % len(site.fonts)][0]
+            if font is None:
+                self._send(404, b"", "text/plain")
+            else:
+                self._send(200, font, "font/ttf")
+            return
+
+        if random.random() < FakeState.captcha_rate:
+            self._send(302, b"", "text/html", location="/verify?back=" + path)
+            return
+
+        page = re.search(r"sp(\d+)exx0", path)
+        if page:
+            self._count("list")
+            html = site.list_page(int(page.group(1)))
+        elif path.endswith(".html"):
+            self._count("detail")
+            if isinstance(site, RecordedSite):
+                html = site.recorded_detail(path.lstrip("/"))
+            else:
+                html = site.detail_page(int(path.rsplit("/", 1)[1].split(".")[0]))
+
+        if html is None:
+            self._send(404, b"not found", "text/plain")
+        else:
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+
+def serve(
+    port: int,
+    latency: float = 0.0,
+    captcha_rate: float = 0.0,
+    cards: int = 20,
+    fonts: int = 4,
+    page_kb: int = 120,
+    archive_dir: str | None = None,
+) -> ThreadingHTTPServer:
+    base = f"http://127.0.0.1:{port}"
+    FakeState.site = RecordedSite(base, archive_dir) if archive_dir else Site(base, cards, fonts, page_kb)
+    FakeState.latency = latency
+    FakeState.captcha_rate = captcha_rate
+    FakeState.counts = {}
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа, сек")
+    parser.add_argument("--captcha-rate", type=float, default=0.0, help="Доля запросов, уходящих на капчу")
+    parser.add_argument("--cards", type=int, default=20, help="Машин на странице списка")
+    parser.add_argument("--fonts", type=int, default=4, help="Сколько разных шрифтов раздавать")
+    parser.add_argument("--page-kb", type=int, default=120, help="Примерный размер страницы, КБ")
+    parser.add_argument("--archive", default=None, help="Отдавать записанные страницы из PageArchive")
+    parser.add_argument("--glyph-index", default=None, help="Построить индекс глифов для шрифтов стенда")
+    args = parser.parse_args()
+
+    if args.glyph_index:
+        build_glyph_index(args.glyph_index, args.fonts)
+        print(f"Glyph index written to {args.glyph_index}")
+
+    serve(args.port, args.latency, args.captcha_rate, args.cards, args.fonts, args.page_kb, args.archive)
+    print(f"Fake che168 listening: CHE168_BASE_URL=http://127.0.0.1:{args.port} CHE168_FONT_HOST=127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
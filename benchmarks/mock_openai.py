@@ -0,0 +1,102 @@
+"""
+Локальный мок OpenAI Chat Completions для оффлайн-замеров ai_worker.
+
+    python -m benchmarks.mock_openai --port 8099 --latency 0.8
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=mock python -m src.main ai_worker
+
+Отвечает правдоподобной заглушкой по схеме AIProcessor, в том числе в пакетном режиме.
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_car(car: dict) -> dict:
+    title = car.get("title_raw") or ""
+    parts = title.split()
+    brand = parts[0] if parts else None
+    model = parts[1] if len(parts) > 1 else None
+    return {
+        "brand_en": "MockBrand", "brand_cn": brand,
+        "model_en": "MockModel", "model_cn": model,
+        "title_ru": "MockBrand MockModel",
+        "description_ru": "Тестовое описание.",
+        "color_en": "Other", "color_ru": "Другой",
+        "transmission_type": "automatic", "drive_type": "front",
+        "body_type": "crossover", "fuel_type": "gasoline",
+        "features_ru": list(car.get("features_list") or []),
+        "location": "Beijing",
+    }
+
+
+class MockState:
+    latency = 0.5
+    per_car_latency = 0.1
+    requests = 0
+    lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        user = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "{}")
+        payload = json.loads(user)
+
+        if "cars" in payload:
+            cars = payload["cars"]
+            content = {"cars": [{"id": car.get("id"), **fake_car(car)} for car in cars]}
+        else:
+            cars = [payload]
+            content = fake_car(payload)
+
+        with MockState.lock:
+            MockState.requests += 1
+        time.sleep(MockState.latency + MockState.per_car_latency * len(cars))
+
+        response = {
+            "id": f"chatcmpl-mock-{MockState.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(user) // 4, "completion_tokens": 200 * len(cars), "total_tokens": 0},
+        }
+        data = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(port: int, latency: float, per_car_latency: float) -> ThreadingHTTPServer:
+    MockState.latency = latency
+    MockState.per_car_latency = per_car_latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5, help="Базовая задержка ответа, сек")
+    parser.add_argument("--per-car-latency", type=float, default=0.1, help="Доп. задержка на каждую машину, сек")
+    args = parser.parse_args()
+
+    serve(args.port, args.latency, args.per_car_latency)
+    print(f"Mock OpenAI listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
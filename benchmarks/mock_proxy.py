@@ -0,0 +1,93 @@
+"""
+Локальные HTTP-прокси-заглушки для проверки ProxyPool.
+
+    python -m benchmarks.mock_proxy --port 8101 --count 4 --bad 1 --captcha-rate 0.5
+    PROXY_URLS=http://127.0.0.1:8101,http://127.0.0.1:8102,... python -m src.main worker
+
+Проксируют только обычный HTTP (абсолютный URL в GET, без CONNECT), поэтому
+годятся для локальных стендов вроде benchmarks.fake_che168. "Плохие" прокси
+с заданной вероятностью отдают страницу капчи вместо ответа или рвут соединение.
+"""
+import time
+import random
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CAPTCHA_PAGE = "<html><head><title>安全验证</title></head><body>verify</body></html>".encode("utf-8")
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    # Настройки конкретного прокси задает serve() через подкласс
+    latency = 0.0
+    captcha_rate = 0.0
+    error_rate = 0.0
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_CONNECT(self):
+        self._send(501, b"CONNECT is not supported by the mock proxy", "text/plain")
+
+    def do_GET(self):
+        type(self).requests += 1
+        time.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            self.close_connection = True
+            self.connection.close()
+            return
+        if random.random() < self.captcha_rate:
+            self._send(200, CAPTCHA_PAGE, "text/html; charset=utf-8")
+            return
+
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in ("proxy-connection", "connection", "host")}
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.path, headers=headers), timeout=30) as upstream:
+                self._send(upstream.status, upstream.read(), upstream.headers.get("Content-Type", "text/html"))
+        except Exception as e:
+            self._send(502, str(e).encode("utf-8"), "text/plain")
+
+
+def serve(port: int, latency: float = 0.0, captcha_rate: float = 0.0, error_rate: float = 0.0) -> ThreadingHTTPServer:
+    handler = type("Proxy%d" % port, (ProxyHandler,), {
+        "latency": latency, "captcha_rate": captcha_rate, "error_rate": error_rate,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8101, help="Порт первого прокси, остальные - следующие по порядку")
+    parser.add_argument("--count", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа, сек")
+    parser.add_argument("--bad", type=int, default=1, help="Сколько первых прокси отдают капчу и ошибки")
+    parser.add_argument("--captcha-rate", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    for i in range(args.count):
+        bad = i < args.bad
+        serve(
+            args.port + i, args.latency,
+            args.captcha_rate if bad else 0.0,
+            args.error_rate if bad else 0.0,
+        )
+    urls = ",".join(f"http://127.0.0.1:{args.port + i}" for i in range(args.count))
+    print(f"Mock proxies listening: PROXY_URLS={urls}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
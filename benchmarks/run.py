@@ -0,0 +1,317 @@
+"""
+Сквозной бенчмарк: producer -> worker -> ai_worker на локальном стенде.
+
+    python -m benchmarks.run --pages 10 --concurrency 8
+    python -m benchmarks.run --pages 10 --compare benchmarks/results/<прошлый>.json
+
+Поднимает Redis и Postgres (benchmarks.fixtures), fake che168 и мок OpenAI,
+запускает команды src.main отдельными процессами и собирает:
+страниц/сек и машин/мин, p50/p99 этапов (fetch, font, parse, decode, upsert, enrich)
+из STAGE_TIMINGS_PATH и пиковый RSS дерева процессов. Результат - JSON
+в benchmarks/results/ с коммитом в имени, чтобы сравнивать между коммитами.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from datetime import datetime, timezone
+
+from benchmarks import fake_che168, mock_openai
+from benchmarks.fixtures import free_port, redis_fixture, postgres_fixture
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def git_revision() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def process_tree(pid: int) -> list[int]:
+    """pid и все его потомки (пул парсинга, дочерние воркеры) по /proc"""
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def tree_rss_mb(pid: int) -> float | None:
+    if not os.path.isdir("/proc"):
+        return None
+    total = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return round(total / 1024, 1)
+
+
+class Command:
+    """Команда src.main в отдельном процессе с замером пикового RSS"""
+
+    def __init__(self, args: list[str], env: dict, timings_path: str | None = None, log_path: str | None = None):
+        env = dict(env)
+        if timings_path:
+            env["STAGE_TIMINGS_PATH"] = timings_path
+        self.timings_path = timings_path
+        self.log = open(log_path, "w") if log_path else subprocess.DEVNULL
+        self.proc = subprocess.Popen([sys.executable, "-m", "src.main", *args], env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        self.peak_rss_mb = 0.0
+
+    def sample(self):
+        rss = tree_rss_mb(self.proc.pid)
+        if rss:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+
+    def stop(self, timeout: float = 60) -> dict:
+        # SIGINT: команды штатно сбрасывают буферы и пишут сводку этапов
+        self.proc.send_signal(signal.SIGINT)
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        if self.log is not subprocess.DEVNULL:
+            self.log.close()
+        if self.timings_path and os.path.exists(self.timings_path):
+            with open(self.timings_path) as f:
+                return json.load(f)
+        return {}
+
+
+def wait_for(check, command: Command, timeout: float, poll: float = 0.5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        command.sample()
+        if command.proc.poll() is not None:
+            raise RuntimeError(f"{command.proc.args[3]} exited with code {command.proc.returncode}")
+        if check():
+            return True
+        time.sleep(poll)
+    return False
+
+
+def queues_drained(redis_client) -> bool:
+    keys = ["che168:list", "che168:detail"]
+    pipe = redis_client.pipeline()
+    for key in keys:
+        pipe.xlen(f"{key}:stream")
+        pipe.zcard(f"{key}:retry")
+    return not any(pipe.execute())
+
+
+def db_counts(database_url: str) -> dict:
+    import asyncpg
+
+    async def run():
+        conn = await asyncpg.connect(database_url.replace("+asyncpg", ""))
+        try:
+            rows = await conn.fetch("SELECT coalesce(ai_status, 'none') AS status, count(*) FROM raw_cars GROUP BY 1")
+        finally:
+            await conn.close()
+        return {row["status"]: row["count"] for row in rows}
+    try:
+        return asyncio.run(run())
+    except Exception:
+        return {}
+
+
+def reset_state(redis_url: str, database_url: str):
+    import redis
+    import asyncpg
+
+    redis.Redis.from_url(redis_url).flushdb()
+
+    async def run():
+        conn = await asyncpg.connect(database_url.replace("+asyncpg", ""))
+        try:
+            await conn.execute("DROP TABLE IF EXISTS raw_cars, car_history, schema_migrations CASCADE")
+        finally:
+            await conn.close()
+    asyncio.run(run())
+
+
+def fake_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/__stats") as response:
+        return json.loads(response.read())
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline.get('commit')} ({baseline_path}):")
+
+    def row(name: str, old, new, higher_is_better: bool):
+        if not old or new is None:
+            return
+        change = (new - old) / old * 100
+        better = change > 0 if higher_is_better else change < 0
+        mark = "+" if better else "-" if abs(change) >= 5 else " "
+        print(f"  {mark} {name:<34} {old:>10} -> {new:<10} ({change:+.1f}%)")
+
+    for command, throughput in (("worker", "pages_per_sec"), ("ai_worker", "cars_per_min")):
+        old, new = baseline.get(command) or {}, current.get(command) or {}
+        row(f"{command}.{throughput}", old.get(throughput), new.get(throughput), True)
+        row(f"{command}.peak_rss_mb", old.get("peak_rss_mb"), new.get("peak_rss_mb"), False)
+        for stage, stats in (new.get("stages") or {}).items():
+            old_stats = (old.get("stages") or {}).get(stage) or {}
+            for q in ("p50_ms", "p99_ms"):
+                row(f"{command}.{stage}.{q}", old_stats.get(q), stats.get(q), False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5, help="Страниц списка")
+    parser.add_argument("--cards", type=int, default=20, help="Машин на странице")
+    parser.add_argument("--concurrency", type=int, default=4, help="worker --concurrency")
+    parser.add_argument("--parse-workers", type=int, default=None, help="worker --parse-workers (по умолчанию - как у worker: число ядер)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка fake che168, сек")
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--page-kb", type=int, default=120)
+    parser.add_argument("--archive", default=None, help="Отдавать записанные страницы из PageArchive")
+    parser.add_argument("--ai-concurrency", type=int, default=4)
+    parser.add_argument("--cars-per-request", type=int, default=1)
+    parser.add_argument("--ai-latency", type=float, default=0.3, help="Задержка мока OpenAI, сек")
+    parser.add_argument("--skip-ai", action="store_true", help="Не замерять ai_worker")
+    parser.add_argument("--timeout", type=float, default=600, help="Предел на каждую фазу, сек")
+    parser.add_argument("--reset", action="store_true", help="Разрешить очистку БД/Redis из BENCH_*_URL")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    if (os.getenv("BENCH_REDIS_URL") or os.getenv("BENCH_DATABASE_URL")) and not args.reset:
+        sys.exit("BENCH_*_URL points to an existing service; re-run with --reset to allow wiping it")
+
+    work = tempfile.mkdtemp(prefix="che168-bench-")
+    che168_port, openai_port = free_port(), free_port()
+
+    with redis_fixture() as redis_url, postgres_fixture() as database_url:
+        import redis
+
+        env = {
+            **os.environ,
+            "DATABASE_URL": database_url,
+            "REDIS_URL": redis_url,
+            "CHE168_BASE_URL": f"http://127.0.0.1:{che168_port}",
+            "CHE168_FONT_HOST": f"127.0.0.1:{che168_port}",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+            "OPENAI_API_KEY": "mock",
+            "FONT_CACHE_DIR": os.path.join(work, "fonts"),
+            "GLYPH_INDEX_PATH": os.path.join(work, "glyph_index.npz"),
+            "ARCHIVE_DIR": "",
+            "PROXY_URLS": "",
+            "PROXY_FILE": "",
+            "PROXY_URL": "",
+            # Стенд локальный: лимитер не должен мерить сам себя
+            "RATE_LIMIT_RPS": "1000",
+            "RATE_LIMIT_MAX_RPS": "1000",
+            "RATE_LIMIT_BURST": "1000",
+        }
+        os.environ.update({k: env[k] for k in ("DATABASE_URL", "REDIS_URL", "GLYPH_INDEX_PATH")})
+        fake_che168.build_glyph_index(env["GLYPH_INDEX_PATH"])
+        fake_che168.serve(che168_port, args.latency, args.captcha_rate, args.cards, page_kb=args.page_kb, archive_dir=args.archive)
+        mock_openai.serve(openai_port, args.ai_latency, 0.05)
+
+        reset_state(redis_url, database_url)
+        redis_client = redis.Redis.from_url(redis_url)
+        result = {
+            "commit": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "params": vars(args),
+        }
+
+        # producer до старта воркера, иначе в замер попадет его разогрев
+        subprocess.run([sys.executable, "-m", "src.main", "producer", "--pages", str(args.pages), "--stop-after", "0"],
+                       env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        print(f"worker: {args.pages} pages x {args.cards} cars...")
+        started = time.monotonic()
+        worker = Command(
+            ["worker", "--concurrency", str(args.concurrency)]
+            + (["--parse-workers", str(args.parse_workers)] if args.parse_workers is not None else []),
+            env, os.path.join(work, "worker.json"), os.path.join(work, "worker.log"),
+        )
+        # Очереди пусты дважды подряд - значит и последняя задача подтверждена
+        drained = wait_for(lambda: queues_drained(redis_client) and (time.sleep(1) or queues_drained(redis_client)), worker, args.timeout)
+        elapsed = time.monotonic() - started
+        stages = worker.stop()
+        served = fake_stats(che168_port)
+        pages = served.get("list", 0) + served.get("detail", 0)
+        result["worker"] = {
+            "completed": drained,
+            "elapsed_s": round(elapsed, 2),
+            "served": served,
+            "pages_per_sec": round(pages / elapsed, 2),
+            "cars": sum(db_counts(database_url).values()),
+            "peak_rss_mb": worker.peak_rss_mb,
+            "stages": stages,
+        }
+
+        if not args.skip_ai:
+            print("ai_worker: enriching pending cars...")
+            total = db_counts(database_url).get("pending", 0)
+            started = time.monotonic()
+            ai = Command(
+                ["ai_worker", "--concurrency", str(args.ai_concurrency), "--cars-per-request", str(args.cars_per_request)],
+                env, os.path.join(work, "ai_worker.json"), os.path.join(work, "ai_worker.log"),
+            )
+            done = wait_for(lambda: db_counts(database_url).get("pending", total) == 0, ai, args.timeout, poll=1)
+            elapsed = time.monotonic() - started
+            result["ai_worker"] = {
+                "completed": done,
+                "elapsed_s": round(elapsed, 2),
+                "cars": total,
+                "cars_per_min": round(total / elapsed * 60, 1),
+                "statuses": db_counts(database_url),
+                "peak_rss_mb": ai.peak_rss_mb,
+                "stages": ai.stop(),
+            }
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{result['timestamp'].replace(':', '')}-{result['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    for command in ("worker", "ai_worker"):
+        data = result.get(command)
+        if not data:
+            continue
+        throughput = f"{data['pages_per_sec']} pages/s" if command == "worker" else f"{data['cars_per_min']} cars/min"
+        print(f"\n{command}: {throughput}, {data['elapsed_s']}s, peak RSS {data['peak_rss_mb']} MB"
+              + ("" if data["completed"] else " [TIMED OUT]"))
+        for stage, stats in data["stages"].items():
+            print(f"  {stage:<8} n={stats['count']:<6} p50={stats['p50_ms']:>9} ms  p99={stats['p99_ms']:>9} ms")
+    print(f"\nSaved {path} (logs in {work})")
+
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,124 @@ class Settings(BaseSettings):
 
     OPENAI_API_KEY: str | None = None
     OPENAI_MODEL: str = "gpt-4o-mini"
+    OPENAI_BASE_URL: str | None = None
+    # ai_worker: параллельные запросы, машин в одном запросе, машин за один заход в БД
+    AI_CONCURRENCY: int = 4
+    AI_CARS_PER_REQUEST: int = 1
+    AI_BATCH_SIZE: int = 20
+    # Новые машины будят ai_worker через Postgres NOTIFY; опрос БД - только страховка
+    AI_NOTIFY_CHANNEL: str = "raw_cars_pending"
+    AI_POLL_INTERVAL: float = 60
+    # Одна машина у нескольких дилеров: с какой оценки похожести (0..1) переиспользовать обогащение
+    DEDUP_THRESHOLD: float = 0.9
+    # Индекс дублей дочитывает строки старше этого (более свежие могли быть еще не закоммичены)
+    DEDUP_SETTLE_SECONDS: int = 10
+    # Кэш переводов по полям (признаки, марка/модель, город, характеристики)
+    TRANSLATION_CACHE_SIZE: int = 50000
+    TRANSLATION_CACHE_TTL: int = 90 * 24 * 3600
     PROXY_URL: str | None = None  
+    # Адреса che168 (меняются только для локального стенда benchmarks.fake_che168)
+    CHE168_BASE_URL: str = "https://www.che168.com"
+    CHE168_FONT_HOST: str = "k2.autoimg.cn"
+    # Пул прокси: список через запятую и/или файл (по одному на строку)
+    PROXY_URLS: str | None = None
+    PROXY_FILE: str | None = None
+    # Отдых прокси после капчи/серии ошибок (сек, удваивается при повторах)
+    PROXY_COOLDOWN: float = 120
+    PROXY_MAX_ERRORS: int = 3
     
     LOG_LEVEL: str = "INFO"
 
+    # Адаптивный лимит запросов к одному хосту (запросов/сек)
+    RATE_LIMIT_RPS: float = 0.7
+    RATE_LIMIT_MIN_RPS: float = 0.1
+    RATE_LIMIT_MAX_RPS: float = 5.0
+    RATE_LIMIT_BURST: float = 3
+    RATE_LIMIT_CAPTCHA_COOLDOWN: float = 60
+
+    # Пакетная запись машин в БД (write-behind)
+    WRITE_BATCH_SIZE: int = 200
+    WRITE_BATCH_MAX_AGE: float = 2.0
+    # После стольких неудачных сбросов подряд пачка пишется поштучно, а строки с ошибкой отбрасываются
+    WRITE_MAX_FAILURES: int = 3
+
+    # Кэш шрифтов che168 (пустое значение = только память)
+    FONT_CACHE_SIZE: int = 256
+    FONT_CACHE_DIR: str | None = "data/fonts"
+
+    # Индекс контуров глифов (строится командой calibrate-fonts)
+    GLYPH_INDEX_PATH: str = "data/glyph_index.npz"
+    GLYPH_MATCH_THRESHOLD: float = 0.05
+
+    # Инкрементальный обход: сколько страниц подряд без изменений до остановки
+    INCREMENTAL_STOP_AFTER: int = 3
+
+    # Сколько секунд объявление считается "уже в очереди"
+    DEDUP_TTL: int = 6 * 3600
+
+    # Очереди на Redis Streams: повторы с экспоненциальной задержкой (сек)
+    QUEUE_MAX_RETRIES: int = 5
+    QUEUE_RETRY_DELAY: float = 30
+    # Через сколько секунд задачу упавшего воркера забирает другой
+    QUEUE_CLAIM_IDLE: float = 600
+
+    # Парсер HTML: "lxml" или "html.parser"; частичный разбор только нужных блоков
+    HTML_PARSER: str = "lxml"
+    HTML_PARTIAL_PARSING: bool = True
+
+    # Резидентный планировщик обхода (команда scheduler), интервалы в секундах
+    SCHEDULE_TICK: float = 10
+    SCHEDULE_PAGES: int = 100
+    SCHEDULE_HOT_PAGES: int = 5
+    SCHEDULE_HOT_PAGE_INTERVAL: float = 1800
+    SCHEDULE_PAGE_INTERVAL: float = 12 * 3600
+    SCHEDULE_LISTING_MIN_INTERVAL: float = 3600
+    SCHEDULE_LISTING_MAX_INTERVAL: float = 7 * 24 * 3600
+    # С какого интервала начинает только что найденное объявление
+    SCHEDULE_LISTING_START_INTERVAL: float = 12 * 3600
+    # Объявление моложе этого возраста (по дате публикации на сайте) проверяется чаще
+    SCHEDULE_NEW_LISTING_AGE: float = 3 * 24 * 3600
+    # Сколько проверок подряд должны ответить "объявления нет" (404/410, страница снятого
+    # объявления), чтобы счесть его проданным; капча и сетевые ошибки не считаются
+    SCHEDULE_SOLD_AFTER: int = 3
+    # На сколько откладывается отправленный элемент, пока воркер его не обработал
+    SCHEDULE_LEASE: float = 3600
+
+    # Архив скачанных страниц и шрифтов для reparse (пустое значение = не архивировать)
+    ARCHIVE_DIR: str | None = "data/archive"
+    ARCHIVE_ZSTD_LEVEL: int = 10
+    ARCHIVE_LISTS: bool = True
+
+    # HTTP /metrics (Prometheus); у процессов под супервизором порт + номер процесса; 0 - выключено
+    WORKER_METRICS_PORT: int = 9168
+    AI_WORKER_METRICS_PORT: int = 9169
+    # Сэмплирующий профилировщик: /debug/profile?seconds=N и SIGUSR1 -> файл в PROFILER_DIR
+    PROFILER_ENABLED: bool = False
+    PROFILER_SECONDS: float = 30
+    PROFILER_DIR: str = "data/profiles"
+
+    # Куда процесс пишет сводку длительностей этапов при завершении (для бенчмарков)
+    STAGE_TIMINGS_PATH: str | None = None
+
+    # Фото машин: папка контент-адресуемого хранилища (пустое значение = не качать),
+    # сколько фото качать одновременно и склеивать ли перцептивно одинаковые (нужен Pillow)
+    IMAGE_DIR: str | None = None
+    IMAGE_CONCURRENCY: int = 16
+    IMAGE_PERCEPTUAL: bool = False
+
+    # На сколько месяцев вперед заранее создавать секции car_history
+    HISTORY_MONTHS_AHEAD: int = 2
+
+    # Где renormalize запоминает, до какого id уже дошел
+    RENORMALIZE_CHECKPOINT: str = "data/renormalize.json"
+
+    # Инкрементальная выгрузка для Laravel: папка, строк в файле, строк за один fetch курсора
+    EXPORT_DIR: str = "data/export"
+    EXPORT_CHUNK_ROWS: int = 50000
+    EXPORT_FETCH_ROWS: int = 2000
+    # Строки моложе этого не выгружаем: транзакция с более ранним now() может еще не закоммититься
+    EXPORT_SETTLE_SECONDS: int = 60
+
     class Config:
         env_file = ".env"
         extra = "ignore" 
@@ -13,4 +13,15 @@ AsyncSessionLocal = async_sessionmaker(
     engine,
     expire_on_commit=False,
     autoflush=False
-)
\ No newline at end of file
+)
+
+async def init_db():
+    # Импорт здесь: модели и миграции нужны только командам, работающим с БД
+    from src.models import Base
+    from src.migrations import run_migrations
+    from src.services.history import ensure_partitions
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+        await ensure_partitions(conn)
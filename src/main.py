@@ -1,42 +1,26 @@
-import asyncio
 import json
+import time
+import asyncio
 import typer
 
 from redis import asyncio as aioredis
-from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy import select, func
 from loguru import logger
 
 from src.config import settings
-from src.database import engine, AsyncSessionLocal
-from src.models import Base, RawCar
-from src.scrapers.che168 import Che168Scraper
-from src.services.ai_processor import AIProcessor
+from src.services.fingerprints import ScanTracker, encode_list_task
+from src.services.task_queue import StreamQueue, LIST_QUEUE
 
-app = typer.Typer()
+# Тяжелые модули (SQLAlchemy, OpenAI, fontTools, bs4, curl_cffi) импортируются
+# внутри команд: короткие вызовы вроде producer не должны их грузить
 
-async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-async def save_car_data(car_data: dict):
-    """Сохраняет или обновляет данные машины"""
-    async with AsyncSessionLocal() as session:
-        stmt = insert(RawCar).values(
-            site_source=car_data.get('source', 'che168'),
-            external_id=car_data['external_id'],
-            raw_data=car_data
-        ).on_conflict_do_update(
-            index_elements=['external_id'],
-            set_={'raw_data': car_data, 'updated_at': func.now()}
-        )
-        await session.execute(stmt)
-        await session.commit()
+app = typer.Typer()
 
 @app.command()
 def producer(
     pages: int = typer.Option(5, help="Сколько страниц парсить"),
-    start: int = typer.Option(1, help="С какой страницы начать")
+    start: int = typer.Option(1, help="С какой страницы начать"),
+    stop_after: int = typer.Option(settings.INCREMENTAL_STOP_AFTER, help="Остановиться после N страниц подряд без изменений (0 - не останавливаться)"),
+    force: bool = typer.Option(False, help="Ставить в очередь детали всех объявлений, даже не изменившихся")
 ):
     """
     Генерирует задачи. 
@@ -45,12 +29,14 @@ def producer(
     """
     async def run():
         redis = await aioredis.from_url(settings.REDIS_URL)
+        scan_id = await ScanTracker(redis).start(first_page=start, stop_after=stop_after, force=force)
         
         end_page = start + pages
-        logger.info(f"🚀 Adding tasks for pages {start} to {end_page - 1}...")
+        logger.info(f"🚀 Scan #{scan_id}: adding tasks for pages {start} to {end_page - 1}...")
         
-        for i in range(start, end_page):
-            await redis.lpush("che168:list_queue", i)
+        list_queue = StreamQueue(redis, LIST_QUEUE)
+        await list_queue.ensure_group()
+        await list_queue.push_many([encode_list_task(i, scan_id) for i in range(start, end_page)])
             
         await redis.aclose()
         logger.success(f"Enqueued {pages} pages")
@@ -58,124 +44,447 @@ def producer(
     asyncio.run(run())
 
 @app.command()
-def worker():
-    """Умный воркер: обрабатывает и списки, и детали"""
+def scheduler(
+    pages: int = typer.Option(settings.SCHEDULE_PAGES, help="Сколько страниц выдачи держать в расписании"),
+    tick: float = typer.Option(settings.SCHEDULE_TICK, help="Как часто проверять расписание (сек)")
+):
+    """
+    Резидентный планировщик: по расписанию свежести ставит в очередь
+    страницы списка и повторные проверки отдельных объявлений
+    """
+    from src.services.scheduler import CrawlScheduler
+
     async def run():
-        await init_db()
         redis = await aioredis.from_url(settings.REDIS_URL)
-        scraper = Che168Scraper()
-        
-        logger.info("Worker started. Listening to queues...")
-        
+        schedule = CrawlScheduler(redis)
+        for queue in (schedule.list_queue, schedule.detail_queue):
+            await queue.ensure_group()
+        await schedule.seed_pages(pages)
+        logger.info(f"🗓 Scheduler started: {pages} pages, tick {tick}s, {await schedule.stats()}")
+
+        last_report = 0.0
         try:
             while True:
-                task = await redis.blpop(["che168:detail_queue", "che168:list_queue"], timeout=5)
-                
-                if not task:
-                    continue
-                
-                queue_name, data = task
-                queue_name = queue_name.decode('utf-8')
-                
-                if "list_queue" in queue_name:
-                    page = int(data)
-                    logger.info(f"[LIST] Parsing page {page}")
-                    
-                    cars_preview = await scraper.parse_list(page)
-                    
-                    if cars_preview:
-                        logger.info(f"Found {len(cars_preview)} cars. Enqueuing details...")
-                        for car in cars_preview:
-                            await save_car_data(car)
-                            
-                            await redis.lpush("che168:detail_queue", json.dumps(car))
-                    
-                    await asyncio.sleep(2) 
-
-                elif "detail_queue" in queue_name:
-                    car_basic = json.loads(data)
-                    url = car_basic.get('link')
-                    ex_id = car_basic.get('external_id')
-                    
-                    if not url:
-                        continue
-
-                    logger.info(f"[DETAIL] Parsing car {ex_id}")
-                    
-                    full_car_data = await scraper.parse_detail(url, basic_info=car_basic)
-                    
-                    if full_car_data is None:
-                        logger.error("DETAIL parse failed, skipping")
-                        await asyncio.sleep(10)
-                        continue
-
-                    await save_car_data(full_car_data)
-                    
-                    await asyncio.sleep(1.5)
-
-        except Exception as e:
-            logger.critical(f"Worker crashed: {e}")
+                try:
+                    sent_pages, sent_cars = await schedule.dispatch()
+                    if sent_pages or sent_cars:
+                        logger.info(f"Dispatched {sent_pages} pages, {sent_cars} listing re-checks")
+                    if time.monotonic() - last_report > 600:
+                        last_report = time.monotonic()
+                        logger.info(f"🗓 Schedule: {await schedule.stats()}")
+                except Exception as e:
+                    logger.error(f"Scheduler loop error: {e}")
+                await asyncio.sleep(tick)
         finally:
-            await scraper.close()
             await redis.aclose()
 
     asyncio.run(run())
 
+@app.command()
+def worker(
+    concurrency: int = typer.Option(1, help="Сколько задач обрабатывать одновременно (с пулом прокси - не меньше числа прокси)"),
+    parse_workers: int = typer.Option(None, help="Процессов для парсинга HTML (по умолчанию - число ядер, 0 - парсить в event loop)"),
+    processes: int = typer.Option(1, help="Сколько процессов-воркеров запустить под супервизором"),
+    use_uvloop: bool = typer.Option(False, "--uvloop", help="Запускать event loop на uvloop"),
+    metrics_port: int = typer.Option(settings.WORKER_METRICS_PORT, help="Порт /metrics (0 - выключить; под супервизором - порт + номер процесса)")
+):
+    """Умный воркер: обрабатывает и списки, и детали"""
+    import os
+    from src.worker import run_loop, run_worker, supervise
+
+    if processes > 1:
+        # Ядра уже заняты процессами-воркерами, отдельный пул парсинга не нужен
+        supervise(processes, concurrency, parse_workers or 0, use_uvloop, metrics_port)
+        return
+
+    if parse_workers is None:
+        parse_workers = os.cpu_count() or 1
+    run_loop(run_worker(concurrency, parse_workers, metrics_port), use_uvloop)
+
 @app.command(name="ai_worker")
-def ai_worker():
+def ai_worker(
+    concurrency: int = typer.Option(settings.AI_CONCURRENCY, help="Сколько запросов к OpenAI держать одновременно"),
+    cars_per_request: int = typer.Option(settings.AI_CARS_PER_REQUEST, help="Сколько машин упаковывать в один запрос"),
+    batch_size: int = typer.Option(settings.AI_BATCH_SIZE, help="Сколько машин забирать из БД за раз"),
+    metrics_port: int = typer.Option(settings.AI_WORKER_METRICS_PORT, help="Порт /metrics (0 - выключить)"),
+    poll_interval: float = typer.Option(settings.AI_POLL_INTERVAL, help="Страховочный опрос БД без NOTIFY, секунд")
+):
     """Фоновый процесс: читает БД и обогащает данные через OpenAI"""
+    from sqlalchemy import select, update, func
+    from src.database import AsyncSessionLocal, init_db
+    from src.models import RawCar
+    from src.services.ai_processor import AIProcessor
+    from src.services.translation_cache import TranslationCache
+    from src.services.normalizer import Normalizer, canonical_fuel
+    from src.services.pending_listener import PendingListener
+    from src.services.duplicates import DuplicateIndex, borrowed_enrichment
+    from src.services.timings import stages
+    from src.services.metrics import AI_BACKLOG, AI_CARS, start_metrics_server
+
+    async def enrich(ai: "AIProcessor", semaphore: asyncio.Semaphore, group: list[dict]) -> list[dict | None]:
+        async with semaphore:
+            with stages.stage("enrich"):
+                return await ai.process_cars(group)
+
+    async def track_backlog(every: float = 15):
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    backlog = await session.scalar(select(func.count()).select_from(RawCar).where(RawCar.ai_status == 'pending'))
+                AI_BACKLOG.set(backlog or 0)
+            except Exception as e:
+                logger.debug(f"Backlog for metrics failed: {e}")
+            await asyncio.sleep(every)
+
     async def run():
-        ai = AIProcessor()
-        BATCH_SIZE = 10 
+        await init_db()
+        start_metrics_server(metrics_port)
+        # Ссылку держим, иначе фоновую задачу может собрать GC
+        backlog_task = asyncio.create_task(track_backlog())
+        redis = await aioredis.from_url(settings.REDIS_URL)
+        translations = TranslationCache(redis)
+        normalizer = Normalizer()
+        ai = AIProcessor(cache=translations, normalizer=normalizer)
+        semaphore = asyncio.Semaphore(concurrency)
+        listener = PendingListener()
+        await listener.connect()
+        duplicates = DuplicateIndex()
         
-        logger.info("🤖 AI Worker started. Waiting for cars...")
+        logger.info(f"🤖 AI Worker started (concurrency={concurrency}, cars_per_request={cars_per_request}). Waiting for cars...")
         
         while True:
             try:
+                listener.clear()
+                # Первый раз - все разобранные машины, дальше только измененные с прошлого раза
+                async with AsyncSessionLocal() as session:
+                    await duplicates.load(session)
+
                 async with AsyncSessionLocal() as session:
+                    # SKIP LOCKED: соседние реплики ai_worker берут другие строки
                     query = (
                         select(RawCar)
-                        .where(
-                            RawCar.raw_data['ai_processed'].is_(None),  
-                            RawCar.raw_data['parsed_success'].astext == 'true'
-                        )
+                        .where(RawCar.ai_status == 'pending')
                         .order_by(RawCar.id.desc()) 
-                        .limit(BATCH_SIZE)
+                        .limit(batch_size)
+                        .with_for_update(skip_locked=True)
                     )
                     
                     result = await session.execute(query)
                     cars = result.scalars().all()
 
                     if not cars:
-                        await asyncio.sleep(5)
+                        # Закрываем транзакцию и ждем NOTIFY от upsert_cars; опрос - раз в poll_interval
+                        await session.rollback()
+                        await listener.wait(poll_interval)
                         continue
 
                     logger.info(f"Processing batch of {len(cars)} cars...")
+                    started = time.monotonic()
+
+                    # Та же машина у другого дилера, уже обогащенная, - берем ее ответ вместо запроса к LLM
+                    candidates = duplicates.candidates([(car.id, car.raw_data) for car in cars])
+                    donors = {}
+                    if candidates:
+                        rows = await session.execute(
+                            select(RawCar.id, RawCar.raw_data)
+                            .where(RawCar.id.in_(set(candidates.values())), RawCar.ai_status == 'done')
+                        )
+                        donors = {row.id: row.raw_data for row in rows if row.raw_data.get('ai_fields')}
+                    links = duplicates.link_donors(candidates, donors)
+
+                    payloads = [dict(car.raw_data) for car in cars]
+                    fresh = [data for car, data in zip(cars, payloads) if car.id not in links]
+                    groups = [fresh[i:i + cars_per_request] for i in range(0, len(fresh), cars_per_request)]
+                    answers = await asyncio.gather(*(enrich(ai, semaphore, group) for group in groups))
+                    answered = iter([answer for group_answers in answers for answer in group_answers])
+                    ai_results = [
+                        None if car.id in links else next(answered)
+                        for car in cars
+                    ]
 
-                    for car in cars:
-                        current_data = dict(car.raw_data)
-                        
-                        ai_data = await ai.process_car(current_data)
-                        
+                    for car, current_data, ai_data in zip(cars, payloads, ai_results):
+                        canonical_id = links.get(car.id)
+                        reused = canonical_id is not None
+                        if reused:
+                            ai_data = borrowed_enrichment(donors[canonical_id], current_data)
+                        # Дописываем в JSONB только новые ключи (raw_data || patch), а не весь документ
                         if ai_data:
-                            current_data.update(ai_data)
-                            current_data['ai_processed'] = True
-                            
-                            car.raw_data = current_data
-                            session.add(car)
-                            logger.success(f"✅ Enriched: {current_data.get('title')} -> {ai_data.get('transmission_type')}")
+                            # ai_fields - какие ключи принадлежат AI: повторный парсинг деталей их не перезатрет
+                            patch = {**ai_data, 'ai_processed': True, 'ai_fields': sorted(ai_data)}
+                            columns = {'ai_status': 'done', 'brand': ai_data.get('brand_en') or car.brand}
+                            fuel_type = canonical_fuel(ai_data.get('fuel_type'))
+                            if fuel_type:
+                                columns['fuel_type'] = fuel_type
+                            if reused:
+                                AI_CARS.labels("reused").inc()
+                                logger.success(f"♊ Duplicate of #{canonical_id}, enrichment reused: {current_data.get('title')}")
+                            else:
+                                AI_CARS.labels("done").inc()
+                                logger.success(f"✅ Enriched: {current_data.get('title')} -> {ai_data.get('transmission_type')}")
                         else:
-                            current_data['ai_processed'] = 'failed'
-                            car.raw_data = current_data
-                            session.add(car)
+                            patch = {'ai_processed': 'failed'}
+                            columns = {'ai_status': 'failed'}
+                            AI_CARS.labels("failed").inc()
+                        if reused:
+                            columns['canonical_id'] = canonical_id
+                        await session.execute(
+                            update(RawCar)
+                            .where(RawCar.id == car.id)
+                            .values(raw_data=RawCar.raw_data.concat(patch), **columns)
+                        )
 
                     await session.commit()
+
+                    elapsed = time.monotonic() - started
+                    logger.info(f"⏱ {len(cars)} cars in {elapsed:.1f}s ({len(cars) / elapsed * 60:.0f} cars/min)")
+                    logger.info(f"📚 Translation cache: {translations.stats()}")
+                    await normalizer.flush_stats(redis)
                     
             except Exception as e:
                 logger.error(f"AI Worker loop error: {e}")
                 await asyncio.sleep(5)
 
+    try:
+        asyncio.run(run())
+    finally:
+        stages.dump(settings.STAGE_TIMINGS_PATH)
+
+@app.command()
+def reparse(
+    since: str = typer.Option(None, help="Только страницы, скачанные начиная с даты (YYYY-MM-DD)"),
+    limit: int = typer.Option(0, help="Сколько машин перепарсить (0 - все)"),
+    parse_workers: int = typer.Option(None, help="Процессов для парсинга (по умолчанию - число ядер)"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Только разобрать и посчитать, в БД не писать")
+):
+    """Офлайн: заново разбирает архивные страницы деталей текущими правилами и пишет в БД"""
+    import os
+    from src.database import init_db
+    from src.scrapers.che168 import Che168Scraper
+    from src.services.page_archive import PageArchive
+    from src.services.parse_pool import ParsePool
+    from src.services.timings import stages
+    from src.services.write_buffer import CarWriteBuffer
+
+    async def run():
+        archive = PageArchive()
+        entries = list(archive.latest("detail", since).values())
+        if limit:
+            entries = entries[:limit]
+        logger.info(f"♻️ Reparsing {len(entries)} archived detail pages from {archive.root}")
+
+        processes = parse_workers or os.cpu_count() or 1
+        parse_pool = ParsePool(processes)
+        scraper = Che168Scraper(parse_pool=parse_pool, archive=archive)
+        writer = None
+        if not dry_run:
+            await init_db()
+            writer = CarWriteBuffer()
+            await writer.start()
+
+        counts = {"parsed": 0, "failed": 0}
+        pending = iter(entries)
+        started = time.monotonic()
+
+        async def consume():
+            # Парсинг в процессах пула: в event loop только распаковка zstd и запись
+            for entry in pending:
+                try:
+                    car = await scraper.replay_detail(entry)
+                except Exception as e:
+                    logger.warning(f"Reparse failed for {entry['url']}: {e}")
+                    car = None
+                if not car or not car.get('parsed_success'):
+                    counts["failed"] += 1
+                    continue
+                counts["parsed"] += 1
+                if writer:
+                    await writer.add(car)
+
+        try:
+            await asyncio.gather(*(consume() for _ in range(processes * 2)))
+        finally:
+            if writer:
+                await writer.close()
+            await scraper.close()
+            parse_pool.close()
+
+        elapsed = time.monotonic() - started
+        logger.success(
+            f"Reparsed {counts['parsed']} cars ({counts['failed']} failed) in {elapsed:.1f}s"
+            + (" [dry run]" if dry_run else "")
+        )
+
+    try:
+        asyncio.run(run())
+    finally:
+        stages.dump(settings.STAGE_TIMINGS_PATH)
+
+@app.command()
+def images(
+    cars: int = typer.Option(8, help="Сколько машин обрабатывать одновременно"),
+    concurrency: int = typer.Option(settings.IMAGE_CONCURRENCY, help="Сколько фото качать одновременно")
+):
+    """Фоновый процесс: качает фото из очереди в контент-адресуемое хранилище"""
+    from src.services.image_store import ImageStore
+    from src.services.task_queue import IMAGE_QUEUE
+
+    async def run():
+        redis = await aioredis.from_url(settings.REDIS_URL)
+        store = ImageStore(redis, concurrency=concurrency)
+        queue = StreamQueue(redis, IMAGE_QUEUE)
+        await queue.ensure_group()
+
+        async def consume():
+            while True:
+                for task in await queue.read(count=1, block=1):
+                    payload = json.loads(task.data)
+                    try:
+                        await store.fetch_car(payload['external_id'], payload['images'])
+                    except Exception as e:
+                        if not await queue.retry(task, str(e)):
+                            logger.error(f"Images of {payload['external_id']} moved to dead-letter: {e}")
+                        continue
+                    await queue.ack(task)
+
+        async def housekeeping(every: float = 60):
+            last = time.monotonic()
+            while True:
+                await queue.promote_due()
+                if time.monotonic() - last >= every:
+                    logger.info(f"🖼 Images: {store.stats()}")
+                    last = time.monotonic()
+                await asyncio.sleep(1)
+
+        logger.info(f"🖼 Image fetcher started (cars={cars}, concurrency={concurrency}) into {store.root}")
+        try:
+            await asyncio.gather(housekeeping(), *(consume() for _ in range(cars)))
+        finally:
+            logger.info(f"🖼 Images on exit: {store.stats()}")
+            await store.close()
+            await redis.aclose()
+
     asyncio.run(run())
 
+@app.command()
+def export(
+    out_dir: str = typer.Option(settings.EXPORT_DIR, help="Папка для файлов выгрузки и checkpoint.json"),
+    fmt: str = typer.Option("jsonl", "--format", help="jsonl или parquet (нужен pyarrow)"),
+    chunk_rows: int = typer.Option(settings.EXPORT_CHUNK_ROWS, help="Сколько машин в одном файле"),
+    only_enriched: bool = typer.Option(False, "--only-enriched", help="Только машины, прошедшие ai_worker"),
+    full: bool = typer.Option(False, "--full", help="Игнорировать водяной знак и выгрузить все заново"),
+    limit: int = typer.Option(0, help="Сколько машин выгрузить за запуск (0 - все изменившиеся)")
+):
+    """Выгружает изменившиеся с прошлого запуска машины для Laravel (JSONL / Parquet)"""
+    import os
+    from src.database import init_db
+    from src.services.exporter import CarExporter
+
+    async def run():
+        await init_db()
+        exporter = CarExporter(out_dir=out_dir, fmt=fmt, chunk_rows=chunk_rows)
+        if full and os.path.exists(exporter.checkpoint_path):
+            os.remove(exporter.checkpoint_path)
+
+        started = time.monotonic()
+        result = await exporter.run(only_enriched=only_enriched, limit=limit)
+        elapsed = time.monotonic() - started
+        logger.success(
+            f"Exported {result['rows']} cars into {len(result['files'])} files in {elapsed:.1f}s "
+            f"(watermark {result['watermark']})"
+        )
+
+    asyncio.run(run())
+
+@app.command()
+def renormalize(
+    parse_workers: int = typer.Option(None, help="Процессов для пересчета (по умолчанию - число ядер)"),
+    batch: int = typer.Option(1000, help="Строк в одной пачке (fetch курсора и UPDATE)"),
+    limit: int = typer.Option(0, help="Сколько строк обработать (0 - все)"),
+    restart: bool = typer.Option(False, "--restart", help="Начать с начала, а не с checkpoint"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Только показать, что изменится"),
+    top: int = typer.Option(20, help="Сколько самых частых изменений показать")
+):
+    """Офлайн: пересчитывает производные поля по сохраненным raw_attributes текущими правилами"""
+    from src.database import init_db
+    from src.services.parse_pool import ParsePool
+    from src.services.renormalizer import Renormalizer
+
+    async def run():
+        await init_db()
+        pool = ParsePool(parse_workers)
+        renormalizer = Renormalizer(pool, batch=batch, dry_run=dry_run)
+        start_id = 0 if restart or dry_run else renormalizer.load_checkpoint()
+        if start_id:
+            logger.info(f"Resuming after id {start_id} ({renormalizer.checkpoint_path})")
+
+        started = time.monotonic()
+        try:
+            await renormalizer.run(start_id, limit)
+        finally:
+            pool.close()
+
+        elapsed = time.monotonic() - started
+        counts = renormalizer.counts
+        logger.success(
+            f"Renormalized {counts['changed']} of {counts['scanned']} rows in {elapsed:.1f}s"
+            + (" [dry run]" if dry_run else "")
+        )
+        for line in renormalizer.report(top):
+            logger.info(line)
+
+    asyncio.run(run())
+
+@app.command(name="normalizer-report")
+def normalizer_report(
+    top: int = typer.Option(30, help="Сколько самых частых нераспознанных значений показать")
+):
+    """Покрытие локальных правил: какие сырые значения все еще уходят в LLM"""
+    from src.services.normalizer import Normalizer
+
+    async def run():
+        redis = await aioredis.from_url(settings.REDIS_URL)
+        coverage, misses = await Normalizer.report(redis)
+        await redis.aclose()
+
+        for spec, (local, total) in coverage.items():
+            share = f"{local / total:.1%}" if total else "-"
+            logger.info(f"{spec:<13} resolved locally {local}/{total} ({share})")
+        for spec, raw, count in misses[:top]:
+            logger.info(f"  LLM fallback x{count}: {spec} = {raw!r}")
+
+    asyncio.run(run())
+
+@app.command(name="calibrate-fonts")
+def calibrate_fonts(
+    labels: str = typer.Option(None, help="JSON с ручной разметкой: {\"<md5 глифа>\": \"5\", ...}"),
+    unknown_out: str = typer.Option("data/unknown_glyphs.json", help="Куда сохранить неразмеченные глифы"),
+):
+    """Оффлайн: строит/пополняет индекс глифов по шрифтам из кэша"""
+    import glob
+    import os
+    from src.services.font_decoder import FontDecoder
+    from src.services.glyph_index import GlyphIndex, calibrate
+
+    manual = {}
+    if labels:
+        with open(labels, encoding="utf-8") as f:
+            manual = json.load(f)
+
+    font_paths = sorted(glob.glob(os.path.join(settings.FONT_CACHE_DIR or "", "fonts", "*.ttf")))
+    index = GlyphIndex()
+    before = len(index)
+
+    stats = calibrate(index, font_paths, manual, FontDecoder.KNOWN_HASHES)
+    index.save()
+
+    logger.success(
+        f"Calibrated on {stats['fonts']} fonts: {before} -> {len(index)} glyphs "
+        f"(+{stats['added']}, {stats['matched']} by nearest neighbour)"
+    )
+    if stats["unknown"]:
+        with open(unknown_out, "w", encoding="utf-8") as f:
+            json.dump({h: "" for h in stats["unknown"]}, f, ensure_ascii=False, indent=2)
+        logger.warning(f"{len(stats['unknown'])} glyphs still unknown. Label them in {unknown_out} and re-run with --labels")
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,99 @@
+from sqlalchemy import text
+from loguru import logger
+
+# Идемпотентные миграции поверх create_all: (id, SQL).
+# create_all создает новые таблицы и колонки только для новой БД,
+# для существующей - дописываем здесь. Каждая миграция выполняется один раз.
+MIGRATIONS: list[tuple[str, str]] = [
+    (
+        "001_ai_status_column",
+        "ALTER TABLE raw_cars ADD COLUMN IF NOT EXISTS ai_status VARCHAR(20)",
+    ),
+    (
+        "002_ai_status_index",
+        "CREATE INDEX IF NOT EXISTS ix_raw_cars_ai_status ON raw_cars (ai_status)",
+    ),
+    (
+        "003_ai_status_backfill",
+        """
+        UPDATE raw_cars SET ai_status = CASE
+            WHEN raw_data->>'ai_processed' = 'true' THEN 'done'
+            WHEN raw_data->>'ai_processed' = 'failed' THEN 'failed'
+            ELSE 'pending'
+        END
+        WHERE ai_status IS NULL AND raw_data->>'parsed_success' = 'true'
+        """,
+    ),
+    (
+        "004_hot_columns",
+        """
+        ALTER TABLE raw_cars
+            ADD COLUMN IF NOT EXISTS price INTEGER,
+            ADD COLUMN IF NOT EXISTS year SMALLINT,
+            ADD COLUMN IF NOT EXISTS mileage INTEGER,
+            ADD COLUMN IF NOT EXISTS brand VARCHAR(100),
+            ADD COLUMN IF NOT EXISTS fuel_type VARCHAR(30)
+        """,
+    ),
+    (
+        # Индексы после заполнения: так дешевле, чем обновлять их построчно
+        "005_hot_columns_backfill",
+        """
+        UPDATE raw_cars SET
+            price = CASE WHEN jsonb_typeof(raw_data->'price') = 'number'
+                THEN round((raw_data->>'price')::numeric)::int END,
+            year = CASE WHEN jsonb_typeof(raw_data->'year') = 'number'
+                THEN (raw_data->>'year')::numeric::smallint END,
+            mileage = CASE WHEN jsonb_typeof(raw_data->'mileage') = 'number'
+                THEN round((raw_data->>'mileage')::numeric)::int END,
+            brand = NULLIF(raw_data->>'brand_en', ''),
+            -- Словарь колонки - как у canonical_fuel: petrol парсера и gasoline модели совпадают
+            fuel_type = CASE
+                WHEN upper(raw_data->>'fuel_type') IN ('GASOLINE', 'PETROL') THEN 'gasoline'
+                WHEN upper(raw_data->>'fuel_type') = 'DIESEL' THEN 'diesel'
+                WHEN upper(raw_data->>'fuel_type') = 'ELECTRIC' THEN 'electric'
+                WHEN upper(raw_data->>'fuel_type') IN ('HYBRID', 'PHEV') THEN 'hybrid'
+            END,
+            -- Парсер раньше клал raw_attributes / features JSON-строкой внутрь JSONB
+            raw_data = raw_data
+                || CASE WHEN jsonb_typeof(raw_data->'raw_attributes') = 'string'
+                    THEN jsonb_build_object('raw_attributes', (raw_data->>'raw_attributes')::jsonb) ELSE '{}' END
+                || CASE WHEN jsonb_typeof(raw_data->'features') = 'string'
+                    THEN jsonb_build_object('features', (raw_data->>'features')::jsonb) ELSE '{}' END
+        WHERE price IS NULL AND year IS NULL AND mileage IS NULL AND brand IS NULL
+        """,
+    ),
+    *(
+        (f"006_{column}_index", f"CREATE INDEX IF NOT EXISTS ix_raw_cars_{column} ON raw_cars ({column})")
+        for column in ("price", "year", "mileage", "brand", "fuel_type")
+    ),
+    (
+        "007_updated_at_index",
+        "CREATE INDEX IF NOT EXISTS ix_raw_cars_updated_at_id ON raw_cars (updated_at, id)",
+    ),
+    (
+        "008_canonical_id_column",
+        "ALTER TABLE raw_cars ADD COLUMN IF NOT EXISTS canonical_id INTEGER",
+    ),
+    (
+        "009_canonical_id_index",
+        "CREATE INDEX IF NOT EXISTS ix_raw_cars_canonical_id ON raw_cars (canonical_id)",
+    ),
+]
+
+
+async def run_migrations(conn):
+    # Несколько процессов стартуют одновременно - миграции применяет кто-то один
+    await conn.execute(text("SELECT pg_advisory_xact_lock(168168)"))
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "id VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMPTZ DEFAULT now())"
+    ))
+    applied = set((await conn.execute(text("SELECT id FROM schema_migrations"))).scalars())
+
+    for migration_id, sql in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        logger.info(f"🛠 Applying migration {migration_id}")
+        await conn.execute(text(sql))
+        await conn.execute(text("INSERT INTO schema_migrations (id) VALUES (:id)"), {"id": migration_id})
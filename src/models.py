@@ -1,13 +1,15 @@
 from datetime import datetime
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import String, DateTime, func
+from sqlalchemy import String, DateTime, Integer, SmallInteger, Index, Table, Column, text, func
 
 class Base(DeclarativeBase):
     pass
 
 class RawCar(Base):
     __tablename__ = "raw_cars"
+    # Водяной знак инкрементальной выгрузки (export): (updated_at, id) > последний выгруженный
+    __table_args__ = (Index("ix_raw_cars_updated_at_id", "updated_at", "id"),)
 
     # Уникальный ID записи в нашей базе
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -21,6 +23,21 @@ class RawCar(Base):
     # Вся информация (цена, фото, описание) хранится тут как JSON
     # Это позволяет гибко менять структуру без миграций базы
     raw_data: Mapped[dict] = mapped_column(JSONB)
+
+    # Статус AI-обогащения: pending / done / failed (NULL - еще нет деталей)
+    # Отдельная колонка с индексом, чтобы ai_worker не сканировал JSONB
+    ai_status: Mapped[str | None] = mapped_column(String(20), index=True, nullable=True)
+
+    # Горячие поля для фильтров и сортировки - копии из raw_data с нормальными типами.
+    # Заполняются при каждой записи (write_buffer.hot_columns), в JSONB остаются как были
+    price: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)  # юани
+    year: Mapped[int | None] = mapped_column(SmallInteger, index=True, nullable=True)
+    mileage: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)  # км
+    brand: Mapped[str | None] = mapped_column(String(100), index=True, nullable=True)
+    fuel_type: Mapped[str | None] = mapped_column(String(30), index=True, nullable=True)
+
+    # Та же машина у другого дилера: id канонической записи, чье обогащение переиспользовано
+    canonical_id: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)
     
     # Время первого парсинга
     parsed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -30,4 +47,27 @@ class RawCar(Base):
         DateTime(timezone=True), 
         onupdate=func.now(), 
         server_default=func.now()
-    )
\ No newline at end of file
+    )
+
+
+# История цены/пробега/статуса: только добавление, строка - только когда значение изменилось.
+# Секционирована по месяцам (services/history.py создает секции), без первичного ключа:
+# строки никто не обновляет, а индекс PK стоил бы на каждой вставке
+car_history = Table(
+    "car_history",
+    Base.metadata,
+    Column("external_id", String(100), nullable=False),
+    Column("price", Integer),
+    # Цена до изменения: "подешевела" - это price < prev_price без оконных функций
+    Column("prev_price", Integer),
+    Column("mileage", Integer),
+    Column("status", String(20)),
+    Column("observed_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index("ix_car_history_external_id_observed_at", "external_id", "observed_at"),
+    Index("ix_car_history_observed_at", "observed_at", postgresql_using="brin"),
+    Index(
+        "ix_car_history_price_drops", "observed_at",
+        postgresql_where=text("price < prev_price"),
+    ),
+    postgresql_partition_by="RANGE (observed_at)",
+)
@@ -1,26 +1,21 @@
 from abc import ABC, abstractmethod
-from curl_cffi.requests import AsyncSession
-from src.config import settings
+from src.services.proxy_pool import ProxyPool
 
 class BaseScraper(ABC):
-    def __init__(self):
-        proxies = {"http": settings.PROXY_URL, "https": settings.PROXY_URL} if settings.PROXY_URL else None
+    def __init__(self, proxies: ProxyPool | None = None):
+        # Отдельная сессия и лимитер на каждый прокси (или одно прямое соединение)
+        self.proxies = proxies or ProxyPool()
 
-        self.session = AsyncSession(
-            impersonate="chrome124",
-            proxies=proxies,
-            headers={
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-                "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-                "Cache-Control": "max-age=0",
-                "Upgrade-Insecure-Requests": "1",
-            },
-            timeout=60
-        )
+    def is_captcha(self, response) -> bool:
+        """Редирект на страницу проверки"""
+        return "verify" in response.url
+
+    async def fetch(self, url: str):
+        """GET через пул прокси: лимитер выбранного прокси ждет токен и получает обратную связь"""
+        return await self.proxies.get(url, is_captcha=self.is_captcha)
 
     async def close(self):
-        if self.session:
-            await self.session.close()
+        await self.proxies.close()
 
     @abstractmethod
     async def parse_list(self, page: int):
@@ -30,4 +25,4 @@ class BaseScraper(ABC):
     @abstractmethod
     async def parse_detail(self, url: str, basic_info: dict = None):
         """Должен вернуть полные данные об авто"""
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,265 @@
+import re
+from loguru import logger
+from src.config import settings
+from src.scrapers.html import make_soup, LIST_REGIONS, DETAIL_REGIONS
+from src.services.font_decoder import FontDecoder
+from src.services.normalizer import Normalizer, TRANSMISSION_RULES
+
+class Che168Parser:
+    """
+    Разбор страниц che168 без сети: HTML и байты шрифта -> данные машины.
+    Ничего не ждет и не держит сессий, поэтому может работать в отдельном процессе.
+    """
+
+    def __init__(self, decoder: FontDecoder | None = None):
+        self.decoder = decoder or FontDecoder()
+
+        self.COLORS_MAP = {
+            "黑色": ("Black", "Черный"), "白色": ("White", "Белый"),
+            "灰色": ("Grey", "Серый"), "银色": ("Silver", "Серебристый"),
+            "红色": ("Red", "Красный"), "蓝色": ("Blue", "Синий"),
+            "棕色": ("Brown", "Коричневый"), "绿色": ("Green", "Зеленый"),
+            "黄色": ("Yellow", "Желтый"), "紫色": ("Purple", "Фиолетовый"),
+            "香槟色": ("Champagne", "Шампань"), "橙色": ("Orange", "Оранжевый")
+        }
+        
+        self.FUEL_MAP = {
+            "汽油": "petrol", "纯电动": "electric",
+            "油电混合": "hybrid", "插电式混合动力": "phev", "柴油": "diesel",
+            "增程式": "range_extender", "燃料类型": "unknown"
+        }
+
+    def _clean_number(self, text: str) -> float | None:
+        """Извлекает число из строки (96kwh -> 96.0)"""
+        if not text: return None
+        match = re.search(r"(\d+(\.\d+)?)", text)
+        return float(match.group(1)) if match else None
+
+    def _mileage_km(self, raw: str | None) -> int | None:
+        """"3.5万公里" -> 35000, "8000公里" -> 8000; без единиц "3.5" -> 35000, а "80" - неизвестно"""
+        value = self._clean_number(raw)
+        if value is None:
+            return None
+        if "万" in raw or "million" in raw:
+            return int(value * 10000)
+        if "公里" in raw or "km" in raw.lower():
+            return int(value)
+        # Без единиц 万 угадываем только по дробной части: целое "80" может быть и км, и 万
+        if value < 100:
+            return int(value * 10000) if value != int(value) else None
+        return int(value)
+
+    def _fuel(self, fuel_val: str, engine_str: str) -> str | None:
+        if "纯电动" in fuel_val or "pure electric" in fuel_val or "electric" in engine_str:
+            return "electric"
+        if "混" in fuel_val or "增程" in fuel_val or "hybrid" in fuel_val:
+            return "hybrid"
+        if "柴油" in fuel_val or "diesel" in fuel_val.lower():
+            return "diesel"
+        if "汽油" in fuel_val or "号" in fuel_val or re.search(r"petrol|gasoline", fuel_val, re.I) or re.search(r"\d(\.\d)?[LT]", engine_str):
+            return "petrol"
+        return None
+
+    def _transmission(self, raw: str | None) -> str | None:
+        # Те же правила и словарь, что у нормализатора и AI: automatic, manual, robotic, variator
+        return Normalizer.match(TRANSMISSION_RULES, raw) if raw else None
+
+    def derive(self, raw_attrs: dict) -> dict:
+        """
+        Поля машины, вычисляемые из raw_attributes. Отдельно от разбора HTML,
+        чтобы renormalize мог пересчитать их по сохраненным данным без перекачки.
+        Неизвестное - None, а не выдуманное значение по умолчанию.
+        """
+        fuel_val = raw_attrs.get("燃料类型") or raw_attrs.get("能源类型") or raw_attrs.get("Fueltype") or ""
+        engine_str = raw_attrs.get("发动机") or raw_attrs.get("engine") or ""
+        fuel_type = self._fuel(fuel_val, engine_str)
+
+        range_val = (
+            raw_attrs.get("CLTC纯电续航里程") or 
+            raw_attrs.get("NEDC纯电续航里程") or 
+            raw_attrs.get("CLTCpureelectricrange")
+        )
+        electric_range = int(self._clean_number(range_val) or 0)
+        
+        power_match = re.search(r"(\d+)\s*(马力|horsepower|hp)", engine_str)
+        
+        disp_str = raw_attrs.get("排量") or raw_attrs.get("displacement") or engine_str
+        displacement = 0.0
+        if disp_str:
+            disp_match = re.search(r"(\d+(\.\d+)?)[LT]", disp_str)
+            if disp_match: displacement = float(disp_match.group(1))
+
+        reg_date = raw_attrs.get("上牌时间") or raw_attrs.get("Registrationtime") or ""
+        year = int(self._clean_number(reg_date[:4]) or 0)
+        color = self.COLORS_MAP.get(raw_attrs.get("车身颜色"), ("Other", "Другой"))
+
+        return {
+            "color_en": color[0],
+            "color_ru": color[1],
+            "fuel_type": fuel_type,
+            "drive_type": raw_attrs.get("驱动方式") or raw_attrs.get("drivingmethod") or None,
+            "body_type": raw_attrs.get("车辆级别") or raw_attrs.get("VehicleClass") or None,
+            "transmission_type": self._transmission(raw_attrs.get("变速箱") or raw_attrs.get("Gearbox")),
+            "year": year or None,
+            "mileage": self._mileage_km(raw_attrs.get("表显里程") or raw_attrs.get("Mileagedisplayed")),
+            
+            "is_electric": fuel_type == "electric",
+            "engine_power": float(power_match.group(1)) if power_match else None,
+            "displacement": displacement,
+            "battery_capacity": self._clean_number(raw_attrs.get("电池容量") or raw_attrs.get("Standardcapacity")),  # kWh
+            "electric_range": electric_range if electric_range > 0 else None,
+            "fast_charge_time": self._clean_number(raw_attrs.get("标准快充") or raw_attrs.get("Standardfastcharging")),
+        }
+
+    def renormalize(self, rows: list[tuple[int, dict]]) -> list[tuple[int, dict, dict]]:
+        """[(id, raw_data)] -> [(id, изменившиеся поля, их старые значения)] - только где что-то поменялось"""
+        changed = []
+        for car_id, data in rows:
+            attrs = data.get("raw_attributes")
+            if not isinstance(attrs, dict) or not attrs:
+                continue
+            # Что уже переписал AI, остается за ним (как и при повторном парсинге)
+            owned = set(data.get("ai_fields") or ())
+            patch = {
+                field: value for field, value in self.derive(attrs).items()
+                if field not in owned and data.get(field) != value
+            }
+            if patch:
+                changed.append((car_id, patch, {field: data.get(field) for field in patch}))
+        return changed
+
+    def parse_list_html(self, html: str, page: int) -> list[dict] | None:
+        """Карточки со страницы списка; None - вместо списка пришла капча"""
+        soup = make_soup(html, LIST_REGIONS)
+        
+        page_title = soup.title.string.strip() if soup.title else "NO TITLE"
+        if "验证" in page_title:
+            return None
+
+        items = soup.find_all(attrs={"infoid": True})
+        logger.info(f"✅ Found {len(items)} items on page {page}")
+
+        results = []
+        for item in items:
+            try:
+                car_id = item["infoid"]
+                link_el = item.select_one("a.carinfo") or item.find("a")
+                if not link_el or not link_el.has_attr("href"): continue
+                    
+                href = link_el["href"]
+                if href.startswith("//"): full_link = settings.CHE168_BASE_URL.split("//", 1)[0] + href
+                elif href.startswith("/"): full_link = settings.CHE168_BASE_URL + href
+                else: full_link = href
+
+                title_el = item.select_one(".card-name") or item.select_one(".car-name")
+                title = title_el.get_text(strip=True) if title_el else "No Title"
+
+                car = {
+                    "external_id": car_id,
+                    "link": full_link,
+                    "title": title,
+                    "source": "che168"
+                }
+                # Цена в атрибуте карточки (если есть) - для отпечатка изменений
+                if item.get("price"):
+                    car["list_price"] = item["price"]
+                results.append(car)
+            except Exception:
+                continue
+        return results
+
+    def parse_detail_html(self, url: str, html: str, font_bytes: bytes | None, basic_info: dict = None):
+        soup = make_soup(html, DETAIL_REGIONS)
+
+        raw_attrs = {}
+        all_uls = soup.select(".all-basic-content .basic-item-ul")
+        
+        for ul in all_uls:
+            for li in ul.find_all("li", recursive=False):
+                full_text = li.get_text(strip=True)
+                if "highlights" in full_text.lower() or "配置亮点" in full_text:
+                    continue
+
+                p_tag = li.select_one(".item-name")
+                if p_tag:
+                    key_raw = p_tag.get_text(strip=True)
+                    key_clean = re.sub(r'\s+', '', key_raw)
+                    
+                    val = full_text.replace(key_raw, "", 1).strip()
+                    
+                    val = self.decoder.decode(font_bytes, val)
+                    raw_attrs[key_clean] = val
+
+        features = []
+        options_ul = soup.select_one("#caroptionulid")
+        if options_ul:
+            for li in options_ul.find_all("li"):
+                feature_name = li.select_one(".item-status") or li.select_one("p")
+                if feature_name:
+                    features.append(feature_name.get_text(strip=True))
+
+        external_id = basic_info.get('external_id') if basic_info else url.split("/")[-1].replace(".html", "")
+        
+        desc_el = soup.select_one("#messageBox")
+        description_text = self.decoder.decode(font_bytes, desc_el.get_text("\n", strip=True)) if desc_el else ""
+        stock_match = re.search(r"车辆编码[：:]\s*(\d+)", description_text)
+        stock_id = stock_match.group(1) if stock_match else external_id
+
+        images = []
+        for img in soup.select('.swiper-slide a img'):
+            src = img.get('src')
+    
+            if not src or 'default' in src:
+                continue
+    
+            if src.startswith('//'):
+                src = 'https:' + src
+
+            hq_src = re.sub(r'/\d+x\d+_', '/0x0_', src)    
+        
+            images.append(hq_src)
+
+        images = list(dict.fromkeys(images))
+
+        title = soup.select_one(".car-brand-name")
+        title_text = title.get_text(strip=True) if title else (basic_info.get('title') if basic_info else "Unknown")
+        
+        price_el = soup.select_one('.price')
+        if not price_el:
+            price_el = soup.select_one('#overlayPrice')
+        
+        if not price_el:
+            return None
+        
+        price_raw = self.decoder.decode(font_bytes, price_el.get_text(strip=True))
+        price_val = self._clean_number(price_raw)
+
+        if not price_val or price_val <= 0:
+            return None
+
+        price_val *= 10000
+        
+        derived = self.derive(raw_attrs)
+
+        laravel_data = {
+            "external_id": external_id,
+            "stock_id": stock_id,
+            "title": title_text,
+            "description": description_text,
+            "price": price_val,
+            "images": images,
+            "status": "active",
+            "location": raw_attrs.get("所在地") or raw_attrs.get("Location") or "China",
+            "source_link": url,
+            "views": 0,
+            
+            **derived,
+            "slow_charge_time": None,
+            "accelerate": None,
+            
+            "raw_attributes": raw_attrs,
+            "features": features,
+            "parsed_success": True
+        }
+
+        return laravel_data
\ No newline at end of file
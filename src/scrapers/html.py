@@ -0,0 +1,54 @@
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+
+from src.config import settings
+
+
+class RegionFilter(ElementFilter):
+    """
+    Частичный парсинг: дерево строится только для нужных блоков страницы.
+    Тег попадает в дерево, если подходит по имени, id, классу или атрибуту;
+    все его потомки сохраняются целиком, остальная разметка отбрасывается.
+    """
+
+    def __init__(self, names=(), ids=(), classes=(), attrs=()):
+        super().__init__()
+        self.names = set(names)
+        self.ids = set(ids)
+        self.classes = set(classes)
+        self.attrs = set(attrs)
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        if name in self.names:
+            return True
+        if not attrs:
+            return False
+        if attrs.get("id") in self.ids:
+            return True
+        if self.classes and not self.classes.isdisjoint(str(attrs.get("class", "")).split()):
+            return True
+        return not self.attrs.isdisjoint(attrs)
+
+    def allow_string_creation(self, string: str) -> bool:
+        # Текст вне выбранных блоков не нужен
+        return False
+
+
+# Страница списка: <title> (проверка капчи) и карточки с infoid
+LIST_REGIONS = RegionFilter(names=["title"], attrs=["infoid"])
+
+# Страница машины: характеристики, опции, описание, фото, цена, заголовок
+DETAIL_REGIONS = RegionFilter(
+    ids=["caroptionulid", "messageBox", "overlayPrice"],
+    classes=["all-basic-content", "swiper-slide", "price", "car-brand-name"],
+)
+
+
+def make_soup(html: str, regions: RegionFilter | None = None) -> BeautifulSoup:
+    """
+    Единая точка создания дерева. Бэкенд задается HTML_PARSER
+    ("lxml" - быстрый, "html.parser" - без C-зависимостей).
+    """
+    if not settings.HTML_PARTIAL_PARSING:
+        regions = None
+    return BeautifulSoup(html, settings.HTML_PARSER, parse_only=regions)
@@ -1,47 +1,15 @@
 import json
-import os
 from openai import AsyncOpenAI
 from loguru import logger
 
-class AIProcessor:
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-
-    async def process_car(self, car_data: dict) -> dict:
-        """
-        Отправляет сырые данные в AI и получает чистую структуру.
-        """
-        
-        raw_attrs = car_data.get("raw_attributes", "{}")
-        if isinstance(raw_attrs, str):
-            try:
-                raw_attrs = json.loads(raw_attrs)
-            except:
-                raw_attrs = {}
-
-        features_list = []
-        try:
-            features_list = json.loads(car_data.get("features", "[]"))
-        except:
-            pass
-
-        input_context = {
-            "title_raw": car_data.get("title"),
-            "description_raw": car_data.get("description"),
-            "location_raw": car_data.get("location") or raw_attrs.get("所在地") or raw_attrs.get("Location"),
-            "specs": {
-                "transmission": raw_attrs.get("变速箱") or car_data.get("transmission_type"),
-                "fuel": raw_attrs.get("燃油标号") or raw_attrs.get("能源类型") or car_data.get("fuel_type"),
-                "drive": raw_attrs.get("驱动方式"),
-                "body": raw_attrs.get("车辆级别"),
-                "color": raw_attrs.get("车身颜色"),
-                "engine": raw_attrs.get("发动机"),
-            },
-            "features_list": features_list
-        }
+from src.config import settings
+from src.services.translation_cache import TranslationCache, model_key
+from src.services.normalizer import Normalizer
+from src.services.timings import stages
+from src.services.metrics import AI_REQUESTS
 
-        system_prompt = """
+class AIProcessor:
+    SYSTEM_PROMPT = """
         You are an expert Automotive Data Translator.
         INPUT: Raw Chinese car data.
         OUTPUT: Valid JSON object matching the requested schema. No markdown.
@@ -81,23 +49,219 @@ class AIProcessor:
         If a field is unknown, use null.
         """
 
+    BATCH_PROMPT = """
+        BATCH MODE: INPUT is {"cars": [{"id": ..., <car data>}, ...]}.
+        OUTPUT: {"cars": [{"id": <same id>, <fields above>}, ...]} - one object per input car, same ids.
+        """
+
+    PARTIAL_PROMPT = """
+        PARTIAL INPUT: values translated earlier are omitted from INPUT.
+        - "known" (if present) holds the brand/model fields - use them for title_ru.
+        - "features_ru" must translate exactly the given features_list, in the same order.
+        - Return null for fields whose input was omitted.
+        """
+
+    # Какие поля ответа определяются каждым сырым значением из specs
+    SPEC_FIELDS = {
+        "color": ("color_en", "color_ru"),
+        "transmission": ("transmission_type",),
+        "drive": ("drive_type",),
+        "body": ("body_type",),
+        "fuel": ("fuel_type",),
+    }
+    MODEL_FIELDS = ("brand_en", "brand_cn", "model_en", "model_cn")
+
+    def __init__(self, cache: TranslationCache | None = None, normalizer: Normalizer | None = None):
+        self.cache = cache
+        self.normalizer = normalizer or Normalizer()
+        # OPENAI_BASE_URL позволяет подменить API локальным моком (benchmarks/mock_openai.py)
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+        self.model = settings.OPENAI_MODEL
+
+    def _build_context(self, car_data: dict) -> dict:
+        """Сырые данные машины -> компактный вход для модели"""
+        raw_attrs = car_data.get("raw_attributes", "{}")
+        if isinstance(raw_attrs, str):
+            try:
+                raw_attrs = json.loads(raw_attrs)
+            except:
+                raw_attrs = {}
+
+        features_list = car_data.get("features") or []
+        if isinstance(features_list, str):
+            try:
+                features_list = json.loads(features_list)
+            except:
+                features_list = []
+
+        input_context = {
+            "title_raw": car_data.get("title"),
+            "description_raw": car_data.get("description"),
+            "location_raw": car_data.get("location") or raw_attrs.get("所在地") or raw_attrs.get("Location"),
+            "specs": {
+                "transmission": raw_attrs.get("变速箱") or car_data.get("transmission_type"),
+                "fuel": raw_attrs.get("燃油标号") or raw_attrs.get("能源类型") or car_data.get("fuel_type"),
+                "drive": raw_attrs.get("驱动方式"),
+                "body": raw_attrs.get("车辆级别"),
+                "color": raw_attrs.get("车身颜色"),
+                "engine": raw_attrs.get("发动机"),
+            },
+            "features_list": features_list
+        }
+        return input_context
+
+    async def _prepare(self, car_data: dict) -> tuple[dict, dict]:
+        """
+        Вход для модели без того, что уже есть в кэше переводов,
+        и план: что взяли из кэша и что потом в него положить.
+        """
+        context = self._build_context(car_data)
+        plan = {"cached": {}, "features": context["features_list"], "feature_hits": {}, "ask": {}}
+        specs = context["specs"]
+
+        # Категориальные поля сначала пробуем правилами - это бесплатно
+        for spec in self.SPEC_FIELDS:
+            resolved = self.normalizer.resolve(spec, specs.get(spec))
+            if resolved:
+                plan["cached"].update(resolved)
+                specs.pop(spec)
+        if all(field in plan["cached"] for fields in self.SPEC_FIELDS.values() for field in fields):
+            # Двигатель нужен модели только как подсказка для этих полей
+            context.pop("specs")
+            specs = {}
+
+        if self.cache is None:
+            return context, plan
+
+        wanted = {f"spec:{spec}": specs.get(spec) for spec in self.SPEC_FIELDS}
+        wanted["model"] = model_key(context["title_raw"])
+        wanted["location"] = context["location_raw"]
+
+        items = [(ns, value) for ns, value in wanted.items() if value]
+        items += [("feature", feature) for feature in context["features_list"]]
+        found = await self.cache.lookup(items)
+
+        for ns, value in wanted.items():
+            if not value:
+                continue
+            hit = found.get((ns, value))
+            if hit is None:
+                plan["ask"][ns] = value
+                continue
+
+            if ns == "location":
+                plan["cached"]["location"] = hit
+                context.pop("location_raw")
+            else:
+                plan["cached"].update(hit)
+                if ns == "model":
+                    context["known"] = hit
+                else:
+                    specs.pop(ns.split(":", 1)[1])
+
+        plan["feature_hits"] = {f: found[("feature", f)] for f in context["features_list"] if ("feature", f) in found}
+        context["features_list"] = [f for f in context["features_list"] if f not in plan["feature_hits"]]
+        return context, plan
+
+    async def _finish(self, plan: dict, ai_result: dict) -> dict:
+        """Склеивает ответ модели с кэшем и запоминает новые переводы"""
+        result = dict(ai_result)
+        if self.cache is None:
+            result.update(plan["cached"])
+            return result
+
+        new = {}
+
+        for ns, value in plan["ask"].items():
+            if ns == "location":
+                if result.get("location"):
+                    new[(ns, value)] = result["location"]
+                continue
+            fields = self.MODEL_FIELDS if ns == "model" else self.SPEC_FIELDS[ns.split(":", 1)[1]]
+            translated = {field: result.get(field) for field in fields}
+            if all(translated.values()):
+                new[(ns, value)] = translated
+
+        asked = [f for f in plan["features"] if f not in plan["feature_hits"]]
+        got = result.get("features_ru") or []
+        if len(got) == len(asked):
+            translated = dict(zip(asked, got))
+            new.update({("feature", cn): ru for cn, ru in translated.items()})
+            if plan["features"]:
+                result["features_ru"] = [plan["feature_hits"].get(f) or translated.get(f) for f in plan["features"]]
+        elif plan["feature_hits"]:
+            # Модель вернула не столько, сколько просили - порядок не восстановить
+            result["features_ru"] = [plan["feature_hits"][f] for f in plan["features"] if f in plan["feature_hits"]] + list(got)
+
+        # Кэш приоритетнее: модель могла вернуть null для опущенных полей
+        result.update(plan["cached"])
+        await self.cache.store(new)
+        return result
+
+    def _system_prompt(self, batch: bool = False) -> str:
+        prompt = self.SYSTEM_PROMPT + self.PARTIAL_PROMPT
+        if batch:
+            prompt += self.BATCH_PROMPT
+        return prompt
+
+    async def _complete(self, system_prompt: str, payload: dict) -> dict:
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": json.dumps(input_context, ensure_ascii=False)}
-                ],
-                temperature=0.1, 
-                response_format={"type": "json_object"}
-            )
-            
-            content = response.choices[0].message.content
-            ai_result = json.loads(content)
+            with stages.stage("openai"):
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
+                    ],
+                    temperature=0.1, 
+                    response_format={"type": "json_object"}
+                )
+            result = json.loads(response.choices[0].message.content)
+        except Exception:
+            AI_REQUESTS.labels("failure").inc()
+            raise
+        AI_REQUESTS.labels("success").inc()
+        return result
+
+    async def process_car(self, car_data: dict) -> dict:
+        """
+        Отправляет сырые данные в AI и получает чистую структуру.
+        """
+        try:
+            payload, plan = await self._prepare(car_data)
+            ai_result = await self._finish(plan, await self._complete(self._system_prompt(), payload))
             
             logger.info(f"✨ AI Processed: {ai_result.get('brand_en')} {ai_result.get('model_en')} @ {ai_result.get('location')}")
 
             return ai_result
         except Exception as e:
             logger.error(f"❌ OpenAI API Error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    async def process_cars(self, cars: list[dict]) -> list[dict | None]:
+        """
+        Несколько машин одним запросом. Ответ раскладывается обратно по id;
+        машина, для которой ответа нет, получает None.
+        """
+        if len(cars) == 1:
+            return [await self.process_car(cars[0])]
+
+        try:
+            prepared = [await self._prepare(car) for car in cars]
+            payload = {"cars": [{"id": i, **context} for i, (context, _) in enumerate(prepared)]}
+            ai_result = await self._complete(self._system_prompt(batch=True), payload)
+        except Exception as e:
+            logger.error(f"❌ OpenAI API Error (batch of {len(cars)}): {e}")
+            return [None] * len(cars)
+
+        by_id = {}
+        for item in ai_result.get("cars") or []:
+            if isinstance(item, dict) and "id" in item:
+                by_id[str(item.pop("id"))] = item
+
+        results = []
+        for i, (_, plan) in enumerate(prepared):
+            item = by_id.get(str(i))
+            results.append(await self._finish(plan, item) if item is not None else None)
+        logger.info(f"✨ AI Processed batch: {sum(r is not None for r in results)}/{len(cars)} cars")
+        return results
@@ -0,0 +1,211 @@
+import re
+import hashlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import select, func, tuple_
+from loguru import logger
+
+from src.config import settings
+from src.models import RawCar
+
+# Сколько первых фото машины сравниваем
+IMAGES = 4
+
+
+def stable_hash(text: str) -> int:
+    """64-битный хэш, одинаковый между процессами (в отличие от hash())"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+@lru_cache(maxsize=100_000)
+def model_key(title: str | None) -> int:
+    """Блок для сравнения: одна и та же комплектация у разных дилеров называется одинаково"""
+    return stable_hash(re.sub(r"\s+", "", title or "").lower())
+
+
+def image_keys(urls: list[str] | None) -> list[int]:
+    """Хэши адресов фото без схемы и параметров: перезалитые дилером фото не совпадут, но копии совпадают"""
+    return [stable_hash(url.split("//", 1)[-1].split("?", 1)[0]) for url in (urls or [])[:IMAGES]]
+
+
+class DuplicateIndex:
+    """
+    Признаки всех разобранных машин в плотных NumPy-массивах (~70 байт на машину,
+    500k объявлений - около 35 МБ). Кандидаты - та же комплектация и год;
+    похожесть пробега, цены, батареи и общие фото считаются векторно.
+    """
+
+    def __init__(self, threshold: float = settings.DEDUP_THRESHOLD, capacity: int = 1024):
+        self.threshold = threshold
+        self.size = 0
+        # (updated_at, id) последней дочитанной строки, как у экспорта
+        self.watermark: tuple[datetime, int] | None = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        old = self.__dict__.get("ids")
+        arrays = {
+            "ids": np.zeros(capacity, dtype=np.int64),
+            "canonical": np.zeros(capacity, dtype=np.int64),
+            "models": np.zeros(capacity, dtype=np.int64),
+            "years": np.zeros(capacity, dtype=np.int16),
+            "mileage": np.zeros(capacity, dtype=np.int32),
+            "prices": np.zeros(capacity, dtype=np.int32),
+            "battery": np.zeros(capacity, dtype=np.float32),
+            "images": np.zeros((capacity, IMAGES), dtype=np.int64),
+        }
+        if old is not None:
+            for name, array in arrays.items():
+                array[:self.size] = getattr(self, name)[:self.size]
+        self.__dict__.update(arrays)
+
+    def __len__(self):
+        return self.size
+
+    def features(self, car: dict) -> tuple:
+        images = image_keys(car.get("images") if isinstance(car.get("images"), list) else None)
+        return (
+            model_key(car.get("title")),
+            int(car.get("year") or 0),
+            int(car.get("mileage") or 0),
+            int(float(car.get("price") or 0)),
+            float(car.get("battery_capacity") or 0),
+            images + [0] * (IMAGES - len(images)),
+        )
+
+    def add(self, car_id: int, car: dict, canonical_id: int | None = None):
+        self.add_many([car_id], [car], [canonical_id])
+
+    def add_many(self, car_ids: list[int], cars: list[dict], canonical_ids: list[int | None]):
+        # Без словаря id -> позиция: на 500k машин он весил бы больше самих массивов
+        count = len(car_ids)
+        capacity = len(self.ids)
+        while self.size + count > capacity:
+            capacity *= 2
+        if capacity != len(self.ids):
+            self._allocate(capacity)
+
+        models, years, mileage, prices, battery, images = zip(*(self.features(car) for car in cars))
+        window = slice(self.size, self.size + count)
+        self.ids[window] = car_ids
+        self.canonical[window] = [canonical or car_id for car_id, canonical in zip(car_ids, canonical_ids)]
+        self.models[window] = models
+        self.years[window] = years
+        self.mileage[window] = mileage
+        self.prices[window] = prices
+        self.battery[window] = battery
+        self.images[window] = images
+        self.size += count
+
+    def link(self, car_id: int, canonical_id: int):
+        self.canonical[:self.size][self.ids[:self.size] == car_id] = canonical_id
+
+    def candidates(self, cars: list[tuple[int, dict]]) -> dict[int, int]:
+        """id машины пачки -> id канонической записи ее лучшего дубля (кроме нее самой)"""
+        found = {car_id: self.match(car, exclude=car_id) for car_id, car in cars}
+        return {car_id: match[0] for car_id, match in found.items() if match and match[0] != car_id}
+
+    def link_donors(self, candidates: dict[int, int], donors: dict) -> dict[int, int]:
+        """
+        Оставляет и связывает в индексе только дубли уже обогащенных записей (donors).
+        Два необогащенных дубля из одной пачки нашли бы друг друга (A->B и B->A),
+        и canonical_id стал бы циклом, а не корнем кластера.
+        """
+        links = {car_id: canonical for car_id, canonical in candidates.items() if canonical in donors}
+        for car_id, canonical in links.items():
+            self.link(car_id, canonical)
+        return links
+
+    def scores(self, car: dict, exclude: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """(позиции кандидатов, оценки 0..1)"""
+        model, year, mileage, price, battery, images = self.features(car)
+        n = self.size
+        candidates = np.flatnonzero((self.models[:n] == model) & (self.years[:n] == year))
+        if exclude is not None:
+            candidates = candidates[self.ids[candidates] != exclude]
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+
+        # Пробег: допуск 3% или 2000 км; цена: допуск 5% (дилеры ставят разную наценку)
+        mileage_diff = np.abs(self.mileage[candidates] - mileage)
+        mileage_score = np.clip(1 - mileage_diff / max(2000, 0.03 * mileage), 0, 1)
+        price_diff = np.abs(self.prices[candidates] - price)
+        price_score = np.clip(1 - price_diff / max(1, 0.05 * price), 0, 1)
+        # Батарея - признак только когда она известна у обеих: у двух ДВС "совпадение" пустых значений
+        # ничего не доказывает, им для порога нужно общее фото
+        known = (self.battery[candidates] > 0) & (battery > 0)
+        battery_score = (known & (np.abs(self.battery[candidates] - battery) < 0.5)).astype(np.float32)
+
+        wanted = np.asarray([key for key in images if key], dtype=np.int64)
+        shared = np.isin(self.images[candidates], wanted).any(axis=1) if len(wanted) else np.zeros(len(candidates), bool)
+
+        score = 0.45 * mileage_score + 0.35 * price_score + 0.2 * battery_score
+        # Общее фото - почти наверняка та же машина: достаточно, чтобы остальное было близко
+        score = np.where(shared, np.maximum(score, np.minimum(1.0, score + 0.3)), score)
+        return candidates, score.astype(np.float32)
+
+    def match(self, car: dict, exclude: int | None = None) -> tuple[int, float] | None:
+        """(id канонической записи, оценка) лучшего кандидата выше порога или None"""
+        candidates, score = self.scores(car, exclude)
+        if not len(candidates):
+            return None
+        best = int(np.argmax(score))
+        if score[best] < self.threshold:
+            return None
+        return int(self.canonical[candidates[best]]), float(score[best])
+
+    async def load(self, session, batch: int = 5000, settle: int = settings.DEDUP_SETTLE_SECONDS) -> int:
+        """
+        Дочитывает из БД разобранные машины, измененные после водяного знака (updated_at, id).
+        По id нельзя: превью получает id задолго до того, как станет разобранной машиной.
+        """
+        # Только нужные поля: тащить весь raw_data 500k машин ради пяти значений незачем
+        query = (
+            select(
+                RawCar.id, RawCar.canonical_id, RawCar.price, RawCar.year, RawCar.mileage, RawCar.updated_at,
+                RawCar.raw_data['title'].astext.label("title"),
+                RawCar.raw_data['battery_capacity'].astext.label("battery_capacity"),
+                RawCar.raw_data['images'].label("images"),
+            )
+            .where(RawCar.ai_status.is_not(None), RawCar.updated_at < func.now() - timedelta(seconds=settle))
+        )
+        if self.watermark:
+            query = query.where(tuple_(RawCar.updated_at, RawCar.id) > self.watermark)
+        query = query.order_by(RawCar.updated_at, RawCar.id).execution_options(yield_per=batch)
+        before = self.size
+        result = await session.stream(query)
+        # Строка переписывается при каждом парсинге деталей, а в индекс попадает один раз
+        indexed = self.ids[:before].copy()
+        async for rows in result.partitions():
+            self.watermark = (rows[-1].updated_at, rows[-1].id)
+            rows = [row for row, known in zip(rows, np.isin([row.id for row in rows], indexed)) if not known]
+            if rows:
+                self.add_many([row.id for row in rows], [row._asdict() for row in rows], [row.canonical_id for row in rows])
+        if self.size - before:
+            logger.info(f"🧬 Duplicate index: +{self.size - before} cars ({self.size} total)")
+        return self.size - before
+
+
+def raw_city(car: dict) -> str | None:
+    attrs = car.get("raw_attributes")
+    return attrs.get("所在地") or attrs.get("Location") if isinstance(attrs, dict) else None
+
+
+# Поля ответа AI, которые зависят от объявления дилера, а не от машины:
+# поле -> исходное значение, из которого модель его получила
+DEALER_FIELDS = {
+    "location": raw_city,
+    "description_ru": lambda car: car.get("description"),
+    "features_ru": lambda car: car.get("features"),
+}
+
+
+def borrowed_enrichment(donor: dict, car: dict) -> dict:
+    """Обогащение канонической записи для ее дубля: дилерские поля - только при том же источнике"""
+    # В raw_data уже лежит перевод, поэтому сравниваем исходные значения (город, текст дилера)
+    fields = [
+        field for field in donor.get("ai_fields", [])
+        if field in donor and (field not in DEALER_FIELDS or DEALER_FIELDS[field](donor) == DEALER_FIELDS[field](car))
+    ]
+    return {field: donor[field] for field in fields}
@@ -0,0 +1,181 @@
+import os
+import glob
+import json
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, tuple_
+from loguru import logger
+
+from src.config import settings
+from src.database import AsyncSessionLocal
+from src.models import RawCar
+
+# Типизированные колонки идут в Parquet отдельными полями, raw_data - JSON-строкой
+PARQUET_COLUMNS = ("external_id", "site_source", "ai_status", "price", "year", "mileage", "brand", "fuel_type", "updated_at")
+
+
+class JsonlChunk:
+    """Один объект на строку: данные для Laravel как есть + служебные поля"""
+    suffix = "jsonl"
+
+    def __init__(self, path: str):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: list) -> None:
+        self.file.writelines(
+            json.dumps(
+                {**row.raw_data, "ai_status": row.ai_status, "updated_at": row.updated_at.isoformat()},
+                ensure_ascii=False,
+            ) + "\n"
+            for row in rows
+        )
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetChunk:
+    """Parquet через pyarrow (необязательная зависимость, импорт только здесь)"""
+    suffix = "parquet"
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.schema = pa.schema([
+            ("external_id", pa.string()),
+            ("site_source", pa.string()),
+            ("ai_status", pa.string()),
+            ("price", pa.int32()),
+            ("year", pa.int16()),
+            ("mileage", pa.int32()),
+            ("brand", pa.string()),
+            ("fuel_type", pa.string()),
+            ("updated_at", pa.timestamp("us", tz="UTC")),
+            ("raw_data", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows: list) -> None:
+        # Одна row group на fetch курсора - в памяти не больше EXPORT_FETCH_ROWS строк
+        columns = {name: [getattr(row, name) for row in rows] for name in PARQUET_COLUMNS}
+        columns["raw_data"] = [json.dumps(row.raw_data, ensure_ascii=False) for row in rows]
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+FORMATS = {"jsonl": JsonlChunk, "parquet": ParquetChunk}
+
+
+class CarExporter:
+    """
+    Инкрементальная выгрузка raw_cars для Laravel.
+    Строки идут серверным курсором по (updated_at, id), в файлы по chunk_rows строк.
+    После каждого закрытого файла водяной знак пишется в checkpoint.json:
+    следующий запуск (или повтор после падения) начинает с него.
+    """
+
+    def __init__(
+        self,
+        out_dir: str = settings.EXPORT_DIR,
+        fmt: str = "jsonl",
+        chunk_rows: int = settings.EXPORT_CHUNK_ROWS,
+        fetch_rows: int = settings.EXPORT_FETCH_ROWS,
+        settle: int = settings.EXPORT_SETTLE_SECONDS,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}, expected one of {sorted(FORMATS)}")
+        self.out_dir = out_dir
+        self.chunk_class = FORMATS[fmt]
+        self.chunk_rows = chunk_rows
+        self.fetch_rows = fetch_rows
+        self.settle = settle
+        self.checkpoint_path = os.path.join(out_dir, "checkpoint.json")
+        os.makedirs(out_dir, exist_ok=True)
+
+    def load_checkpoint(self) -> dict:
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"updated_at": None, "id": 0, "chunk": 0, "rows": 0}
+
+    def save_checkpoint(self, checkpoint: dict) -> None:
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def query(self, checkpoint: dict, only_enriched: bool):
+        query = select(
+            RawCar.id, RawCar.external_id, RawCar.site_source, RawCar.ai_status, RawCar.price, RawCar.year,
+            RawCar.mileage, RawCar.brand, RawCar.fuel_type, RawCar.updated_at, RawCar.raw_data,
+        ).where(
+            # Превью из списков без деталей Laravel не нужны
+            RawCar.ai_status.is_not(None) if not only_enriched else RawCar.ai_status == 'done',
+            RawCar.updated_at < func.now() - timedelta(seconds=self.settle),
+        )
+        if checkpoint["updated_at"]:
+            watermark = datetime.fromisoformat(checkpoint["updated_at"])
+            query = query.where(tuple_(RawCar.updated_at, RawCar.id) > (watermark, checkpoint["id"]))
+        return query.order_by(RawCar.updated_at, RawCar.id).execution_options(yield_per=self.fetch_rows)
+
+    async def run(self, only_enriched: bool = False, limit: int = 0) -> dict:
+        checkpoint = self.load_checkpoint()
+        # Файл, недописанный упавшим запуском, - его строки выгрузятся заново
+        for leftover in glob.glob(os.path.join(self.out_dir, "*.tmp")):
+            os.remove(leftover)
+
+        run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        files, exported = [], 0
+        chunk, chunk_path, chunk_size, last = None, None, 0, None
+
+        def finish_chunk():
+            nonlocal chunk, chunk_size
+            chunk.close()
+            final = chunk_path[:-len(".tmp")]
+            os.replace(chunk_path, final)
+            files.append(final)
+            checkpoint.update(
+                updated_at=last.updated_at.isoformat(), id=last.id,
+                chunk=checkpoint["chunk"] + 1, rows=checkpoint["rows"] + chunk_size,
+            )
+            self.save_checkpoint(checkpoint)
+            logger.info(f"📦 {os.path.basename(final)}: {chunk_size} cars (watermark {checkpoint['updated_at']})")
+            chunk, chunk_size = None, 0
+
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(self.query(checkpoint, only_enriched))
+            try:
+                async for rows in result.partitions():
+                    while rows:
+                        if limit:
+                            rows = rows[:limit - exported]
+                        if chunk is None:
+                            name = f"cars-{run_id}-{checkpoint['chunk'] + 1:05d}.{self.chunk_class.suffix}"
+                            chunk_path = os.path.join(self.out_dir, f"{name}.tmp")
+                            chunk = self.chunk_class(chunk_path)
+                        part, rows = rows[:self.chunk_rows - chunk_size], rows[self.chunk_rows - chunk_size:]
+                        chunk.write(part)
+                        chunk_size += len(part)
+                        exported += len(part)
+                        last = part[-1]
+                        if chunk_size >= self.chunk_rows:
+                            finish_chunk()
+                    if limit and exported >= limit:
+                        break
+            finally:
+                await result.close()
+
+        if chunk is not None:
+            if chunk_size:
+                finish_chunk()
+            else:
+                chunk.close()
+                os.remove(chunk_path)
+
+        return {"rows": exported, "files": files, "watermark": checkpoint["updated_at"]}
@@ -0,0 +1,110 @@
+import json
+import hashlib
+from loguru import logger
+
+from src.config import settings
+
+
+class ListingFingerprints:
+    """
+    Отпечатки карточек из списка: external_id -> хэш превью (заголовок, цена).
+    Детали качаем только для новых или изменившихся объявлений.
+    """
+
+    KEY = "che168:fingerprints"
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def fingerprint(car: dict) -> str:
+        raw = f"{car.get('title') or ''}|{car.get('list_price') or ''}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+    async def changed(self, cars: list[dict]) -> list[dict]:
+        if not cars:
+            return []
+        stored = await self.redis.hmget(self.KEY, [car['external_id'] for car in cars])
+        return [
+            car for car, old in zip(cars, stored)
+            if old is None or old.decode() != self.fingerprint(car)
+        ]
+
+    async def remember(self, car: dict):
+        """Вызывается после успешного парсинга деталей"""
+        await self.redis.hset(self.KEY, car['external_id'], self.fingerprint(car))
+
+
+class ScanTracker:
+    """
+    Состояние одного прохода producer'а.
+    Если подряд идут страницы только со старыми объявлениями - дальше не листаем.
+    Серия считается по номерам страниц, а не по порядку их обработки: остановка
+    возможна, только когда все страницы до нее (самые свежие) уже разобраны.
+    """
+
+    TTL = 24 * 3600
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def key(scan_id: int) -> str:
+        return f"che168:scan:{scan_id}"
+
+    async def start(self, first_page: int = 1, stop_after: int = settings.INCREMENTAL_STOP_AFTER, force: bool = False) -> int:
+        scan_id = await self.redis.incr("che168:scan:id")
+        key = self.key(scan_id)
+        await self.redis.hset(key, mapping={"first_page": first_page, "stop_after": stop_after, "force": int(force)})
+        await self.redis.expire(key, self.TTL)
+        return scan_id
+
+    async def state(self, scan_id: int | None) -> dict:
+        if scan_id is None:
+            return {}
+        raw = await self.redis.hgetall(self.key(scan_id))
+        return {k.decode(): int(v) for k, v in raw.items()}
+
+    @staticmethod
+    def unchanged_streak(first_page: int, pages: dict[int, int]) -> int:
+        """Самая длинная серия страниц без изменений среди разобранных подряд с first_page"""
+        best = streak = 0
+        page = first_page
+        while page in pages:
+            streak = 0 if pages[page] else streak + 1
+            best = max(best, streak)
+            page += 1
+        return best
+
+    async def page_done(self, scan_id: int | None, page: int, changed: int):
+        if scan_id is None:
+            return
+        key = self.key(scan_id)
+        pages_key = f"{key}:pages"
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(pages_key, page, changed)
+        pipe.expire(pages_key, self.TTL)
+        pipe.hmget(key, "first_page", "stop_after")
+        pipe.hgetall(pages_key)
+        _, _, (first_page, stop_after), raw = await pipe.execute()
+
+        stop_after = int(stop_after or 0)
+        if not stop_after:
+            return
+        pages = {int(k): int(v) for k, v in raw.items()}
+        streak = self.unchanged_streak(int(first_page or 1), pages)
+        if streak >= stop_after:
+            await self.redis.hset(key, "stopped", 1)
+            logger.info(f"⏹ Scan #{scan_id}: {streak} pages in a row without changes (last done {page}), skipping the rest")
+
+
+def encode_list_task(page: int, scan_id: int) -> str:
+    return json.dumps({"page": page, "scan": scan_id})
+
+
+def decode_list_task(data: bytes) -> tuple[int, int | None]:
+    """Старые задачи в очереди - просто номер страницы"""
+    task = json.loads(data)
+    if isinstance(task, int):
+        return task, None
+    return int(task["page"]), task.get("scan")
@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from loguru import logger
+
+from src.config import settings
+
+
+class LRUDict(OrderedDict):
+    """OrderedDict с ограничением размера: выкидывает самый давний ключ"""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+class FontCache:
+    """
+    Контент-адресуемый кэш шрифтов che168.
+    Память (LRU) -> локальный диск (общий для воркеров через volume).
+    Ключи: URL шрифта -> хэш содержимого -> байты шрифта и готовая карта глифов.
+    """
+
+    def __init__(self, max_fonts: int = settings.FONT_CACHE_SIZE, cache_dir: str | None = settings.FONT_CACHE_DIR):
+        self.urls = LRUDict(max_fonts * 4)
+        self.fonts = LRUDict(max_fonts)
+        self.maps = LRUDict(max_fonts)
+        self.cache_dir = cache_dir
+
+        self.hits = {"url": 0, "map": 0}
+        self.misses = {"url": 0, "map": 0}
+
+        if self.cache_dir:
+            os.makedirs(os.path.join(self.cache_dir, "urls"), exist_ok=True)
+            os.makedirs(os.path.join(self.cache_dir, "fonts"), exist_ok=True)
+
+    @staticmethod
+    def font_hash(font_bytes: bytes) -> str:
+        return hashlib.sha1(font_bytes).hexdigest()
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.cache_dir, *parts)
+
+    def _read(self, path: str) -> bytes | None:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, path: str, data: bytes):
+        # Через временный файл, чтобы соседний воркер не прочитал половину
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Font cache write failed ({path}): {e}")
+
+    def get_bytes(self, url: str) -> bytes | None:
+        font_hash = self.urls.get(url)
+        if font_hash is None and self.cache_dir:
+            raw = self._read(self._path("urls", hashlib.sha1(url.encode()).hexdigest()))
+            font_hash = raw.decode() if raw else None
+
+        data = self.fonts.get(font_hash) if font_hash else None
+        if data is None and font_hash and self.cache_dir:
+            data = self._read(self._path("fonts", f"{font_hash}.ttf"))
+
+        if data is None:
+            self.misses["url"] += 1
+            return None
+
+        self.hits["url"] += 1
+        self.urls.put(url, font_hash)
+        self.fonts.put(font_hash, data)
+        return data
+
+    def put_bytes(self, url: str, font_bytes: bytes) -> str:
+        font_hash = self.font_hash(font_bytes)
+        self.urls.put(url, font_hash)
+        self.fonts.put(font_hash, font_bytes)
+
+        if self.cache_dir:
+            font_path = self._path("fonts", f"{font_hash}.ttf")
+            if not os.path.exists(font_path):
+                self._write(font_path, font_bytes)
+            self._write(self._path("urls", hashlib.sha1(url.encode()).hexdigest()), font_hash.encode())
+        return font_hash
+
+    def get_map(self, font_hash: str, version: str) -> dict[int, str] | None:
+        key = f"{font_hash}.{version}"
+        mapping = self.maps.get(key)
+        if mapping is None and self.cache_dir:
+            raw = self._read(self._path("fonts", f"{key}.json"))
+            if raw:
+                mapping = {int(code): char for code, char in json.loads(raw).items()}
+
+        if mapping is None:
+            self.misses["map"] += 1
+            return None
+
+        self.hits["map"] += 1
+        self.maps.put(key, mapping)
+        return mapping
+
+    def put_map(self, font_hash: str, version: str, mapping: dict[int, str]):
+        key = f"{font_hash}.{version}"
+        self.maps.put(key, mapping)
+        if self.cache_dir:
+            self._write(self._path("fonts", f"{key}.json"), json.dumps(mapping, ensure_ascii=False).encode("utf-8"))
+
+    def stats(self) -> dict:
+        return {"hits": dict(self.hits), "misses": dict(self.misses), "fonts_in_memory": len(self.fonts)}
@@ -1,13 +1,29 @@
 import io
+import json
 import hashlib
 from fontTools.ttLib import TTFont
 from loguru import logger
 
+from src.services.font_cache import FontCache
+from src.services.glyph_index import GlyphIndex, font_vectors
+from src.services.timings import stages
+from src.services.metrics import FONT_MAPS, UNKNOWN_GLYPHS
+
 class FontDecoder:
     KNOWN_HASHES = {
         # Пример: "d41d8cd98f00b204e9800998ecf8427e": "5",
     }
 
+    def __init__(self, cache: FontCache | None = None, index: GlyphIndex | None = None):
+        self.cache = cache or FontCache()
+        self.index = index or GlyphIndex()
+        # Одни и те же байты приходят на каждое поле страницы - не хэшируем их заново
+        self._last_bytes: bytes | None = None
+        self._last_hash: str | None = None
+        self.version = hashlib.md5(
+            json.dumps(self.KNOWN_HASHES, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:8] + self.index.version
+
     def _get_glyph_hash(self, font: TTFont, glyph_name: str) -> str:
         try:
             glyph = font['glyf'][glyph_name]
@@ -18,29 +34,59 @@ class FontDecoder:
         except Exception:
             return "error"
 
+    def _font_hash(self, font_bytes: bytes) -> str:
+        if font_bytes is not self._last_bytes:
+            self._last_bytes = font_bytes
+            self._last_hash = self.cache.font_hash(font_bytes)
+        return self._last_hash
+
+    def build_map(self, font_bytes: bytes) -> dict[int, str]:
+        """
+        Разбирает шрифт один раз: код символа -> цифра (или [хэш] для неизвестных).
+        Сначала точный хэш из KNOWN_HASHES, затем ближайший контур из GlyphIndex.
+        """
+        font = TTFont(io.BytesIO(font_bytes))
+        mapping = {}
+        unresolved = {}
+
+        for char_code, glyph_name in font.getBestCmap().items():
+            glyph_hash = self._get_glyph_hash(font, glyph_name)
+            if glyph_hash in self.KNOWN_HASHES:
+                mapping[char_code] = self.KNOWN_HASHES[glyph_hash]
+            else:
+                mapping[char_code] = f"[{glyph_hash[:4]}]"
+                unresolved[char_code] = glyph_hash
+
+        if unresolved and len(self.index):
+            codes, _, matrix = font_vectors(font)
+            for char_code, (label, _) in zip(codes, self.index.match(matrix)):
+                if label is not None and char_code in unresolved:
+                    mapping[char_code] = label
+                    del unresolved[char_code]
+
+        FONT_MAPS.inc()
+        if unresolved:
+            UNKNOWN_GLYPHS.inc(len(unresolved))
+            unknown = [f"{chr(code)} -> Hash: {glyph_hash}" for code, glyph_hash in unresolved.items()]
+            logger.warning(f"UNKNOWN FONT GLYPHS ({len(unknown)}): {'; '.join(unknown)}")
+        return mapping
+
+    def get_map(self, font_bytes: bytes) -> dict[int, str]:
+        font_hash = self._font_hash(font_bytes)
+        mapping = self.cache.get_map(font_hash, self.version)
+        if mapping is None:
+            mapping = self.build_map(font_bytes)
+            self.cache.put_map(font_hash, self.version, mapping)
+        return mapping
+
     def decode(self, font_bytes: bytes, obfuscated_text: str) -> str:
         if not font_bytes or not obfuscated_text:
             return obfuscated_text
 
         try:
-            font = TTFont(io.BytesIO(font_bytes))
-            cmap = font.getBestCmap()
-            decoded_chars = []
-            
-            for char in obfuscated_text:
-                char_code = ord(char)
-                if char_code in cmap:
-                    glyph_name = cmap[char_code]
-                    glyph_hash = self._get_glyph_hash(font, glyph_name)
-                    
-                    if glyph_hash in self.KNOWN_HASHES:
-                        decoded_chars.append(self.KNOWN_HASHES[glyph_hash])
-                    else:
-                        logger.warning(f"UNKNOWN FONT GLYPH: {char} -> Hash: {glyph_hash}")
-                        decoded_chars.append(f"[{glyph_hash[:4]}]") 
-                else:
-                    decoded_chars.append(char)
-            return "".join(decoded_chars)
+            with stages.stage("decode"):
+                mapping = self.get_map(font_bytes)
+                return "".join(mapping.get(ord(char), char) for char in obfuscated_text)
         except Exception as e:
             logger.error(f"Font decode error: {e}")
-            return obfuscated_text
\ No newline at end of file
+            return obfuscated_text
@@ -0,0 +1,164 @@
+import os
+import io
+import hashlib
+import numpy as np
+from fontTools.ttLib import TTFont
+from loguru import logger
+
+from src.config import settings
+
+# Сколько точек оставляем от контура глифа после передискретизации
+POINTS = 32
+
+
+def outline_vector(glyph) -> np.ndarray | None:
+    """
+    Нормализованный контур глифа: точки равномерно по длине контура,
+    сдвинутые в (0, 0) и вписанные в единичный квадрат.
+    Сдвиг координат на пару единиц почти не меняет такой вектор.
+    """
+    if not hasattr(glyph, 'coordinates') or not len(glyph.coordinates):
+        return None
+
+    coords = np.asarray(glyph.coordinates, dtype=np.float64)
+    path, jumps = [], []
+    start = 0
+    for end in glyph.endPtsOfContours:
+        contour = coords[start:end + 1]
+        # Замыкаем контур; переход к следующему контуру длины не имеет
+        path.append(np.vstack([contour, contour[:1]]))
+        jumps.append(len(contour) + 1)
+        start = end + 1
+    path = np.vstack(path)
+
+    seg = np.linalg.norm(np.diff(path, axis=0), axis=1)
+    for boundary in np.cumsum(jumps)[:-1]:
+        seg[boundary - 1] = 0.0
+    dist = np.concatenate([[0.0], np.cumsum(seg)])
+    if dist[-1] == 0:
+        return None
+
+    targets = np.linspace(0.0, dist[-1], POINTS)
+    resampled = np.column_stack([np.interp(targets, dist, path[:, 0]), np.interp(targets, dist, path[:, 1])])
+
+    resampled -= resampled.min(axis=0)
+    scale = resampled.max()
+    if scale > 0:
+        resampled /= scale
+    return resampled.astype(np.float32).ravel()
+
+
+def font_vectors(font: TTFont) -> tuple[list[int], list[str], np.ndarray]:
+    """Векторы всех глифов из cmap: (коды символов, имена глифов, матрица)"""
+    codes, names, vectors = [], [], []
+    glyf = font['glyf']
+    for char_code, glyph_name in font.getBestCmap().items():
+        try:
+            vector = outline_vector(glyf[glyph_name])
+        except Exception:
+            vector = None
+        if vector is not None:
+            codes.append(char_code)
+            names.append(glyph_name)
+            vectors.append(vector)
+    matrix = np.vstack(vectors) if vectors else np.empty((0, POINTS * 2), dtype=np.float32)
+    return codes, names, matrix
+
+
+class GlyphIndex:
+    """Размеченные контуры глифов (.npz) + поиск ближайшего соседа через NumPy"""
+
+    def __init__(self, path: str | None = settings.GLYPH_INDEX_PATH, threshold: float = settings.GLYPH_MATCH_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.vectors = np.empty((0, POINTS * 2), dtype=np.float32)
+        self.labels = np.empty(0, dtype="<U8")
+        self.load()
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def version(self) -> str:
+        digest = hashlib.md5(self.vectors.tobytes())
+        digest.update("|".join(self.labels.tolist()).encode('utf-8'))
+        return digest.hexdigest()[:8]
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with np.load(self.path) as data:
+            self.vectors = data["vectors"].astype(np.float32)
+            self.labels = data["labels"]
+        logger.info(f"🔤 Glyph index loaded: {len(self)} glyphs from {self.path}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, vectors=self.vectors, labels=self.labels)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, self.path)
+
+    def distances(self, matrix: np.ndarray) -> np.ndarray:
+        """Средняя дистанция между точками контуров, shape (len(matrix), len(index))"""
+        a = matrix.reshape(len(matrix), 1, POINTS, 2)
+        b = self.vectors.reshape(1, len(self.vectors), POINTS, 2)
+        return np.sqrt(((a - b) ** 2).sum(axis=-1)).mean(axis=-1)
+
+    def match(self, matrix: np.ndarray) -> list[tuple[str | None, float]]:
+        """Для каждой строки matrix: (метка, дистанция); None если дальше порога"""
+        if not len(self) or not len(matrix):
+            return [(None, float("inf"))] * len(matrix)
+        dist = self.distances(matrix)
+        best = dist.argmin(axis=1)
+        best_dist = dist[np.arange(len(matrix)), best]
+        return [
+            (str(self.labels[i]) if d <= self.threshold else None, float(d))
+            for i, d in zip(best, best_dist)
+        ]
+
+    def add(self, vector: np.ndarray, label: str):
+        self.vectors = np.vstack([self.vectors, vector.reshape(1, -1)])
+        self.labels = np.append(self.labels, label)
+
+
+def calibrate(index: GlyphIndex, font_paths: list[str], labels: dict[str, str], known: dict[str, str]) -> dict:
+    """
+    Пополняет индекс глифами из кэшированных шрифтов.
+    Метка берется из ручной разметки (labels), KNOWN_HASHES или ближайшего
+    уже размеченного соседа. Глифы без метки возвращаются для разметки.
+    """
+    # Почти совпадающие контуры не добавляем - индекс не должен пухнуть
+    duplicate_eps = index.threshold / 10
+    stats = {"fonts": 0, "added": 0, "matched": 0, "unknown": {}}
+
+    for font_path in font_paths:
+        try:
+            font = TTFont(font_path)
+        except Exception as e:
+            logger.warning(f"Skip broken font {font_path}: {e}")
+            continue
+        stats["fonts"] += 1
+
+        codes, names, matrix = font_vectors(font)
+        glyf = font['glyf']
+        for code, name, vector in zip(codes, names, matrix):
+            glyph_hash = hashlib.md5(str(list(glyf[name].coordinates)).encode('utf-8')).hexdigest()
+            label = labels.get(glyph_hash) or known.get(glyph_hash)
+
+            (nearest, distance), = index.match(vector.reshape(1, -1))
+            if label is None and nearest is not None:
+                label = nearest
+                stats["matched"] += 1
+
+            if label is None:
+                stats["unknown"][glyph_hash] = chr(code)
+                continue
+
+            if distance > duplicate_eps:
+                index.add(vector, label)
+                stats["added"] += 1
+
+    return stats
@@ -0,0 +1,83 @@
+import json
+from datetime import date, datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from loguru import logger
+
+from src.config import settings
+
+# Одна вставка на пачку: сравнение с текущей строкой raw_cars делает сама БД.
+# Выполняется до upsert в той же транзакции, поэтому r.* - еще старые значения
+# Пустое значение в деталях - не новое наблюдение (цена не стала "неизвестной"),
+# поэтому сравниваем и пишем coalesce(новое, старое)
+RECORD_CHANGES = """
+INSERT INTO car_history (external_id, price, prev_price, mileage, status, observed_at)
+SELECT v.external_id, coalesce(v.price, r.price), r.price, coalesce(v.mileage, r.mileage),
+       coalesce(v.status, r.raw_data->>'status'), now()
+FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS v(external_id text, price int, mileage int, status text)
+LEFT JOIN raw_cars r ON r.external_id = v.external_id
+WHERE r.id IS NULL
+   OR r.price IS DISTINCT FROM coalesce(v.price, r.price)
+   OR r.mileage IS DISTINCT FROM coalesce(v.mileage, r.mileage)
+   OR r.raw_data->>'status' IS DISTINCT FROM coalesce(v.status, r.raw_data->>'status')
+"""
+
+MARK_SOLD = """
+WITH sold AS (
+    UPDATE raw_cars SET raw_data = raw_data || '{"status": "sold"}', updated_at = now()
+    WHERE external_id = :external_id AND raw_data->>'status' IS DISTINCT FROM 'sold'
+    RETURNING external_id, price, mileage
+)
+INSERT INTO car_history (external_id, price, prev_price, mileage, status, observed_at)
+SELECT external_id, price, price, mileage, 'sold', now() FROM sold
+"""
+
+
+def month_start(day: date, shift: int = 0) -> date:
+    index = day.year * 12 + day.month - 1 + shift
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def ensure_partitions(conn, months_ahead: int = settings.HISTORY_MONTHS_AHEAD, around: date | None = None):
+    """Секции car_history на текущий месяц и months_ahead вперед (идемпотентно)"""
+    today = around or datetime.now(timezone.utc).date()
+    for shift in range(months_ahead + 1):
+        start, end = month_start(today, shift), month_start(today, shift + 1)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS car_history_{start:%Y_%m} PARTITION OF car_history "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+
+
+async def _append(session, sql: str, params: dict, what: str):
+    """
+    Вставка в историю в SAVEPOINT: ее ошибка не должна откатить саму запись машин.
+    Процесс может жить дольше, чем заготовлено секций, - тогда создаем и пробуем еще раз.
+    """
+    for attempt in range(2):
+        try:
+            async with session.begin_nested():
+                await session.execute(text(sql), params)
+            return
+        except DBAPIError as e:
+            if attempt == 0 and "no partition" in str(e):
+                try:
+                    async with session.begin_nested():
+                        await ensure_partitions(session)
+                except DBAPIError:
+                    # Соседний процесс создал секцию одновременно с нами
+                    pass
+                continue
+            logger.warning(f"History write ({what}) failed: {e}")
+            return
+
+
+async def record_changes(session, rows: list[dict]):
+    """rows: external_id, price, mileage, status. Строка истории - только у изменившихся"""
+    if rows:
+        await _append(session, RECORD_CHANGES, {"rows": json.dumps(rows)}, f"{len(rows)} cars")
+
+
+async def mark_sold(session, external_id: str):
+    """Объявление снято (сайт несколько проверок подряд отвечал, что его нет): статус sold и строка истории"""
+    await _append(session, MARK_SOLD, {"external_id": external_id}, f"sold {external_id}")
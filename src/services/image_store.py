@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+import asyncio
+from datetime import datetime, timezone
+from curl_cffi.requests import AsyncSession
+from loguru import logger
+
+from src.config import settings
+from src.services.task_queue import TaskFailed
+
+# Сигнатуры форматов: расширение файла берется из содержимого, а не из URL
+MAGIC = ((b"\xff\xd8\xff", "jpg"), (b"\x89PNG", "png"), (b"GIF8", "gif"), (b"RIFF", "webp"))
+
+
+def image_ext(payload: bytes) -> str:
+    for magic, ext in MAGIC:
+        if payload.startswith(magic):
+            return ext
+    return "bin"
+
+
+def url_key(url: str) -> str:
+    """//x.autoimg.cn/...jpg и https://x.autoimg.cn/...jpg?v=2 - одна картинка"""
+    return url.split("//", 1)[-1].split("?", 1)[0]
+
+
+class ImageStore:
+    """
+    Контент-адресуемое хранилище фото на локальном диске.
+    blobs/<sha[:2]>/<sha>.<ext> - одна копия на одинаковые байты;
+    manifests/<external_id>.json - какие фото у машины и где они лежат.
+    В Redis: URL -> sha (уже скачанное не качаем) и, если включено,
+    перцептивный хэш -> sha (пережатая дилером та же фотография не хранится второй раз).
+    """
+
+    URLS_KEY = "che168:images:urls"
+    PHASH_KEY = "che168:images:phash"
+
+    def __init__(
+        self,
+        redis,
+        root: str = settings.IMAGE_DIR or "data/images",
+        concurrency: int = settings.IMAGE_CONCURRENCY,
+        perceptual: bool = settings.IMAGE_PERCEPTUAL,
+    ):
+        self.redis = redis
+        self.root = root
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = AsyncSession(impersonate="chrome124", headers={"Referer": "https://www.che168.com/"}, timeout=30)
+        self.counters = {"downloaded": 0, "bytes": 0, "known_urls": 0, "identical": 0, "similar": 0, "failed": 0}
+
+        self.Image = None
+        if perceptual:
+            try:
+                from PIL import Image
+                self.Image = Image
+            except ImportError:
+                logger.warning("Perceptual image dedup needs Pillow: pip install pillow. Falling back to exact bytes")
+
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "manifests"), exist_ok=True)
+
+    def blob_path(self, sha: str, ext: str) -> str:
+        return os.path.join(self.root, "blobs", sha[:2], f"{sha}.{ext}")
+
+    def manifest_path(self, external_id: str) -> str:
+        return os.path.join(self.root, "manifests", f"{external_id}.json")
+
+    def dhash(self, payload: bytes) -> str | None:
+        """64-битный difference hash: устойчив к пережатию и ресайзу, не к кадрированию"""
+        import io
+        try:
+            with self.Image.open(io.BytesIO(payload)) as img:
+                pixels = list(img.convert("L").resize((9, 8)).getdata())
+        except Exception:
+            return None
+        bits = 0
+        for row in range(8):
+            for col in range(8):
+                bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+        return f"{bits:016x}"
+
+    def _write_blob(self, payload: bytes) -> tuple[str, str, bool]:
+        """Сохраняет байты, если таких еще нет. -> (sha, ext, уже было)"""
+        sha = hashlib.sha256(payload).hexdigest()
+        ext = image_ext(payload)
+        path = self.blob_path(sha, ext)
+        if os.path.exists(path):
+            return sha, ext, True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        return sha, ext, False
+
+    async def _download(self, url: str) -> str | None:
+        """Скачивает одно фото и возвращает "<sha>.<ext>" или None при ошибке"""
+        async with self.semaphore:
+            try:
+                response = await self.session.get(url)
+            except Exception as e:
+                logger.debug(f"Image {url} failed: {e}")
+                self.counters["failed"] += 1
+                return None
+        if response.status_code != 200 or not response.content:
+            self.counters["failed"] += 1
+            return None
+
+        payload = response.content
+        self.counters["downloaded"] += 1
+        self.counters["bytes"] += len(payload)
+
+        phash = await asyncio.to_thread(self.dhash, payload) if self.Image is not None else None
+        if phash:
+            known = await self.redis.hget(self.PHASH_KEY, phash)
+            if known:
+                self.counters["similar"] += 1
+                return known.decode()
+
+        sha, ext, existed = await asyncio.to_thread(self._write_blob, payload)
+        blob = f"{sha}.{ext}"
+        if existed:
+            self.counters["identical"] += 1
+        if phash:
+            await self.redis.hsetnx(self.PHASH_KEY, phash, blob)
+        return blob
+
+    async def fetch_car(self, external_id: str, urls: list[str]) -> dict:
+        """Докачивает новые фото машины и переписывает ее манифест"""
+        keys = [url_key(url) for url in urls]
+        known = await self.redis.hmget(self.URLS_KEY, keys) if keys else []
+        blobs = {key: blob.decode() for key, blob in zip(keys, known) if blob}
+        self.counters["known_urls"] += len(blobs)
+
+        missing = [(key, url) for key, url in zip(keys, urls) if key not in blobs]
+        fetched = await asyncio.gather(*(self._download(url) for _, url in missing))
+        new = {key: blob for (key, _), blob in zip(missing, fetched) if blob}
+        if new:
+            await self.redis.hset(self.URLS_KEY, mapping=new)
+        blobs.update(new)
+
+        manifest = {
+            "external_id": external_id,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "images": [
+                {"url": url, "blob": f"blobs/{blobs[key][:2]}/{blobs[key]}" if key in blobs else None}
+                for key, url in zip(keys, urls)
+            ],
+        }
+        await asyncio.to_thread(self._write_manifest, external_id, manifest)
+
+        failed = len(missing) - len(new)
+        if failed:
+            # Манифест уже с тем, что скачалось; повтор докачает только недостающее
+            raise TaskFailed(f"{failed}/{len(urls)} images of {external_id} failed")
+        return manifest
+
+    def _write_manifest(self, external_id: str, manifest: dict):
+        path = self.manifest_path(external_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+    async def close(self):
+        await self.session.close()
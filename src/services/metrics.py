@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import signal
+import threading
+from collections import Counter as Tally
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from loguru import logger
+
+from src.config import settings
+
+# Этапы конвейера: fetch, font, parse, decode, upsert, enrich, openai
+STAGE_SECONDS = Histogram(
+    "che168_stage_seconds", "Длительность этапа обработки", ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+REQUESTS = Counter("che168_requests_total", "Запросы к che168 по типу и результату", ["kind", "result"])
+TASKS = Counter("che168_tasks_total", "Задачи очередей по результату (ack/retry/dead)", ["queue", "result"])
+FONT_MAPS = Counter("che168_font_maps_built_total", "Шрифты, разобранные заново (промах кэша карт)")
+UNKNOWN_GLYPHS = Counter("che168_font_unknown_glyphs_total", "Глифы, не распознанные ни хэшем, ни индексом")
+AI_REQUESTS = Counter("ai_requests_total", "Запросы к OpenAI", ["result"])
+AI_CARS = Counter("ai_cars_total", "Машины, прошедшие ai_worker", ["result"])
+QUEUE_DEPTH = Gauge("che168_queue_depth", "Задачи в очереди", ["queue", "state"])
+AI_BACKLOG = Gauge("ai_backlog_cars", "Машины, ожидающие обогащения (ai_status = pending)")
+WRITES = Counter("che168_car_writes_total", "Строки upsert по результату (inserted/updated/skipped/dropped)", ["result"])
+WRITE_PENDING = Gauge("che168_write_buffer_pending", "Машины в буфере записи")
+
+
+class ProxyCollector:
+    """Метрики пула прокси снимаются в момент опроса, без фоновых обновлений"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self):
+        fields = {
+            "requests": "Запросы через прокси",
+            "errors": "Сетевые ошибки прокси",
+            "captchas": "Капчи на прокси",
+            "health": "Сглаженная доля успехов",
+            "score": "Оценка для выбора прокси",
+            "cooldown": "Секунд до конца отдыха",
+        }
+        families = {name: GaugeMetricFamily(f"che168_proxy_{name}", help_text, labels=["proxy"]) for name, help_text in fields.items()}
+        for proxy, stats in self.pool.stats().items():
+            for name, family in families.items():
+                family.add_metric([proxy], float(stats[name] or 0))
+        yield from families.values()
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик без зависимостей: раз в interval снимает стек
+    потока event loop и копит свернутые стеки (формат flamegraph.pl / speedscope).
+    Пока не запущен - ничего не стоит.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.target = threading.main_thread().ident
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float) -> str:
+        """Профилирует seconds секунд и возвращает свернутые стеки "a;b;c N" """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("profiler is already running")
+        try:
+            stacks: Tally = Tally()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(self.target)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    stacks[";".join(reversed(stack))] += 1
+                time.sleep(self.interval)
+        finally:
+            self._lock.release()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+    def dump(self, seconds: float, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.sample(seconds))
+        logger.info(f"🔥 Profile ({seconds}s) written to {path}")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    profiler: SamplingProfiler | None = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "text/plain; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send(200, generate_latest(REGISTRY), CONTENT_TYPE_LATEST)
+        elif url.path == "/debug/profile" and self.profiler is not None:
+            try:
+                seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+            except ValueError:
+                seconds = 0.0
+            if not seconds > 0:
+                self._send(400, b"seconds must be a positive number")
+                return
+            seconds = min(seconds, 300)
+            try:
+                self._send(200, self.profiler.sample(seconds).encode("utf-8"))
+            except RuntimeError as e:
+                self._send(409, str(e).encode("utf-8"))
+        else:
+            self._send(404, b"not found")
+
+
+def start_metrics_server(port: int | None, profiling: bool = settings.PROFILER_ENABLED) -> ThreadingHTTPServer | None:
+    """
+    /metrics в формате Prometheus; при PROFILER_ENABLED еще /debug/profile?seconds=N
+    и SIGUSR1 -> профиль на PROFILER_SECONDS в PROFILER_DIR. Порт 0/None - выключено.
+    """
+    profiler = SamplingProfiler() if profiling else None
+    if profiler is not None:
+        _install_signal(profiler)
+    if not port:
+        return None
+
+    handler = type("Handler", (MetricsHandler,), {"profiler": profiler})
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint on :{port} not started: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    logger.info(f"📈 Metrics on :{port}/metrics" + (" (profiler on /debug/profile)" if profiler else ""))
+    return server
+
+
+def _install_signal(profiler: SamplingProfiler):
+    def on_signal(signum, frame):
+        path = os.path.join(settings.PROFILER_DIR, f"profile-{os.getpid()}-{int(time.time())}.folded")
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        # Профилировать надо event loop, а не ждать в нем - отдельный поток
+        threading.Thread(target=_safe_dump, args=(profiler, settings.PROFILER_SECONDS, path), daemon=True).start()
+
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, on_signal)
+
+
+def _safe_dump(profiler: SamplingProfiler, seconds: float, path: str):
+    try:
+        profiler.dump(seconds, path)
+    except RuntimeError as e:
+        logger.warning(f"Profile skipped: {e}")
@@ -0,0 +1,137 @@
+import re
+from collections import Counter
+
+# Правила: (подстрока в сыром значении, результат). Проверяются по порядку,
+# поэтому более специфичные подстроки стоят выше ("手自一体" раньше "自动").
+# Короткие латинские сокращения - регулярками на отдельное слово: "AT" есть и в "VARIATOR".
+COLOR_RULES = [
+    ("香槟", ("Gold", "Золотой")), ("金", ("Gold", "Золотой")),
+    ("银", ("Silver", "Серебристый")), ("灰", ("Grey", "Серый")),
+    ("黑", ("Black", "Черный")), ("白", ("White", "Белый")),
+    ("红", ("Red", "Красный")), ("粉", ("Pink", "Розовый")),
+    ("蓝", ("Blue", "Синий")), ("青", ("Blue", "Синий")),
+    ("棕", ("Brown", "Коричневый")), ("咖啡", ("Brown", "Коричневый")),
+    ("绿", ("Green", "Зеленый")), ("黄", ("Yellow", "Желтый")),
+    ("橙", ("Orange", "Оранжевый")), ("紫", ("Purple", "Фиолетовый")),
+    ("米", ("Beige", "Бежевый")),
+]
+
+def token(abbr: str) -> re.Pattern:
+    """Латинское сокращение, не окруженное другими латинскими буквами ("6AT", "8挡AT")"""
+    return re.compile(rf"(?<![A-Z]){abbr}(?![A-Z])")
+
+
+TRANSMISSION_RULES = [
+    # Значения словаря AI (их же пишет парсер) - как есть
+    ("AUTOMATIC", "automatic"), ("MANUAL", "manual"), ("ROBOT", "robotic"), ("VARIATOR", "variator"),
+    ("双离合", "robotic"), (token("DCT"), "robotic"), (token("AMT"), "robotic"),
+    ("无级", "variator"), (token("CVT"), "variator"),
+    ("手自一体", "automatic"), ("单速", "automatic"), ("固定齿比", "automatic"),
+    ("自动", "automatic"), (token("AT"), "automatic"),
+    ("手动", "manual"), (token("MT"), "manual"),
+]
+
+DRIVE_RULES = [
+    ("四驱", "all_wheel"), ("全驱", "all_wheel"), ("4WD", "all_wheel"), ("AWD", "all_wheel"),
+    ("后驱", "rear"), ("RWD", "rear"),
+    ("前驱", "front"), ("FWD", "front"),
+]
+
+BODY_RULES = [
+    ("SUV", "crossover"), ("MPV", "minivan"), ("微面", "minivan"), ("轻客", "minivan"),
+    ("敞篷", "cabriolet"), ("旅行", "universal"),
+    ("两厢", "hatchback"), ("三厢", "sedan"),
+    ("中大型车", "sedan"), ("中型车", "sedan"), ("紧凑型车", "sedan"), ("大型车", "sedan"),
+]
+
+FUEL_RULES = [
+    ("纯电", "electric"),
+    ("插电", "hybrid"), ("增程", "hybrid"), ("混", "hybrid"),
+    ("柴油", "diesel"),
+    ("汽油", "gasoline"), ("92号", "gasoline"), ("95号", "gasoline"), ("98号", "gasoline"),
+    # Английские значения, которые парсер кладет в fuel_type сам
+    ("ELECTRIC", "electric"), ("PHEV", "hybrid"), ("HYBRID", "hybrid"),
+    ("DIESEL", "diesel"), ("PETROL", "gasoline"), ("GASOLINE", "gasoline"),
+]
+
+# Поле specs (как в AIProcessor) -> (правила, поля результата)
+SPECS = {
+    "color": (COLOR_RULES, ("color_en", "color_ru")),
+    "transmission": (TRANSMISSION_RULES, ("transmission_type",)),
+    "drive": (DRIVE_RULES, ("drive_type",)),
+    "body": (BODY_RULES, ("body_type",)),
+    "fuel": (FUEL_RULES, ("fuel_type",)),
+}
+
+
+def canonical_fuel(raw: str | None) -> str | None:
+    """
+    Тип топлива в словаре колонки fuel_type (gasoline, diesel, electric, hybrid):
+    парсер пишет petrol/phev, модель - gasoline/hybrid, в колонке они должны совпадать
+    """
+    return Normalizer.match(FUEL_RULES, raw) if raw else None
+
+
+class Normalizer:
+    """
+    Локальное сопоставление категориальных полей без LLM.
+    Что не подошло ни под одно правило - уходит в модель и попадает в отчет покрытия.
+    """
+
+    STATS_KEY = "ai:normalizer"
+
+    def __init__(self):
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+
+    @staticmethod
+    def match(rules: list, raw: str):
+        upper = raw.upper()
+        for needle, result in rules:
+            if needle.search(upper) if isinstance(needle, re.Pattern) else needle in upper:
+                return result
+        return None
+
+    def resolve(self, spec: str, raw: str | None) -> dict | None:
+        """Поля результата для значения из specs или None, если правила не знают значение"""
+        if not raw or spec not in SPECS:
+            return None
+        rules, fields = SPECS[spec]
+        result = self.match(rules, raw)
+        if result is None:
+            self.misses[(spec, raw)] += 1
+            return None
+        self.hits[spec] += 1
+        values = result if isinstance(result, tuple) else (result,)
+        return dict(zip(fields, values))
+
+    async def flush_stats(self, redis):
+        """Сбрасывает накопленные счетчики в Redis (для команды normalizer-report)"""
+        if not self.hits and not self.misses:
+            return
+        pipe = redis.pipeline()
+        for spec, count in self.hits.items():
+            pipe.hincrby(f"{self.STATS_KEY}:hits", spec, count)
+        for (spec, raw), count in self.misses.items():
+            pipe.hincrby(f"{self.STATS_KEY}:misses", f"{spec}|{raw}", count)
+        await pipe.execute()
+        self.hits.clear()
+        self.misses.clear()
+
+    @classmethod
+    async def report(cls, redis) -> tuple[dict[str, tuple[int, int]], list[tuple[str, str, int]]]:
+        """Покрытие по полям (локально, всего) и самые частые нераспознанные значения"""
+        hits = {k.decode(): int(v) for k, v in (await redis.hgetall(f"{cls.STATS_KEY}:hits")).items()}
+        misses = []
+        missed_by_spec: Counter = Counter()
+        for key, count in (await redis.hgetall(f"{cls.STATS_KEY}:misses")).items():
+            spec, raw = key.decode().split("|", 1)
+            misses.append((spec, raw, int(count)))
+            missed_by_spec[spec] += int(count)
+
+        coverage = {
+            spec: (hits.get(spec, 0), hits.get(spec, 0) + missed_by_spec[spec])
+            for spec in SPECS
+        }
+        misses.sort(key=lambda item: -item[2])
+        return coverage, misses
@@ -0,0 +1,122 @@
+import os
+import json
+import socket
+import hashlib
+import asyncio
+from datetime import datetime, timezone
+import zstandard
+from loguru import logger
+
+from src.config import settings
+
+
+class PageArchive:
+    """
+    Контент-адресуемый архив скачанных страниц и шрифтов на локальном диске.
+    blobs/<sha[:2]>/<sha>.zst - один zstd-кадр на запись в стиле WARC
+    (заголовки WARC/1.1, пустая строка, тело); одинаковое тело хранится один раз.
+    index/<дата>-<хост>-<pid>.jsonl - что, когда и откуда скачано; у каждого
+    процесса свой файл, поэтому воркеры не перемешивают строки.
+    """
+
+    def __init__(self, root: str = settings.ARCHIVE_DIR, level: int = settings.ARCHIVE_ZSTD_LEVEL):
+        self.root = root
+        self.level = level
+        self.stored = 0
+        self.deduplicated = 0
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "index"), exist_ok=True)
+
+    @staticmethod
+    def digest(payload: bytes) -> str:
+        return hashlib.sha256(payload).hexdigest()
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.root, "blobs", sha[:2], f"{sha}.zst")
+
+    def _index_path(self) -> str:
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        return os.path.join(self.root, "index", f"{day}-{socket.gethostname()}-{os.getpid()}.jsonl")
+
+    def put_blob(self, url: str, payload: bytes, content_type: str) -> str:
+        """Сохраняет тело (если такого еще нет) и возвращает его sha256"""
+        sha = self.digest(payload)
+        path = self._blob_path(sha)
+        if os.path.exists(path):
+            self.deduplicated += 1
+            return sha
+
+        header = (
+            "WARC/1.1\r\n"
+            "WARC-Type: response\r\n"
+            f"WARC-Target-URI: {url}\r\n"
+            f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}\r\n"
+            f"WARC-Payload-Digest: sha256:{sha}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "\r\n"
+        ).encode("utf-8")
+        frame = zstandard.ZstdCompressor(level=self.level).compress(header + payload)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Через временный файл, чтобы соседний воркер не прочитал половину
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(frame)
+        os.replace(tmp, path)
+        self.stored += 1
+        return sha
+
+    def get_blob(self, sha: str) -> bytes:
+        with open(self._blob_path(sha), "rb") as f:
+            record = zstandard.ZstdDecompressor().decompress(f.read())
+        return record.split(b"\r\n\r\n", 1)[1]
+
+    def record(self, kind: str, url: str, html: str, font: bytes | None = None, **meta):
+        """Архивирует страницу (и шрифт к ней) и дописывает строку в индекс"""
+        entry = {
+            "kind": kind,
+            "url": url,
+            "sha": self.put_blob(url, html.encode("utf-8"), "text/html; charset=utf-8"),
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+            **meta,
+        }
+        if font:
+            entry["font_sha"] = self.put_blob(url, font, "font/ttf")
+        with open(self._index_path(), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    async def arecord(self, kind: str, url: str, html: str, font: bytes | None = None, **meta):
+        """То же из event loop: сжатие и запись на диск в потоке"""
+        try:
+            await asyncio.to_thread(self.record, kind, url, html, font, **meta)
+        except OSError as e:
+            logger.warning(f"Archive write failed ({url}): {e}")
+
+    def entries(self, kind: str | None = None, since: str | None = None):
+        """Строки индекса по порядку файлов; since - дата YYYY-MM-DD (включительно)"""
+        index_dir = os.path.join(self.root, "index")
+        for name in sorted(os.listdir(index_dir)):
+            if not name.endswith(".jsonl") or (since and name[:10] < since):
+                continue
+            with open(os.path.join(index_dir, name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка от упавшего процесса
+                        continue
+                    if kind is None or entry.get("kind") == kind:
+                        yield entry
+
+    def latest(self, kind: str, since: str | None = None) -> dict[str, dict]:
+        """Последняя версия каждой страницы: url -> строка индекса"""
+        found = {}
+        for entry in self.entries(kind, since):
+            previous = found.get(entry["url"])
+            if previous is None or entry["fetched_at"] >= previous["fetched_at"]:
+                found[entry["url"]] = entry
+        return found
+
+    def stats(self) -> dict:
+        return {"stored": self.stored, "deduplicated": self.deduplicated}
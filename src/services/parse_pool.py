@@ -0,0 +1,85 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from prometheus_client import REGISTRY
+
+from src.scrapers.che168_parser import Che168Parser
+from src.services.timings import stages
+from src.services.metrics import FONT_MAPS, UNKNOWN_GLYPHS
+
+# Парсер внутри процесса пула (создается один раз на процесс)
+_parser: Che168Parser | None = None
+
+# Счетчики, которые растут внутри процессов пула. /metrics отдает родитель,
+# поэтому процесс возвращает их приросты вместе с результатом
+RELAYED_COUNTERS = {
+    "che168_font_maps_built_total": FONT_MAPS,
+    "che168_font_unknown_glyphs_total": UNKNOWN_GLYPHS,
+}
+# Значения счетчиков, уже отправленные родителю из этого процесса
+_sent: dict[str, float] = {}
+
+
+def _telemetry() -> dict:
+    """Замеры этапов и приросты счетчиков процесса с прошлого вызова"""
+    samples = {name: list(values) for name, values in stages.samples.items() if values}
+    stages.samples.clear()
+    counters = {}
+    for name in RELAYED_COUNTERS:
+        value = REGISTRY.get_sample_value(name) or 0.0
+        counters[name] = value - _sent.get(name, 0.0)
+        _sent[name] = value
+    return {"stages": samples, "counters": counters}
+
+
+def _record(telemetry: dict):
+    """Переносит замеры процесса пула в метрики родителя"""
+    for name, samples in telemetry["stages"].items():
+        for seconds in samples:
+            stages.add(name, seconds)
+    for name, delta in telemetry["counters"].items():
+        if delta > 0:
+            RELAYED_COUNTERS[name].inc(delta)
+
+
+def _init_process():
+    global _parser
+    _parser = Che168Parser()
+    # После fork процесс наследует значения родителя - их не пересылаем
+    _telemetry()
+
+
+def _call(method: str, args: tuple):
+    return getattr(_parser, method)(*args), _telemetry()
+
+
+class ParsePool:
+    """
+    Выносит CPU-работу (HTML, регулярки, TTFont) из event loop в процессы.
+    Внутрь уходят сырой HTML и байты шрифта, наружу - готовый dict машины
+    и замеры этапов decode/parse, которые записываются уже в родителе.
+    """
+
+    def __init__(self, processes: int | None = None):
+        self.processes = processes or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_process)
+        logger.info(f"🧠 Parse pool started with {self.processes} processes")
+
+    async def run(self, method: str, *args):
+        return await self.submit(method, *args)
+
+    def submit(self, method: str, *args) -> asyncio.Future:
+        """Ставит работу в пул сразу, не дожидаясь результата"""
+        loop = asyncio.get_running_loop()
+        # run_in_executor отдает работу пулу сразу; замеры процесса снимаем, когда она готова
+        return asyncio.ensure_future(self._unwrap(loop.run_in_executor(self.executor, _call, method, args)))
+
+    @staticmethod
+    async def _unwrap(future: asyncio.Future):
+        result, telemetry = await future
+        _record(telemetry)
+        return result
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,69 @@
+import asyncio
+import asyncpg
+from loguru import logger
+
+from src.config import settings
+
+
+class PendingListener:
+    """
+    LISTEN на канал новых машин по отдельному соединению asyncpg (не из пула SQLAlchemy:
+    соединение из пула вернулось бы в пул вместе с подпиской).
+    upsert_cars шлет NOTIFY с id строк, ставших pending; wait() возвращается,
+    как только что-то пришло, или по таймауту - чтобы добрать пропущенное.
+    """
+
+    def __init__(self, dsn: str = settings.DATABASE_URL, channel: str = settings.AI_NOTIFY_CHANNEL):
+        # asyncpg не понимает диалект SQLAlchemy в схеме URL
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.channel = channel
+        self.conn: asyncpg.Connection | None = None
+        self.event = asyncio.Event()
+        self.notified = 0
+        self.failing = False
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.notified += payload.count(",") + 1 if payload else 1
+        self.event.set()
+
+    def _on_terminate(self, conn):
+        logger.warning("📭 NOTIFY connection lost, falling back to polling until reconnect")
+        self.conn = None
+
+    async def connect(self) -> bool:
+        try:
+            self.conn = await asyncpg.connect(self.dsn)
+            await self.conn.add_listener(self.channel, self._on_notify)
+            self.conn.add_termination_listener(self._on_terminate)
+        except (OSError, asyncpg.PostgresError) as e:
+            # Предупреждаем один раз, а не на каждой попытке переподключения
+            if not self.failing:
+                logger.warning(f"LISTEN {self.channel} failed, polling only: {e}")
+            self.failing = True
+            self.conn = None
+            return False
+        self.failing = False
+        logger.info(f"📬 Listening for new cars on '{self.channel}'")
+        return True
+
+    def clear(self):
+        """Сбрасывать до запроса к БД: NOTIFY, пришедший во время запроса, не потеряется"""
+        self.event.clear()
+
+    async def wait(self, timeout: float = settings.AI_POLL_INTERVAL) -> bool:
+        """True - пришло уведомление, False - истек таймаут"""
+        if self.conn is None or self.conn.is_closed():
+            # Без подписки ждем столько же, сколько раньше между опросами, и пробуем снова
+            if not await self.connect():
+                await asyncio.sleep(min(timeout, 5))
+            # И после переподключения: пока подписки не было, уведомления могли пропасть
+            return False
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        if self.conn is not None and not self.conn.is_closed():
+            await self.conn.close()
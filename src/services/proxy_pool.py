@@ -0,0 +1,190 @@
+import os
+import time
+import random
+import asyncio
+from urllib.parse import urlsplit
+from curl_cffi.requests import AsyncSession
+from loguru import logger
+
+from src.config import settings
+from src.services.rate_limiter import AdaptiveRateLimiter
+from src.services.timings import stages
+
+HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Cache-Control": "max-age=0",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+
+def load_proxy_urls(urls: str | None = settings.PROXY_URLS, path: str | None = settings.PROXY_FILE) -> list[str]:
+    """Прокси из настроек: список через запятую/пробел и/или файл (по одному на строку, # - комментарий)"""
+    found = (urls or "").replace(",", " ").split()
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            found += [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    if settings.PROXY_URL:
+        found.append(settings.PROXY_URL)
+    return list(dict.fromkeys(found))
+
+
+class ProxyState:
+    """Один выход в сеть: своя сессия curl_cffi, свой лимитер и своя статистика"""
+
+    # Сглаживание доли успехов и задержки
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, url: str | None):
+        self.url = url
+        self.session = AsyncSession(
+            impersonate="chrome124",
+            proxies={"http": url, "https": url} if url else None,
+            headers=HEADERS,
+            timeout=60
+        )
+        # Сайт ограничивает по IP, поэтому и скорость у каждого прокси своя
+        self.limiter = AdaptiveRateLimiter()
+
+        self.health = 1.0
+        self.latency: float | None = None
+        self.requests = 0
+        self.errors = 0
+        self.captchas = 0
+        # Ошибок подряд и сколько раз уже отправляли отдыхать
+        self.error_streak = 0
+        self.strikes = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def name(self) -> str:
+        if not self.url:
+            return "direct"
+        # Без логина/пароля в логах и метриках
+        parts = urlsplit(self.url)
+        return f"{parts.scheme}://{parts.hostname}:{parts.port}" if parts.hostname else self.url
+
+    def score(self) -> float:
+        """Доля успехов, деленная на сглаженную задержку"""
+        return max(self.health, 0.01) / (1 + (self.latency or 1.0))
+
+    def cooling(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+    def record(self, ok: bool, latency: float | None = None):
+        self.requests += 1
+        self.health += self.EWMA_ALPHA * ((1.0 if ok else 0.0) - self.health)
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self.EWMA_ALPHA * (latency - self.latency)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "captchas": self.captchas,
+            "health": round(self.health, 3),
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "score": round(self.score(), 3),
+            "rate": self.limiter.snapshot(),
+            "cooldown": max(0, round(self.cooldown_until - time.monotonic())),
+        }
+
+
+class ProxyPool:
+    """
+    Пул прокси с оценкой здоровья.
+    Запрос уходит через прокси, выбранный случайно с весом "оценка / ожидание токена",
+    так что общая скорость растет с числом прокси, а не упирается в самый медленный.
+    Капча или серия ошибок отправляют прокси отдыхать, с каждым разом дольше.
+    Без настроенных прокси пул из одного прямого соединения ведет себя как раньше.
+    """
+
+    def __init__(
+        self,
+        urls: list[str] | None = None,
+        cooldown: float = settings.PROXY_COOLDOWN,
+        max_errors: int = settings.PROXY_MAX_ERRORS,
+    ):
+        urls = load_proxy_urls() if urls is None else urls
+        self.proxies = [ProxyState(url) for url in urls] or [ProxyState(None)]
+        self.cooldown = cooldown
+        self.max_errors = max_errors
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def pick(self, url: str) -> ProxyState:
+        now = time.monotonic()
+        ready = [p for p in self.proxies if not p.cooling(now)]
+        if not ready:
+            # Все отдыхают - берем того, кто освободится раньше (лимитер его и подождет)
+            return min(self.proxies, key=lambda p: p.cooldown_until)
+        if len(ready) == 1:
+            return ready[0]
+        weights = [p.score() / (1 + p.limiter.delay(url)) for p in ready]
+        return random.choices(ready, weights=weights)[0]
+
+    async def get(self, url: str, is_captcha=None):
+        """GET через выбранный прокси. is_captcha(response) - признак капчи для оценки прокси"""
+        while True:
+            proxy = self.pick(url)
+            wait = proxy.cooldown_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await proxy.limiter.acquire(url)
+            # Пока ждали токен, прокси могли отправить отдыхать - тогда берем другой,
+            # а токен возвращаем: иначе отдых еще и урезал бы прокси скорость
+            now = time.monotonic()
+            if not proxy.cooling(now) or all(p.cooling(now) for p in self.proxies):
+                break
+            proxy.limiter.release(url)
+
+        started = time.monotonic()
+        try:
+            with stages.stage("fetch"):
+                response = await proxy.session.get(url)
+        except Exception:
+            self.report(proxy, url, error=True)
+            raise
+        if is_captcha is not None and is_captcha(response):
+            self.report(proxy, url, captcha=True)
+        else:
+            self.report(proxy, url, latency=time.monotonic() - started)
+        return response
+
+    def _bench(self, proxy: ProxyState, reason: str):
+        if len(self.proxies) == 1:
+            # Переключаться не на кого - паузу после капчи выдержит лимитер
+            return
+        proxy.strikes += 1
+        duration = min(self.cooldown * 2 ** (proxy.strikes - 1), self.cooldown * 16)
+        proxy.cooldown_until = time.monotonic() + duration
+        logger.warning(f"🧊 Proxy {proxy.name}: {reason}, cooling down for {duration:.0f}s (score {proxy.score():.3f})")
+
+    def report(self, proxy: ProxyState, url: str, latency: float | None = None, captcha: bool = False, error: bool = False):
+        """Обратная связь по запросу: и в оценку прокси, и в его лимитер"""
+        proxy.limiter.report(url, latency=latency, captcha=captcha, error=error)
+        if captcha:
+            proxy.captchas += 1
+            proxy.record(False)
+            self._bench(proxy, "CAPTCHA")
+        elif error:
+            proxy.errors += 1
+            proxy.error_streak += 1
+            proxy.record(False)
+            if proxy.error_streak >= self.max_errors:
+                self._bench(proxy, f"{proxy.error_streak} errors in a row")
+                proxy.error_streak = 0
+        else:
+            proxy.record(True, latency)
+            proxy.error_streak = 0
+            # Стабильно здоровый прокси постепенно "прощается"
+            if proxy.health > 0.9:
+                proxy.strikes = max(0, proxy.strikes - 1)
+
+    def stats(self) -> dict[str, dict]:
+        return {proxy.name: proxy.stats() for proxy in self.proxies}
+
+    async def close(self):
+        for proxy in self.proxies:
+            await proxy.session.close()
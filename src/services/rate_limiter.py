@@ -0,0 +1,127 @@
+import time
+import asyncio
+from urllib.parse import urlsplit
+from loguru import logger
+
+from src.config import settings
+
+
+class HostBucket:
+    """Token bucket одного хоста с адаптивной скоростью (AIMD)"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        # Сглаженная задержка ответа и лучшая увиденная (база для сравнения)
+        self.latency_ewma: float | None = None
+        self.latency_base: float | None = None
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AdaptiveRateLimiter:
+    """
+    Ограничитель запросов по хостам.
+    Вместо фиксированных sleep: скорость растет, пока сайт отвечает нормально,
+    и падает вдвое на капче или при росте задержки.
+    """
+
+    def __init__(
+        self,
+        rate: float = settings.RATE_LIMIT_RPS,
+        min_rate: float = settings.RATE_LIMIT_MIN_RPS,
+        max_rate: float = settings.RATE_LIMIT_MAX_RPS,
+        burst: float = settings.RATE_LIMIT_BURST,
+        captcha_cooldown: float = settings.RATE_LIMIT_CAPTCHA_COOLDOWN,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.captcha_cooldown = captcha_cooldown
+        self.buckets: dict[str, HostBucket] = {}
+
+    # Шаг разгона (запросов/сек) после каждого успешного ответа
+    INCREASE_STEP = 0.05
+    # Во сколько раз задержка должна превысить базовую, чтобы притормозить
+    LATENCY_FACTOR = 2.0
+    EWMA_ALPHA = 0.2
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlsplit(url).netloc or url
+
+    def _bucket(self, host: str) -> HostBucket:
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = HostBucket(self.rate, self.burst)
+        return bucket
+
+    def delay(self, url: str) -> float:
+        """Сколько пришлось бы ждать запрос к хосту прямо сейчас (токен не резервирует)"""
+        bucket = self.buckets.get(self.host_of(url))
+        if bucket is None:
+            return 0.0
+        now = time.monotonic()
+        tokens = min(bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+        return max(bucket.blocked_until - now, (1 - tokens) / bucket.rate, 0)
+
+    async def acquire(self, url: str):
+        """Ждет своей очереди на запрос к хосту (резервирует токен заранее)"""
+        bucket = self._bucket(self.host_of(url))
+        now = time.monotonic()
+        bucket.refill(now)
+        bucket.tokens -= 1
+
+        delay = max(bucket.blocked_until - now, -bucket.tokens / bucket.rate, 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def release(self, url: str):
+        """Возвращает токен, взятый acquire, если запрос так и не ушел"""
+        bucket = self._bucket(self.host_of(url))
+        bucket.refill(time.monotonic())
+        bucket.tokens = min(bucket.burst, bucket.tokens + 1)
+
+    def report(self, url: str, latency: float | None = None, captcha: bool = False, error: bool = False):
+        """Обратная связь по результату запроса"""
+        host = self.host_of(url)
+        bucket = self._bucket(host)
+
+        if captcha:
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+            bucket.blocked_until = time.monotonic() + self.captcha_cooldown
+            bucket.tokens = min(bucket.tokens, 0)
+            logger.warning(f"🐢 {host}: CAPTCHA, slowing down to {bucket.rate:.2f} req/s for {self.captcha_cooldown}s")
+            return
+
+        if error:
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+            logger.warning(f"🐢 {host}: request error, slowing down to {bucket.rate:.2f} req/s")
+            return
+
+        if latency is None:
+            return
+
+        if bucket.latency_ewma is None:
+            bucket.latency_ewma = latency
+        else:
+            bucket.latency_ewma += self.EWMA_ALPHA * (latency - bucket.latency_ewma)
+        bucket.latency_base = min(bucket.latency_base or latency, latency)
+
+        if bucket.latency_ewma > bucket.latency_base * self.LATENCY_FACTOR:
+            bucket.rate = max(self.min_rate, bucket.rate * 0.8)
+            # Иначе база навсегда останется минимальной и мы не разгонимся обратно
+            bucket.latency_base = bucket.latency_ewma / self.LATENCY_FACTOR
+            logger.debug(f"{host}: latency {bucket.latency_ewma:.2f}s, rate -> {bucket.rate:.2f} req/s")
+        else:
+            bucket.rate = min(self.max_rate, bucket.rate + self.INCREASE_STEP)
+
+    def snapshot(self) -> dict[str, float]:
+        """Текущие скорости по хостам (для логов)"""
+        return {host: round(b.rate, 2) for host, b in self.buckets.items()}
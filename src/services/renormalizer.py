@@ -0,0 +1,125 @@
+import os
+import json
+from collections import Counter, defaultdict, deque
+from sqlalchemy import select, text
+from loguru import logger
+
+from src.config import settings
+from src.database import AsyncSessionLocal
+from src.models import RawCar
+from src.services.normalizer import canonical_fuel
+from src.services.parse_pool import ParsePool
+
+# Одна команда на пачку; горячие колонки следуют за полями, которые поменялись
+APPLY_PATCHES = """
+UPDATE raw_cars SET
+    raw_data = raw_cars.raw_data || v.patch,
+    year = CASE WHEN v.patch->'year' IS NOT NULL THEN (v.patch->>'year')::smallint ELSE raw_cars.year END,
+    mileage = CASE WHEN v.patch->'mileage' IS NOT NULL THEN (v.patch->>'mileage')::int ELSE raw_cars.mileage END,
+    fuel_type = CASE WHEN v.patch->'fuel_type' IS NOT NULL THEN v.fuel_type ELSE raw_cars.fuel_type END,
+    updated_at = now()
+FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS v(id int, patch jsonb, fuel_type text)
+WHERE raw_cars.id = v.id
+"""
+
+
+def patch_rows(changed: list[tuple[int, dict, dict]]) -> list[dict]:
+    """Строки для APPLY_PATCHES: в raw_data - значения парсера, в колонку fuel_type - словарь canonical_fuel, как при upsert"""
+    return [
+        {"id": car_id, "patch": patch, "fuel_type": canonical_fuel(patch.get("fuel_type"))}
+        for car_id, patch, _ in changed
+    ]
+
+
+class Renormalizer:
+    """
+    Пересчитывает производные поля (Che168Parser.derive) по сохраненным raw_attributes.
+    Строки идут серверным курсором по id, пачки считаются в процессах ParsePool,
+    изменения пишутся одним UPDATE на пачку. После каждой записанной пачки id
+    сохраняется в checkpoint - прерванный запуск продолжится с того же места.
+    """
+
+    def __init__(
+        self,
+        pool: ParsePool,
+        batch: int = 1000,
+        checkpoint_path: str = settings.RENORMALIZE_CHECKPOINT,
+        dry_run: bool = False,
+    ):
+        self.pool = pool
+        self.batch = batch
+        self.checkpoint_path = checkpoint_path
+        self.dry_run = dry_run
+        self.counts = {"scanned": 0, "changed": 0}
+        self.fields: Counter = Counter()
+        self.transitions: Counter = Counter()
+        self.examples: defaultdict[str, list[str]] = defaultdict(list)
+
+    def load_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)["id"]
+        except FileNotFoundError:
+            return 0
+
+    def save_checkpoint(self, last_id: int):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"id": last_id, **self.counts}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    async def _apply(self, changed: list[tuple[int, dict, dict]], last_id: int):
+        for car_id, patch, old in changed:
+            for field, value in patch.items():
+                self.fields[field] += 1
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    # Числа почти все разные - по ним храним несколько примеров, а не все переходы
+                    if len(self.examples[field]) < 5:
+                        self.examples[field].append(f"#{car_id}: {old[field]!r} -> {value!r}")
+                else:
+                    self.transitions[(field, repr(old[field]), repr(value))] += 1
+        self.counts["changed"] += len(changed)
+
+        if self.dry_run:
+            return
+        if changed:
+            async with AsyncSessionLocal() as session:
+                await session.execute(text(APPLY_PATCHES), {"rows": json.dumps(patch_rows(changed), ensure_ascii=False)})
+                await session.commit()
+        self.save_checkpoint(last_id)
+
+    async def run(self, start_id: int = 0, limit: int = 0):
+        query = (
+            select(RawCar.id, RawCar.raw_data)
+            .where(RawCar.id > start_id, RawCar.raw_data.has_key('raw_attributes'))
+            .order_by(RawCar.id)
+            .execution_options(yield_per=self.batch)
+        )
+        if limit:
+            query = query.limit(limit)
+
+        # Пачки в процессах пула; записываем по порядку, чтобы checkpoint не перепрыгнул недописанное
+        in_flight: deque = deque()
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                batch = [(row.id, row.raw_data) for row in rows]
+                self.counts["scanned"] += len(batch)
+                in_flight.append((self.pool.submit("renormalize", batch), batch[-1][0]))
+                if len(in_flight) > self.pool.processes * 2:
+                    future, last_id = in_flight.popleft()
+                    await self._apply(await future, last_id)
+                    logger.info(f"🔁 Renormalized up to id {last_id}: {self.counts}")
+
+        while in_flight:
+            future, last_id = in_flight.popleft()
+            await self._apply(await future, last_id)
+
+    def report(self, top: int) -> list[str]:
+        lines = [f"{field:<18} {count} rows" for field, count in self.fields.most_common()]
+        for field, examples in self.examples.items():
+            lines += [f"  {field}: {example}" for example in examples]
+        for (field, old, new), count in self.transitions.most_common(top):
+            lines.append(f"  x{count:<7} {field}: {old} -> {new}")
+        return lines
@@ -0,0 +1,183 @@
+import re
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+
+from src.config import settings
+from src.services.fingerprints import encode_list_task
+from src.services.seen_set import SeenSet
+from src.services.task_queue import StreamQueue, LIST_QUEUE, DETAIL_QUEUE
+
+# Забирает созревшие элементы расписания и сразу сдвигает их на аренду,
+# чтобы вторая реплика планировщика не отправила их повторно.
+# KEYS[1] - ZSET расписания; ARGV[1] - текущее время, ARGV[2] - аренда (сек), ARGV[3] - лимит
+CLAIM_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[1] + ARGV[2], member)
+end
+return due
+"""
+
+# Дата публикации в атрибутах объявления: "2024-05-12", "2024年05月12日"
+PUBLISHED_KEYS = ("发布时间", "上架时间", "Releasetime", "Publishtime")
+PUBLISHED_DATE = re.compile(r"(\d{4})\D(\d{1,2})\D(\d{1,2})")
+CHINA_TZ = timezone(timedelta(hours=8))
+
+
+def published_at(full: dict) -> float | None:
+    """Когда объявление опубликовано на сайте (unix time) или None, если страница этого не говорит"""
+    attrs = full.get("raw_attributes") if isinstance(full.get("raw_attributes"), dict) else {}
+    for value in (full.get("published_at"), *(attrs.get(key) for key in PUBLISHED_KEYS)):
+        match = PUBLISHED_DATE.search(str(value or ""))
+        if match:
+            try:
+                return datetime(*map(int, match.groups()), tzinfo=CHINA_TZ).timestamp()
+            except ValueError:
+                continue
+    return None
+
+
+class CrawlScheduler:
+    """
+    Расписание обхода по свежести.
+    ZSET: "page:N" / "car:<external_id>" -> время следующей проверки.
+    Горячие страницы (первые в выдаче) проверяются часто, остальные - раз в полдня.
+    Интервал объявления начинается с середины диапазона, сокращается вдвое
+    при смене цены или пока оно новое (по дате публикации на сайте, а не по
+    времени, когда мы его нашли) и растет в 1.5 раза, пока ничего не меняется; после нескольких
+    проверок подряд, на которые сайт ответил "объявления нет", оно считается
+    снятым с продажи. Капча и сетевые ошибки об объявлении ничего не говорят.
+    """
+
+    KEY = "che168:schedule"
+    CARS_KEY = "che168:schedule:cars"
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.list_queue = StreamQueue(redis, LIST_QUEUE)
+        self.detail_queue = StreamQueue(redis, DETAIL_QUEUE)
+        self.seen = SeenSet(redis)
+        self._claim = redis.register_script(CLAIM_DUE)
+
+    @staticmethod
+    def page_interval(page: int) -> float:
+        if page <= settings.SCHEDULE_HOT_PAGES:
+            return settings.SCHEDULE_HOT_PAGE_INTERVAL
+        return settings.SCHEDULE_PAGE_INTERVAL
+
+    async def seed_pages(self, total: int = settings.SCHEDULE_PAGES):
+        """Ставит в расписание страницы, которых там еще нет (уже запланированные не трогает)"""
+        now = time.time()
+        await self.redis.zadd(self.KEY, {f"page:{page}": now for page in range(1, total + 1)}, nx=True)
+        # Если число страниц уменьшили - лишние больше не обходим
+        stale = [m for m in await self.redis.zrange(self.KEY, 0, -1) if m.startswith(b"page:") and int(m[5:]) > total]
+        if stale:
+            await self.redis.zrem(self.KEY, *stale)
+
+    async def dispatch(self, limit: int = 500) -> tuple[int, int]:
+        """Отправляет в очереди все, что пора проверить. Возвращает (страниц, машин)"""
+        now = time.time()
+        due = await self._claim(keys=[self.KEY], args=[now, settings.SCHEDULE_LEASE, limit])
+        pages = [int(m[5:]) for m in due if m.startswith(b"page:")]
+        car_ids = [m[4:].decode() for m in due if m.startswith(b"car:")]
+
+        if pages:
+            await self.list_queue.push_many([encode_list_task(page, None) for page in pages])
+            await self.redis.zadd(self.KEY, {f"page:{page}": now + self.page_interval(page) for page in pages})
+
+        added = 0
+        if car_ids:
+            entries = await self.redis.hmget(self.CARS_KEY, car_ids)
+            items, schedule, gone = [], {}, []
+            for ex_id, raw in zip(car_ids, entries):
+                if raw is None:
+                    gone.append(f"car:{ex_id}")
+                    continue
+                entry = json.loads(raw)
+                items.append((ex_id, json.dumps(entry["car"])))
+                schedule[f"car:{ex_id}"] = now + entry["interval"]
+            if gone:
+                await self.redis.zrem(self.KEY, *gone)
+            if schedule:
+                await self.redis.zadd(self.KEY, schedule, xx=True)
+            # Уже стоящие в очереди объявления SeenSet пропустит
+            added = await self.seen.enqueue(self.detail_queue.stream, items)
+
+        return len(pages), added
+
+    async def track(self, cars: list[dict]):
+        """Новые объявления со страницы списка попадают в расписание (известные не трогаем)"""
+        if not cars:
+            return
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for car in cars:
+            entry = {"car": car, "interval": settings.SCHEDULE_LISTING_START_INTERVAL, "published": None, "price": None, "failures": 0}
+            pipe.hsetnx(self.CARS_KEY, car['external_id'], json.dumps(entry))
+            pipe.zadd(self.KEY, {f"car:{car['external_id']}": now + entry["interval"]}, nx=True)
+        await pipe.execute()
+
+    async def _load(self, external_id: str) -> dict | None:
+        raw = await self.redis.hget(self.CARS_KEY, external_id)
+        return json.loads(raw) if raw else None
+
+    async def _save(self, external_id: str, entry: dict):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(self.CARS_KEY, external_id, json.dumps(entry))
+        pipe.zadd(self.KEY, {f"car:{external_id}": time.time() + entry["interval"]})
+        await pipe.execute()
+
+    async def record_listing(self, car_basic: dict, full: dict):
+        """После успешного парсинга деталей: подстраивает интервал под активность объявления"""
+        external_id = car_basic['external_id']
+        entry = await self._load(external_id) or {
+            "car": car_basic, "interval": settings.SCHEDULE_LISTING_START_INTERVAL, "published": None, "price": None,
+        }
+        price = full.get('price')
+        price_changed = entry["price"] is not None and price != entry["price"]
+        # Время, когда мы впервые увидели объявление, о его возрасте ничего не говорит:
+        # после первого запуска "новым" оказался бы весь каталог. Без даты - не новое
+        published = published_at(full) or entry.get("published")
+        is_new = published is not None and time.time() - published < settings.SCHEDULE_NEW_LISTING_AGE
+
+        if price_changed or is_new:
+            interval = entry["interval"] / 2
+        else:
+            interval = entry["interval"] * 1.5
+        entry.update(
+            car=car_basic,
+            price=price,
+            published=published,
+            failures=0,
+            interval=min(max(interval, settings.SCHEDULE_LISTING_MIN_INTERVAL), settings.SCHEDULE_LISTING_MAX_INTERVAL),
+        )
+        await self._save(external_id, entry)
+
+    async def record_gone(self, external_id: str) -> bool:
+        """Страница объявления ответила, что его нет. True - объявление снято с расписания как проданное"""
+        entry = await self._load(external_id)
+        if entry is None:
+            return False
+
+        entry["failures"] = entry.get("failures", 0) + 1
+        if entry["failures"] >= settings.SCHEDULE_SOLD_AFTER:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hdel(self.CARS_KEY, external_id)
+            pipe.zrem(self.KEY, f"car:{external_id}")
+            await pipe.execute()
+            logger.info(f"🏁 Car {external_id} was gone on {entry['failures']} checks in a row, treating as sold")
+            return True
+
+        entry["interval"] = min(entry["interval"] * 2, settings.SCHEDULE_LISTING_MAX_INTERVAL)
+        await self._save(external_id, entry)
+        return False
+
+    async def stats(self) -> dict:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(self.KEY)
+        pipe.hlen(self.CARS_KEY)
+        pipe.zcount(self.KEY, "-inf", time.time())
+        total, cars, due = await pipe.execute()
+        return {"pages": total - cars, "cars": cars, "due": due}
@@ -0,0 +1,51 @@
+from src.config import settings
+
+# KEYS[1] - поток очереди, KEYS[2] - счетчик подавленных дублей
+# ARGV[1] - префикс ключей, ARGV[2] - TTL, дальше пары external_id / payload
+ENQUEUE_UNIQUE = """
+local added = 0
+for i = 3, #ARGV, 2 do
+    if redis.call('SET', ARGV[1] .. ARGV[i], 1, 'NX', 'EX', ARGV[2]) then
+        redis.call('XADD', KEYS[1], '*', 'data', ARGV[i + 1], 'attempts', 0)
+        added = added + 1
+    end
+end
+local duplicates = (#ARGV - 2) / 2 - added
+if duplicates > 0 then
+    redis.call('INCRBY', KEYS[2], duplicates)
+end
+return added
+"""
+
+
+class SeenSet:
+    """
+    Дедупликация задач при постановке в очередь.
+    Объявление помечается ключом с TTL, пока оно в очереди/в работе;
+    проверка и XADD выполняются одним Lua-скриптом, поэтому параллельные
+    воркеры списков не могут поставить одну машину дважды.
+    """
+
+    SUPPRESSED_KEY = "che168:seen:suppressed"
+
+    def __init__(self, redis, prefix: str = "che168:seen:", ttl: int = settings.DEDUP_TTL):
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+        self._script = redis.register_script(ENQUEUE_UNIQUE)
+
+    async def enqueue(self, stream: str, items: list[tuple[str, str]]) -> int:
+        """items: (external_id, payload). Возвращает, сколько реально добавлено"""
+        if not items:
+            return 0
+        args = [self.prefix, self.ttl]
+        for external_id, payload in items:
+            args += [external_id, payload]
+        return int(await self._script(keys=[stream, self.SUPPRESSED_KEY], args=args))
+
+    async def release(self, external_id: str):
+        """Задача обработана - следующее изменение объявления снова попадет в очередь"""
+        await self.redis.delete(self.prefix + external_id)
+
+    async def suppressed(self) -> int:
+        return int(await self.redis.get(self.SUPPRESSED_KEY) or 0)
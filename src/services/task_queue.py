@@ -0,0 +1,164 @@
+import os
+import time
+import json
+import socket
+from loguru import logger
+from redis.exceptions import ResponseError
+
+from src.config import settings
+
+LIST_QUEUE = "che168:list"
+DETAIL_QUEUE = "che168:detail"
+IMAGE_QUEUE = "che168:images"
+
+# Переносит созревшие повторы из ZSET обратно в поток.
+# KEYS[1] - ZSET повторов, KEYS[2] - поток; ARGV[1] - текущее время, ARGV[2] - лимит
+PROMOTE_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(due) do
+    if redis.call('ZREM', KEYS[1], item) == 1 then
+        local task = cjson.decode(item)
+        redis.call('XADD', KEYS[2], '*', 'data', task['data'], 'attempts', task['attempts'])
+    end
+end
+return #due
+"""
+
+
+class TaskFailed(Exception):
+    """Задачу стоит повторить позже"""
+
+
+class ListingGone(Exception):
+    """Сайт ответил, что объявления больше нет: повторять бессмысленно"""
+
+
+class Task:
+    def __init__(self, queue: "StreamQueue", message_id: str, fields: dict):
+        self.queue = queue
+        self.id = message_id
+        self.data = fields.get("data", "")
+        self.attempts = int(fields.get("attempts", 0))
+
+
+class StreamQueue:
+    """
+    Очередь задач на Redis Streams с группой потребителей.
+    Задача подтверждается (XACK) только после обработки; зависшие у упавшего
+    воркера забираются через XAUTOCLAIM. Ошибки уходят в ZSET отложенных
+    повторов с экспоненциальной задержкой, после исчерпания попыток - в :dead.
+    """
+
+    GROUP = "workers"
+
+    def __init__(
+        self,
+        redis,
+        name: str,
+        max_retries: int = settings.QUEUE_MAX_RETRIES,
+        retry_delay: float = settings.QUEUE_RETRY_DELAY,
+        claim_idle: float = settings.QUEUE_CLAIM_IDLE,
+    ):
+        self.redis = redis
+        self.name = name
+        self.stream = f"{name}:stream"
+        self.retry_key = f"{name}:retry"
+        self.dead_key = f"{name}:dead"
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.claim_idle_ms = int(claim_idle * 1000)
+        self._last_claim = 0.0
+        self._promote = redis.register_script(PROMOTE_DUE)
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def push_many(self, payloads: list[str]):
+        """Пачка задач за один round-trip"""
+        if not payloads:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for payload in payloads:
+            pipe.xadd(self.stream, {"data": payload, "attempts": 0})
+        await pipe.execute()
+
+    def _decode(self, message_id, fields: dict) -> Task:
+        fields = {k.decode(): v.decode() for k, v in fields.items()}
+        return Task(self, message_id.decode() if isinstance(message_id, bytes) else message_id, fields)
+
+    async def _claim_idle(self, count: int) -> list[Task]:
+        """Задачи, которые слишком долго висят у других (вероятно упавших) воркеров"""
+        now = time.monotonic()
+        if now - self._last_claim < self.claim_idle_ms / 1000 / 4:
+            return []
+        self._last_claim = now
+
+        result = await self.redis.xautoclaim(
+            self.stream, self.GROUP, self.consumer, min_idle_time=self.claim_idle_ms, start_id="0-0", count=count
+        )
+        messages = result[1] if result else []
+        tasks = [self._decode(message_id, fields) for message_id, fields in messages if fields]
+        if tasks:
+            logger.warning(f"♻️ {self.name}: reclaimed {len(tasks)} stale tasks")
+        return tasks
+
+    async def read(self, count: int = 1, block: float | None = None) -> list[Task]:
+        tasks = await self._claim_idle(count)
+        if tasks:
+            return tasks
+
+        response = await self.redis.xreadgroup(
+            self.GROUP, self.consumer, {self.stream: ">"},
+            count=count, block=int(block * 1000) if block else None
+        )
+        return [self._decode(message_id, fields) for _, messages in response or [] for message_id, fields in messages]
+
+    async def ack(self, task: Task):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xack(self.stream, self.GROUP, task.id)
+        pipe.xdel(self.stream, task.id)
+        await pipe.execute()
+
+    async def retry(self, task: Task, error: str) -> bool:
+        """Откладывает задачу; False - попытки кончились и она ушла в dead-letter"""
+        attempts = task.attempts + 1
+        pipe = self.redis.pipeline(transaction=True)
+        if attempts > self.max_retries:
+            pipe.xadd(self.dead_key, {"data": task.data, "attempts": attempts, "error": error[:500]}, maxlen=10000, approximate=True)
+        else:
+            due = time.time() + self.retry_delay * 2 ** (attempts - 1)
+            pipe.zadd(self.retry_key, {json.dumps({"data": task.data, "attempts": attempts}): due})
+        pipe.xack(self.stream, self.GROUP, task.id)
+        pipe.xdel(self.stream, task.id)
+        await pipe.execute()
+        return attempts <= self.max_retries
+
+    async def promote_due(self, limit: int = 100) -> int:
+        return int(await self._promote(keys=[self.retry_key, self.stream], args=[time.time(), limit]))
+
+    async def depth(self) -> dict:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xlen(self.stream)
+        pipe.zcard(self.retry_key)
+        pipe.xlen(self.dead_key)
+        queued, retrying, dead = await pipe.execute()
+        return {"queued": queued, "retrying": retrying, "dead": dead}
+
+    async def drain_legacy_list(self, list_key: str) -> int:
+        """Переносит задачи из старой очереди-списка (LPUSH/BLPOP) в поток"""
+        moved = 0
+        while True:
+            items = await self.redis.rpop(list_key, 500)
+            if not items:
+                break
+            await self.push_many([item.decode() for item in items])
+            moved += len(items)
+        if moved:
+            logger.info(f"Moved {moved} tasks from legacy list {list_key} to {self.stream}")
+        return moved
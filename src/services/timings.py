@@ -0,0 +1,63 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from src.services.metrics import STAGE_SECONDS
+
+
+class StageTimings:
+    """
+    Длительности этапов конвейера (fetch, font, parse, decode, upsert, enrich)
+    внутри одного процесса. Каждый замер уходит в гистограмму Prometheus;
+    последние maxlen замеров на этап хранятся для сводки, которая по завершении
+    процесса пишется в STAGE_TIMINGS_PATH (для бенчмарков).
+    """
+
+    def __init__(self, maxlen: int = 100_000):
+        self.maxlen = maxlen
+        self.samples: dict[str, deque] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        STAGE_SECONDS.labels(name).observe(seconds)
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.maxlen)
+        samples.append(seconds)
+
+    @staticmethod
+    def percentile(ordered: list[float], q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict[str, dict]:
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            result[name] = {
+                "count": len(ordered),
+                "p50_ms": round(self.percentile(ordered, 0.5) * 1000, 3),
+                "p99_ms": round(self.percentile(ordered, 0.99) * 1000, 3),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "total_s": round(sum(ordered), 3),
+            }
+        return result
+
+    def dump(self, path: str | None):
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+# Один набор на процесс
+stages = StageTimings()
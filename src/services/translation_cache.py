@@ -0,0 +1,83 @@
+import re
+import json
+import hashlib
+
+from src.config import settings
+from src.services.font_cache import LRUDict
+
+
+def model_key(title: str | None) -> str | None:
+    """Марка+модель из заголовка: все до года выпуска ("比亚迪 汉 2022款 ..." -> "比亚迪 汉")"""
+    if not title:
+        return None
+    key = re.split(r"\s*(?:19|20)\d{2}款", title, maxsplit=1)[0].strip()
+    return key or None
+
+
+class TranslationCache:
+    """
+    Кэш переводов AI с точностью до поля.
+    Пространства имен: feature, location, model, spec:<поле>.
+    Память (LRU) -> Redis (ключи с TTL, общие для всех реплик ai_worker).
+    """
+
+    def __init__(self, redis, max_items: int = settings.TRANSLATION_CACHE_SIZE, ttl: int = settings.TRANSLATION_CACHE_TTL):
+        self.redis = redis
+        self.memory = LRUDict(max_items)
+        self.ttl = ttl
+        self.hits: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+
+    @staticmethod
+    def _key(namespace: str, value: str) -> str:
+        return f"ai:tr:{namespace}:{hashlib.sha1(value.encode('utf-8')).hexdigest()}"
+
+    async def lookup(self, items: list[tuple[str, str]]) -> dict[tuple[str, str], object]:
+        """
+        Пачка (пространство, значение) за один MGET.
+        Возвращает только найденные: (пространство, значение) -> перевод.
+        """
+        found = {}
+        missing = []
+        for item in dict.fromkeys(items):
+            cached = self.memory.get(self._key(*item))
+            if cached is not None:
+                found[item] = cached
+            else:
+                missing.append(item)
+
+        if missing and self.redis is not None:
+            raw = await self.redis.mget([self._key(*item) for item in missing])
+            for item, value in zip(missing, raw):
+                if value is not None:
+                    found[item] = json.loads(value)
+                    self.memory.put(self._key(*item), found[item])
+
+        for namespace, value in items:
+            counter = self.hits if (namespace, value) in found else self.misses
+            counter[namespace] = counter.get(namespace, 0) + 1
+        return found
+
+    async def store(self, items: dict[tuple[str, str], object]):
+        if not items:
+            return
+        pipe = self.redis.pipeline() if self.redis is not None else None
+        for (namespace, value), translation in items.items():
+            key = self._key(namespace, value)
+            self.memory.put(key, translation)
+            if pipe is not None:
+                pipe.set(key, json.dumps(translation, ensure_ascii=False), ex=self.ttl)
+        if pipe is not None:
+            await pipe.execute()
+
+    def stats(self) -> dict:
+        total_hits = sum(self.hits.values())
+        total = total_hits + sum(self.misses.values())
+        return {
+            "hit_rate": round(total_hits / total, 3) if total else None,
+            "by_namespace": {
+                ns: f"{self.hits.get(ns, 0)}/{self.hits.get(ns, 0) + self.misses.get(ns, 0)}"
+                for ns in sorted(set(self.hits) | set(self.misses))
+            },
+            "memory_items": len(self.memory),
+        }
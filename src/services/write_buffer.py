@@ -0,0 +1,315 @@
+import json
+import time
+import asyncio
+from typing import Awaitable, Callable
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import func, case, literal_column, text
+from loguru import logger
+
+from src.config import settings
+from src.database import AsyncSessionLocal
+from src.models import RawCar
+from src.services.normalizer import canonical_fuel
+from src.services.timings import stages
+from src.services.metrics import WRITES
+from src.services.history import record_changes, mark_sold
+
+
+# Поля raw_data, которые дублируются в типизированные колонки RawCar
+HOT_FIELDS = ("price", "year", "mileage", "brand", "fuel_type")
+# Из них те, что после обогащения берутся из ответа AI
+AI_FIELDS = ("brand", "fuel_type")
+# Остальные - всегда из парсера
+PARSED_FIELDS = tuple(field for field in HOT_FIELDS if field not in AI_FIELDS)
+NESTED_FIELDS = {"raw_attributes": dict, "features": list}
+# id в одном NOTIFY: полезная нагрузка ограничена 8000 байт
+NOTIFY_IDS = 500
+
+
+def _as_int(value) -> int | None:
+    try:
+        return int(round(float(value))) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def unpack_nested(car: dict) -> dict:
+    """raw_attributes / features -> настоящие объекты (старые записи хранили их JSON-строкой)"""
+    for field, kind in NESTED_FIELDS.items():
+        value = car.get(field)
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                value = None
+            car[field] = value if isinstance(value, kind) else kind()
+    return car
+
+
+def hot_columns(car: dict) -> dict:
+    """Значения типизированных колонок из данных машины; чего нет - None"""
+    return {
+        "price": _as_int(car.get('price')),
+        "year": _as_int(car.get('year')),
+        "mileage": _as_int(car.get('mileage')),
+        # Бренд знает только AI; до обогащения колонка пустая
+        "brand": car.get('brand_en') or None,
+        "fuel_type": canonical_fuel(car.get('fuel_type')),
+    }
+
+
+def is_detail(car: dict) -> bool:
+    return bool(car.get('parsed_success'))
+
+
+def merge_car(older: dict, newer: dict) -> dict:
+    """Те же правила слияния, что и в upsert_cars, но в памяти (для буфера)"""
+    if is_detail(older) and not is_detail(newer):
+        return {**newer, **older}
+    return {**older, **newer}
+
+
+async def upsert_cars(cars: list[dict]) -> dict:
+    """
+    Один многострочный INSERT ... ON CONFLICT на всю пачку, со слиянием JSONB:
+    превью из списка только дописывает недостающие ключи (excluded || existing),
+    детали перекрывают старые значения, но не стирают обогащение (existing || excluded).
+    Если после слияния ничего не меняется - строка не переписывается вовсе.
+    Возвращает {"inserted", "updated", "skipped"}.
+    """
+    if not cars:
+        return {"inserted": 0, "updated": 0, "skipped": 0}
+
+    rows = [
+        {
+            "site_source": car.get('source', 'che168'),
+            "external_id": car['external_id'],
+            "raw_data": unpack_nested(car),
+            "ai_status": "pending" if is_detail(car) else None,
+            **hot_columns(car),
+        }
+        for car in cars
+    ]
+
+    with stages.stage("upsert"):
+        async with AsyncSessionLocal() as session:
+            # До upsert: сравниваем с еще не перезаписанными значениями
+            await record_changes(session, [
+                {"external_id": row["external_id"], "price": row["price"], "mileage": row["mileage"], "status": row["raw_data"].get('status')}
+                for row in rows if row["ai_status"]
+            ])
+
+            stmt = insert(RawCar).values(rows)
+            excluded = stmt.excluded
+            # Поля, которые уже переписал ai_worker (переведенный title, fuel_type...), детали не трогают
+            enriched = literal_column("ARRAY(SELECT jsonb_array_elements_text(raw_cars.raw_data->'ai_fields'))")
+            # После неудачного обогащения детали дают машине еще одну попытку: метка
+            # ai_processed: failed не должна пережить слияние (иначе строка не изменится
+            # и не перепишется, а ai_status так и останется failed)
+            stored = case(
+                (RawCar.ai_status == 'failed', RawCar.raw_data.op("-")(literal_column("'ai_processed'::text"))),
+                else_=RawCar.raw_data,
+            )
+            merged = case(
+                (excluded.ai_status.is_(None), excluded.raw_data.concat(RawCar.raw_data)),
+                else_=stored.concat(excluded.raw_data.op("-")(enriched)),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['external_id'],
+                set_={
+                    'raw_data': merged,
+                    # Ключи обогащения переживают слияние, поэтому done остается done;
+                    # превью не сбрасывает статус, детали возвращают failed в pending
+                    'ai_status': case(
+                        (RawCar.ai_status == 'done', RawCar.ai_status),
+                        else_=func.coalesce(excluded.ai_status, RawCar.ai_status),
+                    ),
+                    # Превью из списка не знает пробега/года - не затираем то, что уже есть;
+                    # свежие детали - источник истины, даже если поле в них пропало
+                    **{
+                        field: case(
+                            (excluded.ai_status.is_(None), func.coalesce(excluded[field], getattr(RawCar, field))),
+                            else_=excluded[field],
+                        )
+                        for field in PARSED_FIELDS
+                    },
+                    # После обогащения эти колонки - значения AI, а не сырые из парсера
+                    **{
+                        field: case(
+                            (RawCar.ai_status == 'done', func.coalesce(getattr(RawCar, field), excluded[field])),
+                            else_=func.coalesce(excluded[field], getattr(RawCar, field)),
+                        )
+                        for field in AI_FIELDS
+                    },
+                    'updated_at': func.now(),
+                },
+                # Сравнение jsonb смысловое (порядок ключей не важен); без записи нет ни
+                # новой версии строки, ни перезаписи TOAST, ни WAL
+                where=merged.is_distinct_from(RawCar.raw_data),
+            ).returning(RawCar.id, RawCar.ai_status, literal_column("xmax = 0").label("inserted"))
+            written = (await session.execute(stmt)).all()
+
+            # Будим ai_worker; NOTIFY доставляется только после COMMIT, то есть строки уже видны
+            pending = [str(row.id) for row in written if row.ai_status == 'pending']
+            for i in range(0, len(pending), NOTIFY_IDS):
+                await session.execute(
+                    text("SELECT pg_notify(:channel, :ids)"),
+                    {"channel": settings.AI_NOTIFY_CHANNEL, "ids": ",".join(pending[i:i + NOTIFY_IDS])},
+                )
+            await session.commit()
+
+    inserted = sum(row.inserted for row in written)
+    counts = {"inserted": inserted, "updated": len(written) - inserted, "skipped": len(rows) - len(written)}
+    for result, value in counts.items():
+        WRITES.labels(result).inc(value)
+    return counts
+
+
+async def save_sold(external_id: str):
+    async with AsyncSessionLocal() as session:
+        await mark_sold(session, external_id)
+        await session.commit()
+
+
+class CarWriteBuffer:
+    """
+    Write-behind буфер для RawCar.
+    Копит машины и пишет их пачкой: по размеру, по возрасту пачки и при остановке.
+    До записи машина есть только в памяти процесса, поэтому все, что должно
+    случиться после сохранения (подтвердить задачу очереди), передается
+    в add() как on_written и вызывается после COMMIT ее пачки.
+    Пачка, которая падает max_failures раз подряд, пишется поштучно: строки
+    с ошибкой отбрасываются, и для них вызывается on_failed(ошибка).
+    """
+
+    def __init__(
+        self,
+        max_rows: int = settings.WRITE_BATCH_SIZE,
+        max_age: float = settings.WRITE_BATCH_MAX_AGE,
+        max_failures: int = settings.WRITE_MAX_FAILURES,
+    ):
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.max_failures = max_failures
+
+        # external_id -> последняя версия (Postgres не даст обновить одну строку дважды за INSERT)
+        self.pending: dict[str, dict] = {}
+        # external_id -> [(on_written, on_failed)]
+        self.callbacks: dict[str, list[tuple[Callable[[], Awaitable], Callable[[str], Awaitable] | None]]] = {}
+        self.oldest: float | None = None
+        # Сколько сбросов подряд закончились ошибкой
+        self.failures = 0
+
+        self.rows_written = 0
+        self.batches_written = 0
+        self.results = {"inserted": 0, "updated": 0, "skipped": 0, "dropped": 0}
+
+        self._lock = asyncio.Lock()
+        self._ticker: asyncio.Task | None = None
+
+    async def start(self):
+        self._ticker = asyncio.create_task(self._tick())
+
+    async def add(
+        self,
+        car: dict,
+        on_written: Callable[[], Awaitable] | None = None,
+        on_failed: Callable[[str], Awaitable] | None = None,
+    ):
+        # Превью, пришедшее после деталей той же машины, не должно их вытеснить
+        older = self.pending.get(car['external_id'])
+        self.pending[car['external_id']] = merge_car(older, car) if older else car
+        if on_written is not None or on_failed is not None:
+            self.callbacks.setdefault(car['external_id'], []).append((on_written, on_failed))
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+
+        if len(self.pending) >= self.max_rows:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self.pending:
+                return
+
+            batch = list(self.pending.values())
+            callbacks = self.callbacks
+            self.pending = {}
+            self.callbacks = {}
+            self.oldest = None
+
+            try:
+                counts = await upsert_cars(batch)
+            except Exception as e:
+                self.failures += 1
+                if self.failures < self.max_failures:
+                    logger.error(f"Batch upsert of {len(batch)} cars failed ({self.failures}/{self.max_failures}): {e}")
+                    self._requeue(batch, callbacks)
+                    return
+                # Пачка падает раз за разом - скорее всего из-за конкретных строк:
+                # пишем поштучно, чтобы одна плохая машина не держала остальные
+                logger.error(f"Batch upsert of {len(batch)} cars failed {self.failures} times in a row, writing row by row: {e}")
+                self.failures = 0
+                await self._write_rows(batch, callbacks)
+                return
+
+            self.failures = 0
+            await self._written(batch, counts, callbacks)
+
+    def _requeue(self, batch: list[dict], callbacks: dict):
+        """Возвращает упавшую пачку в буфер до следующего сброса"""
+        # То, что успело прийти за время сброса, сливаем по тем же правилам, что и в add():
+        # превью не должно вытеснить упавшие детали (иначе on_written подтвердит задачу без них)
+        for car in batch:
+            newer = self.pending.get(car['external_id'])
+            self.pending[car['external_id']] = merge_car(car, newer) if newer else car
+        for external_id, waiting in callbacks.items():
+            self.callbacks.setdefault(external_id, []).extend(waiting)
+        self.oldest = self.oldest or time.monotonic()
+
+    async def _write_rows(self, batch: list[dict], callbacks: dict):
+        for car in batch:
+            waiting = {car['external_id']: callbacks.get(car['external_id'], [])}
+            try:
+                counts = await upsert_cars([car])
+            except Exception as e:
+                logger.error(f"❌ Dropping car {car['external_id']} from the write buffer: {e}")
+                WRITES.labels("dropped").inc()
+                self.results["dropped"] += 1
+                await self._run([on_failed(str(e)) for _, on_failed in waiting[car['external_id']] if on_failed])
+                continue
+            await self._written([car], counts, waiting)
+
+    async def _written(self, batch: list[dict], counts: dict, callbacks: dict):
+        self.rows_written += len(batch)
+        self.batches_written += 1
+        for result, value in counts.items():
+            self.results[result] += value
+        logger.debug(f"💾 Flushed {len(batch)} cars: {counts} (total {self.rows_written} rows in {self.batches_written} batches)")
+        await self._run([on_written() for waiting in callbacks.values() for on_written, _ in waiting if on_written])
+
+    @staticmethod
+    async def _run(callbacks: list[Awaitable]):
+        results = await asyncio.gather(*callbacks, return_exceptions=True)
+        for error in (result for result in results if isinstance(result, Exception)):
+            logger.error(f"After-write callback failed: {error}")
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(min(self.max_age, 1.0))
+            if self.oldest is not None and time.monotonic() - self.oldest >= self.max_age:
+                await self.flush()
+
+    async def close(self):
+        if self._ticker:
+            self._ticker.cancel()
+        await self.flush()
+        logger.info(f"💾 Write buffer closed: {self.rows_written} rows in {self.batches_written} batches, {self.results}")
+
+    def stats(self) -> dict:
+        return {
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "pending": len(self.pending),
+            **self.results,
+        }
@@ -0,0 +1,262 @@
+import time
+import json
+import signal
+import asyncio
+import multiprocessing
+
+from redis import asyncio as aioredis
+from loguru import logger
+
+from src.config import settings
+from src.database import init_db
+from src.scrapers.che168 import Che168Scraper
+from src.services.write_buffer import CarWriteBuffer, save_sold
+from src.services.fingerprints import ListingFingerprints, ScanTracker, decode_list_task
+from src.services.seen_set import SeenSet
+from src.services.task_queue import StreamQueue, Task, TaskFailed, ListingGone, LIST_QUEUE, DETAIL_QUEUE, IMAGE_QUEUE
+from src.services.parse_pool import ParsePool
+from src.services.scheduler import CrawlScheduler
+from src.services.timings import stages
+from src.services.metrics import TASKS, QUEUE_DEPTH, WRITE_PENDING, ProxyCollector, start_metrics_server
+from prometheus_client import REGISTRY
+
+
+class WorkerContext:
+    """Общие ресурсы для всех параллельных задач воркера"""
+
+    def __init__(self, redis, scraper: Che168Scraper, writer: CarWriteBuffer):
+        self.redis = redis
+        self.scraper = scraper
+        self.writer = writer
+        self.fingerprints = ListingFingerprints(redis)
+        self.scans = ScanTracker(redis)
+        self.seen = SeenSet(redis)
+        self.list_queue = StreamQueue(redis, LIST_QUEUE)
+        self.detail_queue = StreamQueue(redis, DETAIL_QUEUE)
+        self.image_queue = StreamQueue(redis, IMAGE_QUEUE)
+        self.schedule = CrawlScheduler(redis)
+
+async def handle_list_task(ctx: WorkerContext, page: int, scan_id: int | None = None):
+    scan = await ctx.scans.state(scan_id)
+    if scan.get("stopped"):
+        logger.info(f"[LIST] Scan #{scan_id} stopped early, skipping page {page}")
+        return
+
+    logger.info(f"[LIST] Parsing page {page}")
+
+    cars_preview = await ctx.scraper.parse_list(page)
+
+    if cars_preview:
+        await ctx.schedule.track(cars_preview)
+        changed = cars_preview if scan.get("force") else await ctx.fingerprints.changed(cars_preview)
+        logger.info(f"Found {len(cars_preview)} cars, {len(changed)} new or changed. Enqueuing details...")
+        for car in changed:
+            await ctx.writer.add(car)
+
+        added = await ctx.seen.enqueue(
+            ctx.detail_queue.stream,
+            [(car['external_id'], json.dumps(car)) for car in changed]
+        )
+        if added < len(changed):
+            logger.info(f"Skipped {len(changed) - added} cars already queued")
+
+        await ctx.scans.page_done(scan_id, page, len(changed))
+
+async def handle_detail_task(ctx: WorkerContext, car_basic: dict) -> dict | None:
+    """Разобранные детали машины; None - разбирать нечего"""
+    url = car_basic.get('link')
+    ex_id = car_basic.get('external_id')
+
+    if not url:
+        return None
+
+    logger.info(f"[DETAIL] Parsing car {ex_id}")
+
+    full_car_data = await ctx.scraper.parse_detail(url, basic_info=car_basic)
+
+    # parse_detail при ошибке сети возвращает превью - это тоже повод повторить
+    if not full_car_data or not full_car_data.get('parsed_success'):
+        raise TaskFailed(f"DETAIL parse failed for {ex_id}")
+
+    await ctx.schedule.record_listing(car_basic, full_car_data)
+    if settings.IMAGE_DIR and full_car_data.get('images'):
+        # Фото качает отдельная команда images, чтобы не занимать прокси и слоты воркера
+        await ctx.image_queue.push_many([json.dumps({"external_id": ex_id, "images": full_car_data['images']})])
+    return full_car_data
+
+async def detail_written(ctx: WorkerContext, task: Task, car_basic: dict):
+    """Детали уже в Postgres: запоминаем отпечаток и подтверждаем задачу"""
+    await ctx.fingerprints.remember(car_basic)
+    await task.queue.ack(task)
+    await ctx.seen.release(car_basic.get('external_id', ''))
+
+async def fail_task(ctx: WorkerContext, task: Task, car_basic: dict | None, error: str, who: str):
+    """Откладывает задачу в очередь повторов, а когда попытки кончились - в dead-letter"""
+    will_retry = await task.queue.retry(task, error)
+    TASKS.labels(task.queue.name, "retry" if will_retry else "dead").inc()
+    if will_retry:
+        logger.warning(f"[{who}] {task.queue.name} task failed (attempt {task.attempts + 1}), will retry: {error}")
+    else:
+        logger.error(f"[{who}] {task.queue.name} task moved to dead-letter: {error}")
+        if car_basic is not None:
+            await ctx.seen.release(car_basic.get('external_id', ''))
+
+async def process_task(worker_id: int, ctx: WorkerContext, task: Task):
+    detail = task.queue is ctx.detail_queue
+    car_basic = json.loads(task.data) if detail else None
+
+    # Паузы между запросами выдерживает лимитер скрапера, а неудачи -
+    # очередь повторов, поэтому воркер сразу берет следующую задачу
+    try:
+        if detail:
+            full_car_data = await handle_detail_task(ctx, car_basic)
+        else:
+            await handle_list_task(ctx, *decode_list_task(task.data))
+    except ListingGone as e:
+        # Только такой ответ - довод, что машину продали; капча и сеть уходят в повторы ниже
+        logger.info(f"[#{worker_id}] {e}")
+        await task.queue.ack(task)
+        await ctx.seen.release(car_basic.get('external_id', ''))
+        if await ctx.schedule.record_gone(car_basic.get('external_id', '')):
+            await save_sold(car_basic.get('external_id', ''))
+        return
+    except Exception as e:
+        await fail_task(ctx, task, car_basic, str(e), f"#{worker_id}")
+        return
+
+    if detail and full_car_data:
+        # XACK и отпечаток - только после записи пачки: если процесс умрет раньше,
+        # задачу заберет XAUTOCLAIM, а следующий обход списка снова поставит машину.
+        # Машину, которую буфер так и не смог записать, повторяем как любую упавшую задачу
+        await ctx.writer.add(
+            full_car_data,
+            on_written=lambda: detail_written(ctx, task, car_basic),
+            on_failed=lambda error: fail_task(ctx, task, car_basic, error, "writer"),
+        )
+        return
+
+    await task.queue.ack(task)
+    TASKS.labels(task.queue.name, "ack").inc()
+    if detail:
+        await ctx.seen.release(car_basic.get('external_id', ''))
+
+async def consume_tasks(worker_id: int, ctx: WorkerContext):
+    while True:
+        # Детали в приоритете: списки только порождают новые детали
+        tasks = await ctx.detail_queue.read(count=1)
+        if not tasks:
+            tasks = await ctx.list_queue.read(count=1, block=1)
+
+        for task in tasks:
+            await process_task(worker_id, ctx, task)
+
+async def promote_retries(ctx: WorkerContext):
+    """Возвращает в потоки задачи, у которых подошло время повтора"""
+    while True:
+        for queue in (ctx.list_queue, ctx.detail_queue):
+            await queue.promote_due()
+        await asyncio.sleep(1)
+
+async def report_proxies(ctx: WorkerContext, every: float = 300):
+    """Периодически печатает метрики по каждому прокси"""
+    while True:
+        await asyncio.sleep(every)
+        for name, stats in ctx.scraper.proxies.stats().items():
+            logger.info(f"🌐 {name}: {stats}")
+
+async def update_gauges(ctx: WorkerContext, every: float = 15):
+    """Глубина очередей и буфера записи для /metrics"""
+    while True:
+        for queue in (ctx.list_queue, ctx.detail_queue):
+            try:
+                for state, value in (await queue.depth()).items():
+                    QUEUE_DEPTH.labels(queue.name, state).set(value)
+            except Exception as e:
+                logger.debug(f"Queue depth for metrics failed: {e}")
+        WRITE_PENDING.set(len(ctx.writer.pending))
+        await asyncio.sleep(every)
+
+async def run_worker(concurrency: int, parse_workers: int, metrics_port: int | None = settings.WORKER_METRICS_PORT):
+    # SIGTERM (docker stop, супервизор) -> штатная остановка со сбросом буфера
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    await init_db()
+    redis = await aioredis.from_url(settings.REDIS_URL)
+    parse_pool = ParsePool(parse_workers) if parse_workers > 0 else None
+    scraper = Che168Scraper(parse_pool=parse_pool)
+    writer = CarWriteBuffer()
+    await writer.start()
+    ctx = WorkerContext(redis, scraper, writer)
+    start_metrics_server(metrics_port)
+    REGISTRY.register(ProxyCollector(scraper.proxies))
+    for queue, legacy in ((ctx.list_queue, "che168:list_queue"), (ctx.detail_queue, "che168:detail_queue")):
+        await queue.ensure_group()
+        await queue.drain_legacy_list(legacy)
+    
+    logger.info(f"Worker started with concurrency={concurrency}, parse_workers={parse_workers}, proxies={len(scraper.proxies)}. Listening to queues...")
+    
+    try:
+        await asyncio.gather(promote_retries(ctx), report_proxies(ctx), update_gauges(ctx), *(consume_tasks(i, ctx) for i in range(concurrency)))
+    except asyncio.CancelledError:
+        logger.info("Worker stopping...")
+    except Exception as e:
+        logger.critical(f"Worker crashed: {e}")
+    finally:
+        logger.info(f"Proxies on exit: {scraper.proxies.stats()}")
+        logger.info(f"Font cache on exit: {scraper.font_cache.stats()}")
+        logger.info(f"Duplicates suppressed so far: {await ctx.seen.suppressed()}")
+        logger.info(f"Queues on exit: list={await ctx.list_queue.depth()} detail={await ctx.detail_queue.depth()}")
+        await writer.close()
+        stages.dump(settings.STAGE_TIMINGS_PATH)
+        await scraper.close()
+        await redis.aclose()
+        if parse_pool:
+            parse_pool.close()
+
+def run_loop(coro, use_uvloop: bool = False):
+    if use_uvloop:
+        import uvloop
+        return uvloop.run(coro)
+    return asyncio.run(coro)
+
+def worker_process(concurrency: int, parse_workers: int, use_uvloop: bool, metrics_port: int | None):
+    """Точка входа дочернего процесса супервизора"""
+    run_loop(run_worker(concurrency, parse_workers, metrics_port), use_uvloop)
+
+def supervise(processes: int, concurrency: int, parse_workers: int, use_uvloop: bool, metrics_port: int | None = None):
+    """Держит N процессов-воркеров и перезапускает упавшие"""
+    children: dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def spawn(slot: int):
+        proc = multiprocessing.Process(
+            target=worker_process,
+            # У каждого процесса свой /metrics: базовый порт + номер слота
+            args=(concurrency, parse_workers, use_uvloop, metrics_port + slot if metrics_port else None),
+            name=f"worker-{slot}"
+        )
+        proc.start()
+        children[slot] = proc
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(processes):
+        spawn(slot)
+    logger.info(f"👷 Supervisor started {processes} worker processes")
+
+    while not stopping:
+        time.sleep(1)
+        for slot, proc in list(children.items()):
+            if not proc.is_alive() and not stopping:
+                logger.warning(f"Worker process {proc.name} exited with {proc.exitcode}, restarting")
+                spawn(slot)
+
+    for proc in children.values():
+        proc.terminate()
+    for proc in children.values():
+        proc.join(timeout=30)
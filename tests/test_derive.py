@@ -0,0 +1,36 @@
+from src.scrapers.che168_parser import Che168Parser
+from src.services.renormalizer import patch_rows
+
+parser = Che168Parser()
+
+
+def test_mileage_unit_is_guessed_only_for_fractional_values():
+    assert parser._mileage_km("3.5万公里") == 35000
+    assert parser._mileage_km("8000公里") == 8000
+    assert parser._mileage_km("3.5") == 35000
+    assert parser._mileage_km("80") is None
+    assert parser._mileage_km("80000") == 80000
+
+
+def test_transmission_uses_ai_vocabulary():
+    assert [parser._transmission(raw) for raw in ("7挡双离合", "无级变速", "固定齿比", "6挡手动")] == [
+        "robotic", "variator", "automatic", "manual",
+    ]
+
+
+def test_price_without_digits_is_not_parsed():
+    html = "<html><div class='price'>面议</div></html>"
+    assert parser.parse_detail_html("https://www.che168.com/dealer/1/1.html", html, None, {"external_id": "1"}) is None
+
+
+def test_gasoline_is_petrol():
+    assert parser._fuel("Gasoline", "") == parser._fuel("汽油", "") == "petrol"
+
+
+def test_renormalize_writes_canonical_fuel_column():
+    [(car_id, patch, old)] = parser.renormalize([(7, {"raw_attributes": {"燃料类型": "汽油"}, "fuel_type": None})])
+    assert patch["fuel_type"] == "petrol"
+    # raw_data хранит значение парсера, а типизированная колонка - тот же словарь, что и при upsert
+    [row] = patch_rows([(car_id, patch, old)])
+    assert row["patch"]["fuel_type"] == "petrol"
+    assert row["fuel_type"] == "gasoline"
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from src.services.duplicates import DuplicateIndex, borrowed_enrichment
+
+ICE = {"title": "丰田 卡罗拉 2021款 1.2T", "year": 2021, "mileage": 30000, "price": 98000, "battery_capacity": None}
+
+
+def test_ice_twins_without_shared_photo_are_not_duplicates():
+    index = DuplicateIndex(threshold=0.9)
+    index.add(1, {**ICE, "images": ["https://img.che168.com/a.jpg"]})
+    # Пробег и цена совпадают, батареи нет у обеих - этого мало
+    assert index.match({**ICE, "images": ["https://img.che168.com/b.jpg"]}) is None
+
+
+def test_ice_twins_with_shared_photo_are_duplicates():
+    index = DuplicateIndex(threshold=0.9)
+    index.add(1, {**ICE, "images": ["https://img.che168.com/a.jpg?x=1"]})
+    assert index.match({**ICE, "images": ["http://img.che168.com/a.jpg"]}) == (1, 1.0)
+
+
+def test_ev_twins_match_on_battery():
+    index = DuplicateIndex(threshold=0.9)
+    ev = {**ICE, "title": "比亚迪 汉 2022款 EV", "battery_capacity": 85.4}
+    index.add(1, ev)
+    assert index.match(dict(ev))[0] == 1
+
+
+def test_dealer_text_is_not_borrowed_from_another_dealer():
+    donor = {
+        "ai_fields": ["brand_en", "description_ru", "location"],
+        "brand_en": "Toyota", "description_ru": "Отличное состояние, один владелец", "location": "Beijing",
+        "description": "车况精品，一手车", "raw_attributes": {"所在地": "北京"},
+    }
+    car = {"description": "准新车，可分期", "raw_attributes": {"所在地": "北京"}}
+    assert borrowed_enrichment(donor, car) == {"brand_en": "Toyota", "location": "Beijing"}
+
+    # Тот же текст и тот же город - переиспользуем все
+    same = {"description": donor["description"], "raw_attributes": {"所在地": "北京"}}
+    assert borrowed_enrichment(donor, same) == {field: donor[field] for field in donor["ai_fields"]}
+
+
+class Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def partitions(self):
+        yield self.rows
+
+
+class Session:
+    """Отдает заготовленные строки вместо запроса и запоминает SQL"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def stream(self, query):
+        self.queries.append(str(query.compile(dialect=postgresql.dialect())))
+        return Rows(self.rows)
+
+
+def row(car_id: int, updated_at: datetime, **car):
+    fields = {"id": car_id, "canonical_id": None, "price": 98000, "year": 2021, "mileage": 30000,
+              "updated_at": updated_at, "title": ICE["title"], "battery_capacity": None, "images": None, **car}
+    return SimpleNamespace(**fields, _asdict=lambda: fields)
+
+
+def test_load_picks_up_rows_with_old_ids_by_updated_at():
+    async def scenario():
+        index = DuplicateIndex()
+        first = datetime(2026, 10, 1, tzinfo=timezone.utc)
+        await index.load(Session([row(5, first)]))
+        assert index.watermark == (first, 5)
+
+        # Машина 3 была превью (ai_status NULL), а теперь разобрана; 5 просто переписана
+        later = first + timedelta(hours=1)
+        session = Session([row(3, later), row(5, later)])
+        assert await index.load(session) == 1
+        assert sorted(index.ids[:len(index)]) == [3, 5]
+        assert index.watermark == (later, 5)
+        assert "(raw_cars.updated_at, raw_cars.id) >" in session.queries[0]
+
+    asyncio.run(scenario())
+
+
+def test_pending_duplicates_in_one_batch_do_not_link_to_each_other():
+    index = DuplicateIndex(threshold=0.9)
+    photo = {**ICE, "images": ["https://img.che168.com/a.jpg"]}
+    index.add_many([1, 2], [photo, photo], [None, None])
+
+    candidates = index.candidates([(1, photo), (2, photo)])
+    assert candidates == {1: 2, 2: 1}
+    # Ни одна из двух еще не обогащена - связывать не с кем
+    assert index.link_donors(candidates, donors={}) == {}
+    assert list(index.canonical[:2]) == [1, 2]
+
+
+def test_duplicates_link_to_an_enriched_root():
+    index = DuplicateIndex(threshold=0.9)
+    photo = {**ICE, "images": ["https://img.che168.com/a.jpg"]}
+    index.add_many([1, 2, 3], [photo, photo, photo], [None, None, None])
+
+    candidates = index.candidates([(2, photo), (3, photo)])
+    assert index.link_donors(candidates, donors={1: {"ai_fields": ["brand_en"]}}) == {2: 1, 3: 1}
+    assert list(index.canonical[:3]) == [1, 1, 1]
@@ -0,0 +1,17 @@
+from src.services.normalizer import canonical_fuel
+from src.services.write_buffer import hot_columns
+
+
+def test_parser_and_ai_values_share_one_vocabulary():
+    # Парсер пишет petrol/hybrid/electric, модель - gasoline/diesel/electric/hybrid
+    assert hot_columns({"fuel_type": "petrol"})["fuel_type"] == "gasoline"
+    assert canonical_fuel("gasoline") == "gasoline"
+    assert canonical_fuel("Diesel") == "diesel"
+    assert hot_columns({"fuel_type": "electric"})["fuel_type"] == canonical_fuel("electric") == "electric"
+    assert hot_columns({"fuel_type": "hybrid"})["fuel_type"] == canonical_fuel("PHEV") == "hybrid"
+
+
+def test_unknown_fuel_leaves_column_empty():
+    assert hot_columns({})["fuel_type"] is None
+    assert hot_columns({"fuel_type": ""})["fuel_type"] is None
+    assert canonical_fuel("hydrogen") is None
@@ -0,0 +1,15 @@
+from src.services.normalizer import Normalizer
+
+
+def test_transmission_abbreviations_match_whole_tokens():
+    normalizer = Normalizer()
+    resolved = {raw: normalizer.resolve("transmission", raw) for raw in ("CVT", "6AT", "8挡AT", "5MT", "7DCT")}
+    assert {raw: value["transmission_type"] for raw, value in resolved.items()} == {
+        "CVT": "variator", "6AT": "automatic", "8挡AT": "automatic", "5MT": "manual", "7DCT": "robotic",
+    }
+
+
+def test_canonical_transmission_values_resolve_to_themselves():
+    normalizer = Normalizer()
+    for value in ("automatic", "manual", "robotic", "variator"):
+        assert normalizer.resolve("transmission", value) == {"transmission_type": value}
@@ -0,0 +1,40 @@
+import json
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis.aioredis
+
+from src.config import settings
+from src.services.scheduler import CrawlScheduler
+
+CAR = {"external_id": "51234567", "link": "https://www.che168.com/dealer/1/51234567.html"}
+
+
+async def interval_after_check(full: dict) -> float:
+    schedule = CrawlScheduler(fakeredis.aioredis.FakeRedis())
+    await schedule.track([CAR])
+    await schedule.record_listing(CAR, full)
+    return json.loads(await schedule.redis.hget(schedule.CARS_KEY, CAR["external_id"]))["interval"]
+
+
+def test_first_sight_is_not_new():
+    # Машина давно на сайте, мы ее только что нашли: интервал растет от середины диапазона
+    interval = asyncio.run(interval_after_check({"price": 100000, "raw_attributes": {}}))
+    assert interval == settings.SCHEDULE_LISTING_START_INTERVAL * 1.5
+
+
+def test_recently_published_listing_is_checked_more_often():
+    published = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    interval = asyncio.run(interval_after_check({"price": 100000, "raw_attributes": {"发布时间": published}}))
+    assert interval == settings.SCHEDULE_LISTING_START_INTERVAL / 2
+
+
+def test_new_listings_start_in_the_middle():
+    async def scenario():
+        schedule = CrawlScheduler(fakeredis.aioredis.FakeRedis())
+        await schedule.track([CAR])
+        due = await schedule.redis.zscore(schedule.KEY, f"car:{CAR['external_id']}")
+        assert due > time.time() + settings.SCHEDULE_LISTING_MIN_INTERVAL
+
+    asyncio.run(scenario())
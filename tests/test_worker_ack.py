@@ -0,0 +1,156 @@
+import json
+import asyncio
+
+import fakeredis.aioredis
+
+from src.worker import WorkerContext, process_task
+from src.services import write_buffer
+from src.services.write_buffer import CarWriteBuffer
+from src.services.fingerprints import ListingFingerprints
+from src.services.task_queue import StreamQueue, DETAIL_QUEUE
+
+CAR = {"external_id": "51234567", "link": "https://www.che168.com/dealer/1/51234567.html", "title": "比亚迪 汉 2022款"}
+
+
+class FakeScraper:
+    async def parse_detail(self, url: str, basic_info: dict = None):
+        return {**basic_info, "price": 150000.0, "parsed_success": True}
+
+
+async def take_detail_task(redis) -> tuple[WorkerContext, object]:
+    writer = CarWriteBuffer(max_rows=100, max_age=60)
+    ctx = WorkerContext(redis, FakeScraper(), writer)
+    await ctx.detail_queue.ensure_group()
+    await ctx.detail_queue.push_many([json.dumps(CAR)])
+    [task] = await ctx.detail_queue.read(count=1)
+    await process_task(0, ctx, task)
+    return ctx, task
+
+
+async def stream_state(redis) -> tuple[int, int]:
+    queue = StreamQueue(redis, DETAIL_QUEUE)
+    pending = await redis.xpending(queue.stream, queue.GROUP)
+    return await redis.xlen(queue.stream), pending["pending"]
+
+
+def test_worker_killed_before_flush_keeps_task():
+    async def scenario():
+        redis = fakeredis.aioredis.FakeRedis()
+        ctx, task = await take_detail_task(redis)
+        assert len(ctx.writer.pending) == 1
+
+        # SIGKILL между add и flush: буфер пропадает вместе с процессом, flush не вызывается
+        assert await stream_state(redis) == (1, 1)
+        assert await redis.hget(ListingFingerprints.KEY, CAR["external_id"]) is None
+
+        # Другой воркер забирает зависшую задачу и доделывает ее
+        survivor = StreamQueue(redis, DETAIL_QUEUE, claim_idle=0)
+        survivor.consumer = "survivor"
+        [reclaimed] = await survivor.read(count=1)
+        assert reclaimed.id == task.id
+        assert json.loads(reclaimed.data)["external_id"] == CAR["external_id"]
+
+    asyncio.run(scenario())
+
+
+def test_task_acked_and_remembered_after_flush(monkeypatch):
+    written = []
+
+    async def fake_upsert(cars):
+        written.extend(cars)
+        return {"inserted": len(cars), "updated": 0, "skipped": 0}
+
+    monkeypatch.setattr(write_buffer, "upsert_cars", fake_upsert)
+
+    async def scenario():
+        redis = fakeredis.aioredis.FakeRedis()
+        ctx, _ = await take_detail_task(redis)
+        assert await stream_state(redis) == (1, 1)
+
+        await ctx.writer.flush()
+
+        assert [car["external_id"] for car in written] == [CAR["external_id"]]
+        assert await stream_state(redis) == (0, 0)
+        assert await redis.hget(ListingFingerprints.KEY, CAR["external_id"]) is not None
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_keeps_task_unacked(monkeypatch):
+    async def broken_upsert(cars):
+        raise ConnectionError("postgres is down")
+
+    monkeypatch.setattr(write_buffer, "upsert_cars", broken_upsert)
+
+    async def scenario():
+        redis = fakeredis.aioredis.FakeRedis()
+        ctx, _ = await take_detail_task(redis)
+
+        await ctx.writer.flush()
+
+        assert await stream_state(redis) == (1, 1)
+        assert await redis.hget(ListingFingerprints.KEY, CAR["external_id"]) is None
+        # Машина и ожидание подтверждения вернулись в буфер до следующего сброса
+        assert list(ctx.writer.callbacks) == [CAR["external_id"]]
+
+    asyncio.run(scenario())
+
+
+def test_poison_row_is_dropped_and_retried(monkeypatch):
+    written = []
+
+    async def upsert_without_poison(cars):
+        if any(car["external_id"] == CAR["external_id"] for car in cars):
+            raise ValueError("value out of range for type integer")
+        written.extend(cars)
+        return {"inserted": len(cars), "updated": 0, "skipped": 0}
+
+    monkeypatch.setattr(write_buffer, "upsert_cars", upsert_without_poison)
+
+    async def scenario():
+        redis = fakeredis.aioredis.FakeRedis()
+        ctx, _ = await take_detail_task(redis)
+        ctx.writer.max_failures = 2
+        await ctx.writer.add({"external_id": "1", "parsed_success": True})
+
+        await ctx.writer.flush()
+        assert len(ctx.writer.pending) == 2 and not written
+
+        # Вторая неудача подряд: пишем поштучно, плохую машину отбрасываем
+        await ctx.writer.flush()
+        assert [car["external_id"] for car in written] == ["1"]
+        assert not ctx.writer.pending and not ctx.writer.callbacks
+        assert ctx.writer.results["dropped"] == 1
+
+        # Ее задача ушла в очередь повторов, а не повисла неподтвержденной
+        assert await stream_state(redis) == (0, 0)
+        assert await redis.zcard(ctx.detail_queue.retry_key) == 1
+
+    asyncio.run(scenario())
+
+
+def test_preview_during_failed_flush_keeps_detail(monkeypatch):
+    batches = []
+
+    async def scenario():
+        redis = fakeredis.aioredis.FakeRedis()
+        ctx, _ = await take_detail_task(redis)
+
+        async def upsert_with_preview(cars):
+            batches.append(cars)
+            if len(batches) == 1:
+                # Пока пачка пишется, со страницы списка приходит превью той же машины
+                await ctx.writer.add({**CAR, "price": 149000.0})
+                raise ConnectionError("postgres is down")
+            return {"inserted": len(cars), "updated": 0, "skipped": 0}
+
+        monkeypatch.setattr(write_buffer, "upsert_cars", upsert_with_preview)
+
+        await ctx.writer.flush()
+        await ctx.writer.flush()
+
+        [car] = batches[-1]
+        assert car["parsed_success"] is True
+        assert await stream_state(redis) == (0, 0)
+
+    asyncio.run(scenario())